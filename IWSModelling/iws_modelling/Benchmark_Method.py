@@ -0,0 +1,581 @@
+"""
+The Benchmark_Method Module contains methods to generate synthetic EPANET networks of any size, to time the phases of the
+Convert_Method and Run_Method functions across network sizes and to benchmark all methods on the shipped networks against a baseline
+"""
+global np,pd,math,pathlib,time,io,contextlib,tempfile,wntr,plt,os,json,glob,shutil,platform,Convert_Method,Run_Method
+
+import numpy as np
+import pandas as pd
+import math
+import pathlib
+import time
+import io
+import contextlib
+import tempfile
+import os
+import json
+import glob
+import shutil
+import platform
+import wntr
+import matplotlib.pyplot as plt
+
+try:
+    from . import Convert_Method
+    from . import Run_Method
+except ImportError:
+    # Imported as a top-level module next to the other modules (e.g., by Examples.py)
+    import Convert_Method
+    import Run_Method
+
+
+def generate_network(path:pathlib.Path,n_nodes:int,layout:str='grid',duration:float=12,Hmin:float=0,Hdes:float=10,spacing:float=100,
+                     consumer_fraction:float=0.7,mean_demand:float=0.2,nodes_per_source:int=5000,loop_fraction:float=0.2,seed:int=0):
+    """
+    Generates a synthetic EPANET-PDA input file of any size (tested from 100 to 200,000 junctions) that can be converted by all Convert_Method functions.
+    Junctions lie on a jittered square lattice over a terrain that falls gently away from the sources with rolling hills. The lattice is split
+    into square districts of about nodes_per_source junctions, each fed by its own reservoir at its upstream corner through a random spanning tree.
+    Pipes are sized for the peak flows of the tree from commercial diameters and each reservoir head covers the highest grade line of its
+    district plus Hdes, so that every consumer can be fully supplied under continuous supply
+
+    Parameters
+    -----------
+    path (str): path of the file to write. relative or full absolute path. Should end in _PDA.inp to be named like the other networks by the converters
+
+    n_nodes (int): number of junctions
+
+    layout (str): 'tree' (the spanning trees of the districts only), 'looped' (the trees plus a fraction of the other lattice pipes, see loop_fraction)
+    or 'grid' (all lattice pipes). Default: 'grid'
+
+    duration (float): supply duration in hours. Default: 12
+
+    Hmin (float): minimum pressure of the PDA options. Default: 0
+
+    Hdes (float): desired (required) pressure of the PDA options. Default: 10
+
+    spacing (float): distance between neighbouring junctions of the lattice in m. Default: 100
+
+    consumer_fraction (float): fraction of the junctions with a demand. Default: 0.7
+
+    mean_demand (float): mean demand of the consumers in LPS if they were supplied over 24 hours, scaled to the supply duration. Demands follow a
+    lognormal distribution. Default: 0.2
+
+    nodes_per_source (int): approximate number of junctions fed by each reservoir. Default: 5000
+
+    loop_fraction (float): fraction of the lattice pipes outside of the trees that are added by the 'looped' layout. Default: 0.2
+
+    seed (int): seed of the random number generator. The same seed and parameters always generate the same file. Default: 0
+
+
+    Returns: path of the generated file
+    """
+    assert layout in __layouts__, "Specify a supported layout: "+", ".join(__layouts__)
+    assert n_nodes>=4, "Generate at least 4 junctions"
+    assert 0<consumer_fraction<=1, "consumer_fraction must be between 0 and 1"
+    assert 0<=loop_fraction<=1, "loop_fraction must be between 0 and 1"
+    assert duration>0 and mean_demand>0 and spacing>0 and nodes_per_source>0, "duration, mean_demand, spacing and nodes_per_source must be positive"
+    rng=np.random.default_rng(seed)
+    path=pathlib.Path(path)
+
+    # Junctions fill the lattice row by row, so that the neighbours above and to the left of every junction exist
+    nodes=np.arange(n_nodes)
+    n_cols=int(math.ceil(math.sqrt(n_nodes)))
+    rows,cols=nodes//n_cols,nodes%n_cols
+    n_rows=int(rows[-1])+1
+    x=cols*spacing+rng.uniform(-0.2,0.2,n_nodes)*spacing
+    y=(n_rows-1-rows)*spacing+rng.uniform(-0.2,0.2,n_nodes)*spacing
+
+    # Terrain falling away from the top left corner (0.2%) with hills of 5 m every 1.5 km and 0.3 m of noise
+    distance=cols*spacing+rows*spacing
+    elevations=100-0.002*distance+5*np.sin(2*np.pi*x/1500)*np.cos(2*np.pi*y/1500)+rng.normal(0,0.3,n_nodes)
+    elevations=np.round(elevations,2)
+
+    # Demands of a random subset of junctions (at least one), lognormal around the mean and scaled to the supply duration
+    consumers=rng.random(n_nodes)<consumer_fraction
+    consumers[rng.integers(n_nodes)]=True
+    sigma=0.5
+    demands=rng.lognormal(math.log(mean_demand)-sigma**2/2,sigma,n_nodes)*24/duration
+    demands=np.where(consumers,np.maximum(np.round(demands,4),0.0001),0)
+
+    # Random spanning tree of each district: every junction is fed from its neighbour above or to its left within the district,
+    # except for the corner junction of the district, which is fed by the district's reservoir
+    side=max(1,int(round(math.sqrt(nodes_per_source))))
+    district_row,district_col=rows//side*side,cols//side*side
+    can_up,can_left=rows>district_row,cols>district_col
+    up=can_up&((rng.random(n_nodes)<0.5)|~can_left)
+    parents=np.where(up,nodes-n_cols,np.where(can_left&~up,nodes-1,-1))
+    roots=np.flatnonzero(parents<0)
+    district_roots=district_row*n_cols+district_col
+    # Junctions are one step further from the root of their district than their parent, so levels order the tree from the roots outwards
+    levels=(rows-district_row)+(cols-district_col)
+    order=np.argsort(levels,kind="stable")
+    bounds=np.searchsorted(levels[order],np.arange(levels.max()+2))
+
+    # Peak flow of the pipe feeding each junction: its demand plus the demands of all junctions downstream of it in the tree (LPS)
+    flows=demands.astype(float)
+    for level in range(levels.max(),0,-1):
+        children=order[bounds[level]:bounds[level+1]]
+        np.add.at(flows,parents[children],flows[children])
+
+    # Reservoirs half a spacing outside of the corner of each district
+    reservoir_x=x[roots]-spacing/2
+    reservoir_y=y[roots]+spacing/2
+
+    # Tree pipes (to each junction from its parent) and the pipes from the reservoirs to the district roots, sized for their peak flows
+    children=np.flatnonzero(parents>=0)
+    tree_lengths=__pipe_lengths__(x[parents[children]],y[parents[children]],x[children],y[children])
+    tree_diameters=__pipe_diameters__(flows[children])
+    source_lengths=__pipe_lengths__(reservoir_x,reservoir_y,x[roots],y[roots])
+    source_diameters=__pipe_diameters__(flows[roots])
+
+    # Grade line of each junction below its reservoir: losses accumulated from the root along the tree
+    losses=np.zeros(n_nodes)
+    losses[roots]=__headloss__(flows[roots],source_lengths,source_diameters)
+    edge_losses=np.zeros(n_nodes)
+    edge_losses[children]=__headloss__(flows[children],tree_lengths,tree_diameters)
+    for level in range(1,levels.max()+1):
+        level_nodes=order[bounds[level]:bounds[level+1]]
+        losses[level_nodes]=losses[parents[level_nodes]]+edge_losses[level_nodes]
+    # Each reservoir covers the highest grade line in its district plus the desired pressure and a 5 m margin
+    required=np.full(n_nodes,-np.inf)
+    np.maximum.at(required,district_roots,elevations+losses)
+    heads=np.round(required[roots]+Hdes+5,2)
+
+    # Lattice pipes outside of the trees: right and lower neighbours that are not fed through this pipe
+    right=nodes[(cols<n_cols-1)&(nodes+1<n_nodes)]
+    right=right[parents[right+1]!=right]
+    below=nodes[nodes+n_cols<n_nodes]
+    below=below[parents[below+n_cols]!=below]
+    loop_from=np.concatenate([right,below])
+    loop_to=np.concatenate([right+1,below+n_cols])
+    if layout=='tree':
+        keep=np.zeros(len(loop_from),dtype=bool)
+    elif layout=='looped':
+        keep=rng.random(len(loop_from))<loop_fraction
+    else:
+        keep=np.ones(len(loop_from),dtype=bool)
+    loop_from,loop_to=loop_from[keep],loop_to[keep]
+    # Loops take the smaller diameter of the pipes feeding their two ends
+    feeding_diameters=np.zeros(n_nodes)
+    feeding_diameters[children]=tree_diameters
+    feeding_diameters[roots]=source_diameters
+    loop_lengths=__pipe_lengths__(x[loop_from],y[loop_from],x[loop_to],y[loop_to])
+    loop_diameters=np.minimum(feeding_diameters[loop_from],feeding_diameters[loop_to])
+
+    junction_ids=np.array(["J"+str(i+1) for i in range(n_nodes)],dtype=object)
+    reservoir_ids=np.array(["R"+str(i+1) for i in range(len(roots))],dtype=object)
+    node1=np.concatenate([reservoir_ids,junction_ids[parents[children]],junction_ids[loop_from]])
+    node2=np.concatenate([junction_ids[roots],junction_ids[children],junction_ids[loop_to]])
+    lengths=np.concatenate([source_lengths,tree_lengths,loop_lengths])
+    diameters=np.concatenate([source_diameters,tree_diameters,loop_diameters]).astype(int)
+    n_pipes=len(node1)
+    pipe_ids=["P"+str(i+1) for i in range(n_pipes)]
+
+    hours=int(duration)
+    minutes=int(round((duration-hours)*60))
+    sections={
+        "[TITLE]":["Synthetic "+layout+" network of "+str(n_nodes)+" junctions, "+str(len(roots))+" reservoirs and "+str(n_pipes)+" pipes",
+                   "Generated by Benchmark_Method.generate_network (seed "+str(seed)+")"],
+        "[JUNCTIONS]":[";ID              \tElev        \tDemand      \tPattern",Convert_Method.__format_rows__(junction_ids,elevations,demands)],
+        "[RESERVOIRS]":[";ID              \tHead        \tPattern",Convert_Method.__format_rows__(reservoir_ids,heads)],
+        "[TANKS]":[],
+        "[PIPES]":[";ID              \tNode1           \tNode2           \tLength      \tDiameter    \tRoughness   \tMinorLoss   \tStatus",
+                   Convert_Method.__format_rows__(pipe_ids,node1,node2,lengths,diameters,[130]*n_pipes,[0]*n_pipes,["Open"]*n_pipes)],
+        "[PUMPS]":[],"[VALVES]":[],"[DEMANDS]":[],"[PATTERNS]":[],"[CURVES]":[],"[CONTROLS]":[],"[RULES]":[],"[EMITTERS]":[],
+        "[TIMES]":[" Duration           \t"+str(hours)+":"+str(minutes).zfill(2)," Hydraulic Timestep \t1:00"," Quality Timestep   \t0:01",
+                   " Pattern Timestep   \t1:00"," Pattern Start      \t0:00"," Report Timestep    \t0:01"," Report Start       \t0:00",
+                   " Start ClockTime    \t0:00:00"," Statistic          \tNONE"],
+        "[REPORT]":[" Status             \tNo"," Summary            \tNo"],
+        "[OPTIONS]":[" Units              \tLPS"," Headloss           \tH-W"," Trials             \t40"," Accuracy           \t0.00100000",
+                     " Unbalanced         \tContinue 10"," Demand Multiplier  \t1.0000"," Demand Model       \tPDA",
+                     " Minimum Pressure   \t"+str(Hmin)," Required Pressure  \t"+str(Hdes)," Pressure Exponent  \t0.5"," Quality            \tNONE mg/L"],
+        "[COORDINATES]":[";Node            \tX-Coord           \tY-Coord",
+                         Convert_Method.__format_rows__(np.concatenate([junction_ids,reservoir_ids]),
+                                                        np.round(np.concatenate([x,reservoir_x]),3),np.round(np.concatenate([y,reservoir_y]),3))],
+        "[VERTICES]":[],
+        "[END]":[]}
+
+    # Writes all sections in one buffered pass, streaming the rows of the large sections
+    with open(path,'w') as file:
+        for name,contents in sections.items():
+            file.write(name+'\n')
+            for part in contents:
+                if isinstance(part,str):
+                    file.write(part+'\n')
+                else:
+                    file.writelines(line+'\n' for line in part)
+            file.write('\n')
+    print("Generated ",path.name,": ",n_nodes," junctions (",int(consumers.sum())," consumers), ",len(roots)," reservoirs, ",n_pipes," pipes")
+    return path
+
+
+def scaling_benchmark(directory:pathlib.Path,sizes:list=(100,1000,10000,100000,200000),layouts:list=('grid','tree','looped'),methods:list=None,
+                      Hmin:float=0,Hdes:float=10,del_x_max:float=100,duration:float=12,run_max_nodes:int=1000,repetitions:int=1,seed:int=0,
+                      save_outputs:bool=True,plots:bool=True):
+    """
+    Times every phase of the converters and runners on synthetic networks of increasing size (see generate_network) and fits the empirical
+    complexity of each phase, i.e. the exponent k of time ~ n^k over the sizes. The phases are:
+    Generate (writing the synthetic network), Read (__read_inp__), Concentric and Discretize (the EPA-SWMM geometry, __match_concentric__ and
+    __discretize_pipes__), Convert (each method writing its file from the shared network digest), Simulate (EPANET or EPA-SWMM) and
+    Process (the post-processing of the runner: reading the results, satisfaction ratios and statistics)
+    The conversion cache is bypassed while timing
+
+    Parameters
+    -----------
+    directory (str): directory for the generated networks, converted files and results. Created if missing
+
+    sizes (list): numbers of junctions of the generated networks. Default: (100, 1000, 10000, 100000, 200000)
+
+    layouts (list): layouts of the generated networks, any of 'grid', 'tree' and 'looped'. Default: all three
+
+    methods (list): methods to convert to and run. Default: None (the 7 methods of to_all)
+
+    Hmin (float): Value of the minimum pressure Hmin. Default: 0
+
+    Hdes (float): Value of the desired pressure Hdes. Default: 10
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes of the EPA-SWMM methods. Default: 100
+
+    duration (float): supply duration of the generated networks in hours. Default: 12
+
+    run_max_nodes (int): the converted files are only simulated and processed up to this number of junctions, as the simulations of
+    large networks take much longer than all other phases. Default: 1000
+
+    repetitions (int): number of times each phase is repeated. The shortest time is kept. Default: 1
+
+    seed (int): seed of the generated networks. Default: 0
+
+    save_outputs (bool): save the timings and the fitted exponents as Scaling_Results.csv and Scaling_Exponents.csv in the directory. Default: True
+
+    plots (bool): plot the time of each phase against the number of junctions on log-log axes, one figure per layout. Default: True
+
+
+    Returns: results, exponents
+
+    results: Pandas DataFrame with one row per layout, size, method and phase with the columns Layout, Nodes, Pipes, Method
+    (empty for the phases shared by all methods), Phase and Time (s)
+
+    exponents: Pandas DataFrame with one row per layout, method and phase timed at two or more sizes with the columns Layout, Method,
+    Phase, Exponent (slope of log time over log junctions) and Largest (s) (time at the largest size)
+    """
+    assert len(sizes)>0 and all(size>=4 for size in sizes), "Specify sizes of at least 4 junctions"
+    assert all(layout in __layouts__ for layout in layouts), "Specify supported layouts: "+", ".join(__layouts__)
+    assert repetitions>0, "Specify a positive number of repetitions"
+    if methods is None:
+        methods=list(Convert_Method.__study_methods__)
+    unknown=[method for method in methods if method not in Convert_Method.__method_converters__]
+    assert not unknown, "Unknown methods "+str(unknown)+". Choose from "+str(list(Convert_Method.__method_converters__))
+    directory=pathlib.Path(directory)
+    directory.mkdir(parents=True,exist_ok=True)
+    swmm=[method for method in methods if method in Convert_Method.__swmm_methods__]
+
+    rows=[]
+    with __without_cache__():
+        for layout in layouts:
+            for size in sorted(sizes):
+                path=directory/pathlib.Path(layout.capitalize()+str(size)+"_"+Convert_Method.__duration_label__(duration)+"_PDA.inp")
+                generated=__best_time__(lambda: generate_network(path,size,layout,duration,Hmin,Hdes,seed=seed),repetitions)
+                network=Convert_Method.__read_inp__(path)
+                read=__best_time__(lambda: Convert_Method.__read_inp__(path),repetitions)
+                n_pipes=len(network["pipes"])
+                row=lambda method,phase,seconds: rows.append({"Layout":layout,"Nodes":size,"Pipes":n_pipes,"Method":method,"Phase":phase,"Time (s)":seconds})
+                row("","Generate",generated)
+                row("","Read",read)
+
+                # Geometry of the EPA-SWMM methods, timed by phase
+                geometry=None
+                if swmm:
+                    timings=[]
+                    for repetition in range(repetitions):
+                        timings.append({})
+                        geometry=Convert_Method.__swmm_geometry__(network,del_x_max,timings=timings[-1])
+                    row("","Concentric",min(timing["Concentric"] for timing in timings))
+                    row("","Discretize",min(timing["Discretize"] for timing in timings))
+                digest=Convert_Method.__freeze_network__(network,del_x_max if swmm else None,geometry)
+
+                for method in methods:
+                    converted=[]
+                    seconds=__best_time__(lambda: converted.append(Convert_Method.__convert__(method,path,Hmin,Hdes,del_x_max,digest)),repetitions)
+                    row(method,"Convert",seconds)
+                    if size<=run_max_nodes:
+                        simulate,process=__time_run__(method,converted[-1],repetitions)
+                        row(method,"Simulate",simulate)
+                        row(method,"Process",process)
+                print(layout,size," junctions: ",round(sum(entry["Time (s)"] for entry in rows if entry["Layout"]==layout and entry["Nodes"]==size),2)," s")
+
+    results=pd.DataFrame(rows,columns=["Layout","Nodes","Pipes","Method","Phase","Time (s)"])
+    exponents=__fit_exponents__(results)
+    print(exponents.to_string(index=False))
+
+    if save_outputs:
+        results.to_csv(directory/"Scaling_Results.csv",index=False)
+        exponents.to_csv(directory/"Scaling_Exponents.csv",index=False)
+    if plots:
+        __plot_scaling__(results,exponents)
+    return results,exponents
+
+
+def benchmark_suite(pattern:str="Network-Files/*/*_PDA.inp",directory:pathlib.Path="Benchmark",methods:list=None,Hmin:float=0,Hdes:float=10,
+                    del_x_max:float=100,repetitions:int=3,cpu:int=None,baseline:pathlib.Path=None,threshold:float=0.25,min_difference:float=0.01,
+                    update_baseline:bool=False):
+    """
+    Times every method end to end and by phase on a set of PDA networks (by default the shipped networks, run from the repository folder), extending
+    Table S-5 (which only timed building the WNTR model and simulator of the EPANET files) to the simulation, the post-processing and the EPA-SWMM methods.
+    The phases are Convert (the converter, from the PDA file), Build (reading the file into a WNTR model and creating the simulator, as timed in
+    Table S-5, EPANET methods only), Simulate (EPANET or EPA-SWMM), Process (the rest of the runner: reading the results, satisfaction ratios and
+    statistics) and End-to-end (Convert plus the whole runner). Every phase is repeated and summarized by its median, minimum and maximum times.
+    The sources are copied to the directory so that the converted files and simulation outputs are written there. The conversion cache is bypassed
+    Results are saved as Benchmark_Results.json (with the package version, platform and settings) and Benchmark_Results.csv, and are compared with a
+    baseline file written by an earlier run: a phase regresses if its median time is more than threshold above the baseline median (and longer by
+    more than min_difference seconds, to ignore the noise of very short phases)
+
+    Parameters
+    -----------
+    pattern (str): glob pattern of the source PDA .inp files. Default: "Network-Files/*/*_PDA.inp" (the shipped networks, from the repository folder)
+
+    directory (str): directory for the copied sources, converted files and results. Created if missing. Default: "Benchmark"
+
+    methods (list): methods to time, any of 'PDA' and the methods of the converters. Default: None (PDA and the 7 methods of to_all)
+
+    Hmin (float): Value of the minimum pressure Hmin. Default: 0
+
+    Hdes (float): Value of the desired pressure Hdes. Default: 10
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes of the EPA-SWMM methods. Default: 100
+
+    repetitions (int): number of times each phase is repeated. Default: 3
+
+    cpu (int): index of the CPU the process is pinned to while timing, so that all runs are timed on the same core (Linux only). Default: None (no pinning)
+
+    baseline (str): path of the baseline file (a Benchmark_Results.json of an earlier run). It is written from this run if it does not exist yet
+    or if update_baseline is True, otherwise this run is compared with it. Default: None (no comparison)
+
+    threshold (float): relative slowdown of the median time of a phase over the baseline that counts as a regression. Default: 0.25 (25%)
+
+    min_difference (float): smallest absolute slowdown (s) that counts as a regression. Default: 0.01
+
+    update_baseline (bool): overwrite the baseline with this run instead of comparing with it. Default: False
+
+
+    Returns: results, table
+
+    results: Pandas DataFrame with one row per network, duration, method and phase with the columns Network, Duration, Method, Phase, Repetitions,
+    Median (s), Min (s), Max (s), Baseline (s) (median of the baseline, NaN without one), Ratio (median over baseline) and Regression (True if the phase regressed)
+
+    table: Pandas DataFrame in the layout of Table S-5: the median end-to-end time (ms) of each method (columns) for each network and duration (rows)
+    """
+    assert repetitions>0, "Specify a positive number of repetitions"
+    assert threshold>0 and min_difference>=0, "threshold must be positive and min_difference must not be negative"
+    if methods is None:
+        methods=list(__suite_methods__)
+    unknown=[method for method in methods if method!="PDA" and method not in Convert_Method.__method_converters__]
+    assert not unknown, "Unknown methods "+str(unknown)+". Choose from "+str(["PDA"]+list(Convert_Method.__method_converters__))
+    sources=sorted(glob.glob(str(pattern)))
+    assert len(sources)>0, "No files match "+str(pattern)
+    directory=pathlib.Path(directory)
+    directory.mkdir(parents=True,exist_ok=True)
+
+    # Pins the process to one CPU while timing and restores its affinity afterwards
+    affinity=None
+    if cpu is not None:
+        assert hasattr(os,"sched_setaffinity"), "CPU pinning is only supported where os.sched_setaffinity is available (Linux)"
+        affinity=os.sched_getaffinity(0)
+        assert cpu in affinity, "CPU "+str(cpu)+" is not available to this process. Choose from "+str(sorted(affinity))
+        os.sched_setaffinity(0,{cpu})
+
+    rows=[]
+    try:
+        with __without_cache__():
+            for source in sources:
+                path=directory/pathlib.Path(source).name
+                shutil.copy(source,path)
+                # Network and duration from the name of the source, e.g., Network1_4hr_PDA.inp
+                stem=path.stem[0:-4] if path.stem.endswith("_PDA") else path.stem
+                network_name,duration=stem.rsplit("_",1) if "_" in stem else (stem,"")
+
+                for method in methods:
+                    times={}
+                    converted=path
+                    if method!="PDA":
+                        outputs=[]
+                        times["Convert"]=__repeat_times__(lambda: outputs.append(Convert_Method.__convert__(method,path,Hmin,Hdes,del_x_max,None)),repetitions)
+                        converted=outputs[-1]
+                    if method not in Run_Method.__swmm_runners__:
+                        times["Build"]=__repeat_times__(lambda: wntr.sim.EpanetSimulator(wntr.network.WaterNetworkModel(str(converted))),repetitions)
+                    times["Simulate"],times["Process"]=__run_times__(method,converted,repetitions)
+                    # The simulation and post-processing of each repetition add up to the whole runner
+                    times["End-to-end"]=[sum(times[phase][repetition] for phase in ("Convert","Simulate","Process") if phase in times)
+                                         for repetition in range(repetitions)]
+                    for phase,seconds in times.items():
+                        rows.append({"Network":network_name,"Duration":duration,"Method":method,"Phase":phase,"Repetitions":repetitions,
+                                     "Median (s)":float(np.median(seconds)),"Min (s)":min(seconds),"Max (s)":max(seconds)})
+                    print(network_name,duration,method,": ",round(float(np.median(times["End-to-end"])),3)," s end to end")
+    finally:
+        if affinity is not None:
+            os.sched_setaffinity(0,affinity)
+
+    results=pd.DataFrame(rows,columns=["Network","Duration","Method","Phase","Repetitions","Median (s)","Min (s)","Max (s)"])
+    metadata={"version":Convert_Method.__cache_version__(),"python":platform.python_version(),"platform":platform.platform(),
+              "processor":platform.processor(),"cpu":cpu,"repetitions":repetitions,"Hmin":Hmin,"Hdes":Hdes,"del_x_max":del_x_max,
+              "date":time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    # Compares the medians with those of the baseline (phases missing from the baseline are not compared)
+    keys=["Network","Duration","Method","Phase"]
+    compare=baseline is not None and pathlib.Path(baseline).exists() and not update_baseline
+    if compare:
+        with open(baseline,'r') as file:
+            reference=pd.DataFrame(json.load(file)["results"],columns=keys+["Median (s)"]).rename(columns={"Median (s)":"Baseline (s)"})
+        results=results.merge(reference,on=keys,how="left")
+    else:
+        results["Baseline (s)"]=np.nan
+    results["Ratio"]=results["Median (s)"]/results["Baseline (s)"]
+    results["Regression"]=((results["Median (s)"]>results["Baseline (s)"]*(1+threshold))
+                           &(results["Median (s)"]-results["Baseline (s)"]>min_difference)).to_numpy()
+
+    record={"metadata":metadata,"results":results[keys+["Repetitions","Median (s)","Min (s)","Max (s)"]].to_dict(orient="records")}
+    with open(directory/"Benchmark_Results.json",'w') as file:
+        json.dump(record,file,indent=1)
+    results.to_csv(directory/"Benchmark_Results.csv",index=False)
+    if baseline is not None and not compare:
+        with open(baseline,'w') as file:
+            json.dump(record,file,indent=1)
+        print("Baseline written to ",baseline)
+
+    # Table S-5 layout: networks and durations in the order of the sources, methods in the order given
+    end_to_end=results[results.Phase=="End-to-end"]
+    table=end_to_end.pivot(index=["Network","Duration"],columns="Method",values="Median (s)")*1000
+    table=table.reindex(index=pd.MultiIndex.from_frame(end_to_end[["Network","Duration"]].drop_duplicates()),columns=methods).round(2)
+    print("Median end-to-end time (ms)")
+    print(table.to_string())
+
+    regressions=results[results.Regression]
+    if compare:
+        print(len(regressions)," of ",int(results["Baseline (s)"].notna().sum())," phases regressed by more than ",round(threshold*100,1),"% over the baseline")
+        if len(regressions)>0:
+            print(regressions[keys+["Median (s)","Baseline (s)","Ratio"]].to_string(index=False))
+    return results,table
+
+
+def __pipe_lengths__(x1,y1,x2,y2):
+    # Straight pipe lengths between the coordinates of their ends (m), at least 1 m
+    return np.maximum(np.round(np.hypot(x2-x1,y2-y1),2),1)
+
+
+def __pipe_diameters__(flows,max_velocity=1.0):
+    # Smallest commercial diameter (mm) that carries each peak flow (LPS) at the maximum velocity (m/s), capped at the largest diameter
+    required=np.sqrt(4*flows/1000/np.pi/max_velocity)*1000
+    return __commercial_diameters__[np.minimum(np.searchsorted(__commercial_diameters__,required),len(__commercial_diameters__)-1)]
+
+
+def __headloss__(flows,lengths,diameters,roughness=130):
+    # Hazen-Williams headloss (m) of pipes for flows in LPS and diameters in mm
+    return 10.67*lengths*(flows/1000)**1.852/(roughness**1.852*(diameters/1000)**4.87)
+
+
+def __best_time__(function,repetitions:int):
+    # Shortest time (s) of a number of calls of a function, with its printed output suppressed
+    return min(__repeat_times__(function,repetitions))
+
+
+def __repeat_times__(function,repetitions:int):
+    # Times (s) of a number of calls of a function, with its printed output suppressed
+    times=[]
+    for repetition in range(repetitions):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start=time.perf_counter()
+            function()
+            times.append(time.perf_counter()-start)
+    return times
+
+
+def __time_run__(method:str,path:pathlib.Path,repetitions:int):
+    # Shortest simulation and post-processing times (s) of the runner of a method
+    simulate,process=__run_times__(method,path,repetitions)
+    return min(simulate),min(process)
+
+
+def __run_times__(method:str,path:pathlib.Path,repetitions:int):
+    # Simulation and post-processing times (s) of each repetition of the runner of a method. EPA-SWMM runners are timed with and without
+    # the simulation (ran_before), EPANET simulations are timed on their own and the post-processing is the rest of the runner's time
+    if method in Run_Method.__swmm_runners__:
+        runner=Run_Method.__swmm_runners__[method]
+        total=__repeat_times__(lambda: runner(path,False,save_outputs=False,plots=False),repetitions)
+        process=__repeat_times__(lambda: runner(path,True,save_outputs=False,plots=False),repetitions)
+        return [max(seconds-processing,0) for seconds,processing in zip(total,process)],process
+    runner=Run_Method.__epanet_runners__[method]
+    # The EPANET runners write their temp.* files to the working directory, so they run inside a temporary directory
+    path=pathlib.Path(path).resolve()
+    with tempfile.TemporaryDirectory() as temporary,__working_directory__(temporary):
+        simulate=__repeat_times__(lambda: wntr.sim.EpanetSimulator(wntr.network.WaterNetworkModel(str(path))).run_sim(file_prefix="temp"),repetitions)
+        total=__repeat_times__(lambda: runner(path,save_outputs=False,plots=False),repetitions)
+    return simulate,[max(seconds-simulation,0) for seconds,simulation in zip(total,simulate)]
+
+
+def __fit_exponents__(results:pd.DataFrame):
+    # Slope of log time over log junctions of every layout, method and phase timed at two or more sizes (with measurable times)
+    rows=[]
+    for (layout,method,phase),group in results.groupby(["Layout","Method","Phase"],sort=False):
+        group=group[group["Time (s)"]>0]
+        if group.Nodes.nunique()<2:
+            continue
+        slope=np.polyfit(np.log(group.Nodes.to_numpy(dtype=float)),np.log(group["Time (s)"].to_numpy(dtype=float)),1)[0]
+        rows.append({"Layout":layout,"Method":method,"Phase":phase,"Exponent":round(slope,2),"Largest (s)":group["Time (s)"].iloc[-1]})
+    return pd.DataFrame(rows,columns=["Layout","Method","Phase","Exponent","Largest (s)"])
+
+
+def __plot_scaling__(results:pd.DataFrame,exponents:pd.DataFrame):
+    # One figure per layout: conversion phases on the left, simulation and post-processing on the right, with O(n) and O(n^2) guides
+    fitted={(row.Layout,row.Method,row.Phase):row.Exponent for row in exponents.itertuples()}
+    for layout,timings in results.groupby("Layout",sort=False):
+        fig,axes=plt.subplots(1,2,figsize=(10,4),sharey=True)
+        for ax,phases in zip(axes,(("Generate","Read","Concentric","Discretize","Convert"),("Simulate","Process"))):
+            selected=timings[timings.Phase.isin(phases)]
+            for (method,phase),series in selected.groupby(["Method","Phase"],sort=False):
+                label=(method+" " if method else "")+phase
+                if (layout,method,phase) in fitted:
+                    label+=" (n^"+str(fitted[(layout,method,phase)])+")"
+                ax.loglog(series.Nodes,series["Time (s)"],marker='o',markersize=3,linewidth=1,label=label)
+            if len(selected)>0:
+                # Guides through the median time at the smallest size
+                sizes=np.array(sorted(selected.Nodes.unique()),dtype=float)
+                anchor=selected[selected.Nodes==sizes[0]]["Time (s)"].median()
+                ax.loglog(sizes,anchor*sizes/sizes[0],linestyle='--',color='grey',linewidth=0.8,label="O(n)")
+                ax.loglog(sizes,anchor*(sizes/sizes[0])**2,linestyle=':',color='grey',linewidth=0.8,label="O(n^2)")
+                ax.legend(fontsize=6)
+            ax.set_xlabel('Junctions')
+        axes[0].set_ylabel('Time (s)')
+        axes[0].set_title(layout.capitalize()+' networks: conversion')
+        axes[1].set_title(layout.capitalize()+' networks: simulation and processing')
+        plt.show()
+
+
+@contextlib.contextmanager
+def __working_directory__(directory):
+    # Runs the enclosed code in another working directory and returns to the previous one afterwards
+    previous=os.getcwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def __without_cache__():
+    # Disables the conversion cache while timing, so that every conversion is actually run
+    directory=Convert_Method.__cache_settings__["directory"]
+    Convert_Method.__cache_settings__["directory"]=None
+    try:
+        yield
+    finally:
+        Convert_Method.__cache_settings__["directory"]=directory
+
+
+# Methods timed by benchmark_suite: the EPANET-PDA source and the 7 methods of to_all
+__suite_methods__=("PDA",)+Convert_Method.__study_methods__
+
+# Layouts of generate_network
+__layouts__=("grid","tree","looped")
+
+# Commercial pipe diameters (mm) used to size the generated networks
+__commercial_diameters__=np.array([50,63,75,100,125,150,200,250,300,350,400,450,500,600,700,800,900,1000,1200])
@@ -0,0 +1,291 @@
+"""
+The Check_Method Module contains methods to check the structure of EPANET and EPA-SWMM input files produced by the Convert_Method
+functions before they are run, e.g., to gate a batch of runs
+"""
+global pd,pathlib
+
+import pandas as pd
+import pathlib
+
+
+def check_model(path,method:str=None):
+    """
+    Checks the structure of a converted EPANET or EPA-SWMM input file in one streaming pass over its lines: presence of the required
+    sections and options, the number and type of the fields of each row, uniqueness of node and link IDs, that every referenced node,
+    link and curve exists and that every consumer has exactly one complete set of the artificial elements of its method
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    method (str): IWS method of the file (e.g., 'CV-Tank', 'Outlet-Outfall' or 'PDA' for a source file). Default: None (taken from the
+    end of the file name as written by the converters, e.g., Network1_12hr_CV-Tank.inp, or otherwise inferred from the artificial elements in the file)
+
+
+    Returns: Pandas DataFrame of the issues found with the columns Line (line number in the file, 0 for issues of the whole file),
+    Section, ID and Issue. Empty if the file is well-formed
+    """
+    if isinstance(path,dict):
+        name=pathlib.Path(path["path"]).stem
+        lines=iter(path["text"].splitlines())
+        file=None
+    else:
+        name=pathlib.Path(path).stem
+        file=open(path,'r')
+        lines=file
+
+    issues=[]
+    sections={}                 # Section name -> line number of its header
+    ids={}                      # Section name -> list of (line number, ID) of the rows of the section (their first field)
+    references=[]               # (line number, section, kind, referenced ID) where kind is node, link or curve
+    entries={}                  # Section name -> keyed entries of [OPTIONS] and [TIMES] with upper case keys
+    section=None
+    try:
+        for number,line in enumerate(lines,start=1):
+            # Removes comments and skips empty lines
+            current=line.split(';')[0].split()
+            if not current:
+                continue
+            if current[0].startswith('['):
+                section=current[0].upper()
+                # Repeated sections (e.g., [REACTIONS] in files saved by EPANET) continue the first one
+                sections.setdefault(section,number)
+                continue
+            if section is None:
+                issues.append((number,"","","Row before the first section"))
+                continue
+            __check_row__(number,section,current,ids,references,entries,issues)
+    finally:
+        if file is not None:
+            file.close()
+
+    # Lean files (converted with lean=True) are checked by the original IDs of their short IDs
+    original=__original_ids__(path,name)
+    if original:
+        ids={id_section:[(number,original.get(id,id)) for number,id in rows] for id_section,rows in ids.items()}
+        references=[(number,reference_section,kind,original.get(id,id)) for number,reference_section,kind,id in references]
+
+    # The file format follows from its sections: EPA-SWMM files have conduits, EPANET files have pipes
+    swmm="[CONDUITS]" in sections or "[OUTFALLS]" in sections or "[STORAGE]" in sections
+    spec=__swmm_spec__ if swmm else __epanet_spec__
+    if method is None:
+        method=__infer_method__(name,ids)
+
+    for required in spec["sections"]:
+        if required not in sections:
+            issues.append((0,required,"","Missing section"))
+    for required_section,keys in spec["entries"].items():
+        for key in keys:
+            if key not in entries.get(required_section,{}):
+                issues.append((0,required_section,key,"Missing entry"))
+    if swmm:
+        __check_swmm_steps__(entries.get("[OPTIONS]",{}),issues)
+
+    # IDs of all nodes, links and curves and their uniqueness across the sections of each kind (e.g., a junction and a tank of the same ID)
+    defined={}
+    for kind in ("node","link"):
+        first={}
+        for kind_section in spec[kind]:
+            for number,id in ids.get(kind_section,[]):
+                if id in first:
+                    issues.append((number,kind_section,id,"Duplicate "+kind+" ID (first at line "+str(first[id])+")"))
+                else:
+                    first[id]=number
+        defined[kind]=first
+    defined["curve"]={id:number for number,id in ids.get("[CURVES]",[])}
+
+    for number,reference_section,kind,id in references:
+        if id not in defined[kind]:
+            issues.append((number,reference_section,id,"Unknown "+kind))
+
+    if method in __artificial_sets__:
+        __check_artificial_sets__(method,ids,defined["node"],issues)
+    elif method is not None and method!="PDA":
+        issues.append((0,"",method,"Unknown method, artificial elements not checked"))
+
+    # The desired demands of the Outlet-Outfall consumers are read by the runner from a csv file next to the input file
+    if method=="Outlet-Outfall" and file is not None:
+        demands_file=pathlib.Path(path).parent/pathlib.Path(name+"_Demands.csv")
+        if not demands_file.exists():
+            issues.append((0,"",demands_file.name,"Missing desired demands file"))
+
+    return pd.DataFrame(issues,columns=["Line","Section","ID","Issue"])
+
+
+def __check_row__(number:int,section:str,current:list,ids:dict,references:list,entries:dict,issues:list):
+    # Checks the fields of one row and records the IDs it defines and references
+    if section in ("[OPTIONS]","[TIMES]"):
+        words=[word.upper() for word in current]
+        # Keys are one or two words (e.g., DURATION, DEMAND MODEL or END_TIME) and may be followed by a value
+        key=" ".join(words[:2]) if " ".join(words[:2]) in __two_word_keys__ else words[0]
+        entries.setdefault(section,{})[key]=current[len(key.split()):]
+        return
+    if section in ("[CONTROLS]","[RULES]"):
+        # Rules reference elements by a type keyword followed by the ID, e.g., IF NODE StorageforNode1 DEPTH > 1 THEN OUTLET Outlet1 SETTING = 0
+        for i,word in enumerate(current[:-1]):
+            kind=__rule_keywords__.get(word.upper())
+            if kind is not None:
+                references.append((number,section,kind,current[i+1]))
+        return
+    if section=="[REPORT]":
+        # Reported nodes and links are listed after NODES and LINKS, e.g., NODES 13 15 or LINKS Outlet13 (or ALL or NONE)
+        kind={"NODES":"node","LINKS":"link"}.get(current[0].upper())
+        if kind is not None and not (len(current)==2 and current[1].upper() in ("ALL","NONE")):
+            for id in current[1:]:
+                references.append((number,section,kind,id))
+        return
+    if section not in __row_fields__:
+        return
+
+    minimum,numeric,nodes,links,curves=__row_fields__[section]
+    if len(current)<minimum:
+        issues.append((number,section,current[0],"Expected at least "+str(minimum)+" fields, found "+str(len(current))))
+        return
+    for i in numeric:
+        if i<len(current) and not __is_number__(current[i]):
+            issues.append((number,section,current[0],"Field "+str(i+1)+" is not a number: "+current[i]))
+    ids.setdefault(section,[]).append((number,current[0]))
+    for i in nodes:
+        references.append((number,section,"node",current[i]))
+    for i in links:
+        references.append((number,section,"link",current[i]))
+    # Curves are only referenced by tabular outlets and storages, e.g., TABULAR/DEPTH Curve1 or TABULAR Curve1
+    for i in curves:
+        if i<len(current) and current[i-1].upper().startswith("TABULAR"):
+            references.append((number,section,"curve",current[i]))
+
+
+def __check_swmm_steps__(options:dict,issues:list):
+    # EPA-SWMM stops with an error if the routing step is longer than the reporting step
+    routing_step=options.get("ROUTING_STEP")
+    report_step=options.get("REPORT_STEP")
+    if not routing_step or not report_step:
+        return
+    try:
+        routing_seconds=__clock_seconds__(routing_step[0])
+        report_seconds=__clock_seconds__(report_step[0])
+    except ValueError:
+        issues.append((0,"[OPTIONS]","ROUTING_STEP","Unreadable routing or reporting step"))
+        return
+    if routing_seconds>report_seconds:
+        issues.append((0,"[OPTIONS]","ROUTING_STEP","Routing step "+routing_step[0]+" is longer than the reporting step "+report_step[0]))
+
+
+def __check_artificial_sets__(method:str,ids:dict,nodes:dict,issues:list):
+    # Every consumer must have exactly one of each artificial element of its method, e.g., one TankforNode13 and one PipeforNode13 in CV-Tank
+    elements=__artificial_sets__[method]
+    counts={}
+    for element,(section,prefix) in enumerate(elements):
+        for number,id in ids.get(section,[]):
+            if id.startswith(prefix) and id not in __shared_elements__:
+                counts.setdefault(id[len(prefix):],[0]*len(elements))[element]+=1
+
+    if not counts:
+        issues.append((0,"",method,"No artificial elements of the method found"))
+    for consumer,consumer_counts in counts.items():
+        if consumer not in nodes:
+            issues.append((0,"",consumer,"Artificial elements of a consumer that is not a node of the network"))
+        for (section,prefix),count in zip(elements,consumer_counts):
+            if count!=1:
+                issues.append((0,section,prefix+consumer,("Missing" if count==0 else str(count)+" copies of")+" artificial element of consumer "+consumer))
+
+
+def __infer_method__(name:str,ids:dict):
+    # The converters end the file name with the method (followed by _Lean for lean files), otherwise the method with most artificial elements
+    # in the file is taken. Longest names first so that e.g. FCV-Res is not taken for CV-Res
+    if name.endswith("_Lean"):
+        name=name[:-5]
+    for method in sorted(list(__artificial_sets__)+["PDA"],key=len,reverse=True):
+        if name.endswith(method):
+            return method
+    counts={method:sum(id.startswith(prefix) for section,prefix in elements for number,id in ids.get(section,[]))
+            for method,elements in __artificial_sets__.items()}
+    method=max(counts,key=counts.get)
+    return method if counts[method]>0 else None
+
+
+def __original_ids__(path,name:str):
+    # Original ID of each short ID of a lean file from its _IDs.csv file (or the ids of an in-memory model). Empty for other files
+    if isinstance(path,dict):
+        if path.get("ids") is None:
+            return {}
+        return dict(zip(path["ids"].index,path["ids"].Original))
+    ids_file=pathlib.Path(path).parent/pathlib.Path(name+"_IDs.csv")
+    if not ids_file.exists():
+        return {}
+    ids=pd.read_csv(ids_file,dtype=str)
+    return dict(zip(ids.ID,ids.Original))
+
+
+def __is_number__(text:str):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def __clock_seconds__(text:str):
+    # Converts a step given in seconds or as [H]H:MM[:SS] into seconds
+    parts=[float(part) for part in text.split(":")]
+    seconds=0
+    for part in parts:
+        seconds=seconds*60+part
+    return seconds*60**(3-len(parts)) if len(parts)>1 else seconds
+
+
+# Fields of the rows of each section: minimum number of fields, indices of numeric fields and indices of fields referencing nodes,
+# links and curves. Both formats share some section names, so the fields of shared sections are the loosest of both (e.g., [JUNCTIONS])
+__row_fields__={
+    # EPANET
+    "[JUNCTIONS]":(2,(1,),(),(),()),
+    "[RESERVOIRS]":(2,(1,),(),(),()),
+    "[TANKS]":(7,(1,2,3,4,5,6),(),(),()),
+    "[PIPES]":(6,(3,4,5),(1,2),(),()),
+    "[PUMPS]":(3,(),(1,2),(),()),
+    "[VALVES]":(6,(3,),(1,2),(),()),
+    "[EMITTERS]":(2,(1,),(0,),(),()),
+    "[DEMANDS]":(2,(1,),(0,),(),()),
+    "[STATUS]":(2,(),(),(0,),()),
+    "[COORDINATES]":(3,(1,2),(0,),(),()),
+    # EPA-SWMM
+    "[OUTFALLS]":(3,(1,),(),(),()),
+    "[STORAGE]":(5,(1,2,3),(),(),(5,)),
+    "[DIVIDERS]":(4,(1,),(),(),()),
+    "[CONDUITS]":(5,(3,4),(1,2),(),()),
+    "[ORIFICES]":(5,(),(1,2),(),()),
+    "[WEIRS]":(5,(),(1,2),(),()),
+    "[OUTLETS]":(5,(3,),(1,2),(),(5,)),
+    "[XSECTIONS]":(3,(2,),(),(0,),()),
+    "[CURVES]":(3,(),(),(),()),
+}
+# Keywords of control rules followed by the ID of the element they reference
+__rule_keywords__={"NODE":"node","JUNCTION":"node","RESERVOIR":"node","TANK":"node","STORAGE":"node","OUTFALL":"node",
+                   "LINK":"link","PIPE":"link","PUMP":"link","VALVE":"link","CONDUIT":"link","ORIFICE":"link","WEIR":"link","OUTLET":"link"}
+__two_word_keys__={"DEMAND MODEL","MINIMUM PRESSURE","REQUIRED PRESSURE","EMITTER EXPONENT","HYDRAULIC TIMESTEP","REPORT TIMESTEP",
+                   "PATTERN TIMESTEP","REPORT START","START CLOCKTIME"}
+# Required sections and keyed entries and the node and link sections of each format
+__epanet_spec__={"sections":("[JUNCTIONS]","[RESERVOIRS]","[PIPES]","[OPTIONS]","[TIMES]","[END]"),
+                 "entries":{"[OPTIONS]":("UNITS","DEMAND MODEL","MINIMUM PRESSURE","REQUIRED PRESSURE"),"[TIMES]":("DURATION",)},
+                 "node":("[JUNCTIONS]","[RESERVOIRS]","[TANKS]"),"link":("[PIPES]","[PUMPS]","[VALVES]")}
+__swmm_spec__={"sections":("[OPTIONS]","[JUNCTIONS]","[OUTFALLS]","[STORAGE]","[CONDUITS]","[OUTLETS]","[XSECTIONS]"),
+               "entries":{"[OPTIONS]":("FLOW_UNITS","FLOW_ROUTING","END_TIME","REPORT_STEP","ROUTING_STEP")},
+               "node":("[JUNCTIONS]","[OUTFALLS]","[STORAGE]","[DIVIDERS]"),"link":("[CONDUITS]","[PUMPS]","[ORIFICES]","[WEIRS]","[OUTLETS]")}
+# Artificial elements shared by all consumers (Outlet-Storage drains the network through one outlet to one outfall)
+__shared_elements__={"Outlet_FAKE","Outfall_FAKE"}
+# Artificial elements added to each consumer by each method: (section, ID prefix) followed by the consumer's node ID
+__artificial_sets__={"CV-Res":(("[RESERVOIRS]","AR"),("[PIPES]","PipeforNode")),
+                     "CV-Tank":(("[TANKS]","TankforNode"),("[PIPES]","PipeforNode")),
+                     "FCV-EM":(("[JUNCTIONS]","ANforNode"),("[JUNCTIONS]","EM"),("[PIPES]","Pipe1forNode"),("[VALVES]","FCVforNode"),
+                                ("[EMITTERS]","EM")),
+                     "FCV-Res":(("[JUNCTIONS]","ANforNode"),("[RESERVOIRS]","AR"),("[PIPES]","Pipe1forNode"),("[VALVES]","FCVforNode")),
+                     "PSV-Tank":(("[TANKS]","ATforNode"),("[JUNCTIONS]","AN1forNode"),("[JUNCTIONS]","AN2forNode"),("[PIPES]","Pipe1forNode"),
+                                 ("[PIPES]","Pipe2forNode"),("[VALVES]","APSVforNode")),
+                     "Outlet-Outfall":(("[OUTFALLS]","Outfall"),("[OUTLETS]","Outlet")),
+                     "Outlet-Storage":(("[STORAGE]","StorageforNode"),("[OUTLETS]","Outlet")),
+                     "FCV-Tank":(("[JUNCTIONS]","ANforNode"),("[TANKS]","TankforNode"),("[PIPES]","PipeforNode"),("[VALVES]","FCVforNode")),
+                     "Float-Storage":(("[STORAGE]","StorageforNode"),("[OUTFALLS]","Outfall"),("[OUTFALLS]","L_Outfall"),("[OUTLETS]","Outlet"),
+                                      ("[OUTLETS]","DemandOutlet"),("[OUTLETS]","LeakforNode")),
+                     "Campisano":(("[STORAGE]","StorageforNode"),("[OUTFALLS]","Outfall"),("[OUTLETS]","Outlet"),("[OUTLETS]","DemandOutlet")),
+                     "3O2S1P":(("[STORAGE]","StorageforNode"),("[STORAGE]","OverflowforNode"),("[OUTFALLS]","Outfall"),("[OUTLETS]","Outlet"),
+                               ("[OUTLETS]","OverflowOutlet"),("[OUTLETS]","DemandOutlet"),("[PUMPS]","Pump"))}
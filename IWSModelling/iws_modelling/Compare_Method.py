@@ -0,0 +1,194 @@
+"""
+The Compare_Method Module contains methods to compare the processed outputs of IWS EPANET and EPA-SWMM Files
+produced by the Run_Method functions on a common time grid
+"""
+global np,pd,re
+
+import numpy as np
+import pandas as pd
+import re
+
+
+def align_runs(runs:dict,step:float=60):
+    """
+    Resamples the processed outputs of several runs of the same network onto one common time grid and one common set of demand nodes
+
+    Parameters
+    -----------
+    runs (dict): method name -> processed output of that method. Values can be the timesrs_processed DataFrame returned by any
+    Run_Method function or the whole tuple returned by it (timesrs_processed, mean, low_percentile_series, high_percentile_series)
+
+    step (float): time step of the common grid in seconds. Default: 60 (the EPANET reporting step)
+
+
+    Returns: dictionary of method name -> Pandas DataFrame of size GxN where G is the number of time steps in the common grid (from 0
+    up to the end of the shortest run) and N is the number of demand nodes found in all runs. Columns are the original demand node IDs
+    """
+    time_grid,node_ids,values=__stack_runs__(runs,step)
+    return {method:pd.DataFrame(values[i],index=pd.Index(time_grid,name="time"),columns=node_ids) for i,method in enumerate(runs)}
+
+
+def compare_methods(runs:dict,reference:str,step:float=60):
+    """
+    Computes per-time and per-node error metrics (RMSE, maximum absolute error and bias) of several methods against a reference method
+
+    Parameters
+    -----------
+    runs (dict): method name -> processed output of that method (timesrs_processed DataFrame or the full tuple returned by Run_Method)
+
+    reference (str): name of the method (key in runs) to compare all other methods against, e.g., 'PDA'
+
+    step (float): time step of the common grid in seconds. Default: 60
+
+
+    Returns: per_time, per_node
+
+    per_time: Pandas DataFrame of size Gx(3M) where G is the number of time steps in the common grid and M the number of compared methods.
+    Columns are a MultiIndex of (metric, method) with the metrics 'RMSE', 'Max Abs Error' and 'Bias' taken across all demand nodes at each time step
+
+    per_node: Pandas DataFrame of size Nx(3M) where N is the number of demand nodes. Same columns as per_time but with the metrics taken
+    across all time steps for each demand node
+    """
+    assert reference in runs, "Reference method must be one of the compared runs"
+
+    time_grid,node_ids,values=__stack_runs__(runs,step)
+    methods=[method for method in runs if method!=reference]
+    reference_index=list(runs).index(reference)
+    compared_index=[list(runs).index(method) for method in methods]
+
+    # Errors of every compared method against the reference in one broadcast: M x G x N
+    errors=values[compared_index]-values[reference_index]
+    abs_errors=np.abs(errors)
+
+    metrics=["RMSE","Max Abs Error","Bias"]
+    columns=pd.MultiIndex.from_product([metrics,methods],names=["metric","method"])
+
+    # Reduce over the nodes axis for the per-time metrics and over the time axis for the per-node metrics
+    per_time=np.concatenate([np.sqrt(np.mean(errors**2,axis=2)),abs_errors.max(axis=2),errors.mean(axis=2)]).T
+    per_node=np.concatenate([np.sqrt(np.mean(errors**2,axis=1)),abs_errors.max(axis=1),errors.mean(axis=1)]).T
+
+    per_time=pd.DataFrame(per_time,index=pd.Index(time_grid,name="time"),columns=columns)
+    per_node=pd.DataFrame(per_node,index=pd.Index(node_ids,name="ID"),columns=columns)
+    return per_time,per_node
+
+
+def pairwise_errors(runs:dict,step:float=60):
+    """
+    Computes overall error metrics between every pair of methods in a batch
+
+    Parameters
+    -----------
+    runs (dict): method name -> processed output of that method (timesrs_processed DataFrame or the full tuple returned by Run_Method)
+
+    step (float): time step of the common grid in seconds. Default: 60
+
+
+    Returns: rmse, max_abs_error, bias
+
+    rmse: Pandas DataFrame of size MxM where M is the number of methods. Entry (i,j) is the RMSE of method i against method j over all time steps and demand nodes
+
+    max_abs_error: Pandas DataFrame of size MxM. Entry (i,j) is the maximum absolute difference between methods i and j
+
+    bias: Pandas DataFrame of size MxM. Entry (i,j) is the mean difference of method i minus method j
+    """
+    time_grid,node_ids,values=__stack_runs__(runs,step)
+    methods=list(runs)
+
+    # Each method flattened into one row of all time steps and nodes: M x (G*N)
+    flat=values.reshape(len(methods),-1)
+    n_values=flat.shape[1]
+
+    # Squared distances between all rows from one Gram matrix: |a-b|^2 = |a|^2 + |b|^2 - 2 a.b
+    gram=flat@flat.T
+    squared_norms=np.diag(gram)
+    mse=(squared_norms[:,None]+squared_norms[None,:]-2*gram)/n_values
+    # Rounding can leave tiny negative values for identical methods
+    rmse=np.sqrt(np.clip(mse,0,None))
+
+    means=flat.mean(axis=1)
+    bias=means[:,None]-means[None,:]
+
+    # The maximum is not decomposable like the squared norm, so it is broadcast one row at a time to bound memory at M x (G*N)
+    max_abs_error=np.array([np.abs(flat-row).max(axis=1) for row in flat])
+
+    rmse=pd.DataFrame(rmse,index=methods,columns=methods)
+    max_abs_error=pd.DataFrame(max_abs_error,index=methods,columns=methods)
+    bias=pd.DataFrame(bias,index=methods,columns=methods)
+    return rmse,max_abs_error,bias
+
+
+def disaggregate(run,consumers):
+    """
+    Maps the processed output of a file converted from a network with aggregated consumers (Convert_Method.aggregate_consumers) back to all
+    of the original consumers. Each consumer takes the values of the representative of its cluster: demand satisfaction ratios and pressures
+    apply to the whole cluster (scale by the Share column of the mapping for flows or volumes)
+
+    Parameters
+    -----------
+    run (DataFrame or tuple): processed output of a Run_Method function (timesrs_processed DataFrame or the full tuple returned by it)
+
+    consumers (str, DataFrame or dict): consumer mapping written by aggregate_consumers (path to the _Consumers.csv file or its DataFrame)
+    or the in-memory model returned by aggregate_consumers with in_memory=True
+
+
+    Returns: Pandas DataFrame with the time steps of the run and one column per original consumer, labelled by the consumer's ID
+    """
+    if isinstance(run,tuple):
+        run=run[0]
+    if isinstance(consumers,dict):
+        consumers=consumers["consumers"]
+    elif not isinstance(consumers,pd.DataFrame):
+        consumers=pd.read_csv(consumers,dtype={"ID":str,"Representative":str})
+
+    # Column labels differ between methods (e.g., TankforNode13, Outlet13), map them back to the representative's ID
+    run=run.rename(columns=__node_id__)
+    missing=set(consumers.Representative)-set(run.columns)
+    assert not missing, "Representatives missing from the run: "+str(sorted(missing)[:10])
+    disaggregated=run[consumers.Representative.tolist()]
+    disaggregated.columns=consumers.ID.tolist()
+    return disaggregated
+
+
+def __stack_runs__(runs:dict,step:float):
+    # Stacks all runs into one array of size M x G x N on the common time grid and demand nodes
+    assert len(runs)>0, "Provide at least one run to compare"
+    assert step>0, "Time step must be a positive number"
+
+    frames=[]
+    for method,run in runs.items():
+        # Accept the full tuple returned by the Run_Method functions as well as the processed DataFrame alone
+        if isinstance(run,tuple):
+            run=run[0]
+        # Column labels differ between methods (e.g., TankforNode13, FCVforNode13, Outlet13), map them back to the demand node ID
+        run=run.rename(columns=__node_id__)
+        frames.append(run.sort_index())
+
+    # Demand nodes present in all runs, in the order of the first run
+    common_nodes=set(frames[0].columns)
+    for frame in frames[1:]:
+        common_nodes&=set(frame.columns)
+    node_ids=[node for node in frames[0].columns if node in common_nodes]
+    assert len(node_ids)>0, "Runs share no demand nodes. Make sure all runs are of the same network"
+
+    # Common grid from 0 to the end of the shortest run
+    end_time=min(float(frame.index[-1]) for frame in frames)
+    time_grid=np.arange(0,end_time+step/1000,step)
+
+    values=np.empty((len(frames),len(time_grid),len(node_ids)))
+    for i,frame in enumerate(frames):
+        values[i]=__interpolate__(frame.index.to_numpy(dtype=float),frame[node_ids].to_numpy(dtype=float),time_grid)
+    return time_grid,node_ids,values
+
+
+def __interpolate__(times,values,time_grid):
+    # Linear interpolation of all columns at once: finds the bracketing time steps of each grid time and blends the two rows
+    if len(times)<2:
+        return np.repeat(values[:1],len(time_grid),axis=0)
+    position=np.clip(np.searchsorted(times,time_grid,side='right')-1,0,len(times)-2)
+    weight=((time_grid-times[position])/(times[position+1]-times[position]))[:,None]
+    return values[position]*(1-weight)+values[position+1]*weight
+
+
+def __node_id__(column):
+    # Strips the prefix that each method adds to the ID of its artificial elements
+    return re.sub('^(TankforNode|PipeforNode|FCVforNode|APSVforNode|ATforNode|StorageforNode|Outlet)','',str(column))
@@ -1,4 +1,4 @@
-global wntr,np,pd,re,math,pathlib
+global wntr,np,pd,re,math,pathlib,itertools,types,concurrent,io,os,json,hashlib,shutil,tempfile,threading,importlib,glob,contextlib,time,heapq
 
 import wntr
 import numpy as np 
@@ -6,60 +6,84 @@ import pandas as pd
 import re
 import math 
 import pathlib 
-
-
-def to_CVTank(path:str,Hmin:float,Hdes:float):
+import itertools
+import types
+import concurrent.futures
+import io
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import importlib.metadata
+import glob
+import contextlib
+import time
+import heapq
+
+
+def to_CVTank(path:str,Hmin:float,Hdes:float,network=None,in_memory:bool=False,lean:bool=False):
     """
     Converts an EPANET Input file to an EPANET input file that uses the volume-restricted method CV-Tank
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)  
 
     Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
 
     assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
 
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
     pressure_diff=Hdes-Hmin 
 
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    xcoordinates=[]       # For storing x coordinates of demand nodes
-    ycoordinates=[]       # For storing y coordinates of demand nodes
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-    ## MAYBE SAVE ALL NODE IDS IN DATAFRAME WITH ELEVATION AND BASE DEMAND AND THEN FILTER DATA FRAME LATER FOR DEMAND NODES ONLY
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-    assert network.options.hydraulic.demand_model=='PDA', "Please use EPANET or edit the inp file to set demand model as PDA"
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            xcoordinates.append(node[1].coordinates[0])
-            ycoordinates.append(node[1].coordinates[1])
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_CV-Tank.inp')
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"CV-Tank"+("_Lean" if lean else ""),(Hmin,Hdes),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    assert network["demand_model"]=='PDA', "Please use EPANET or edit the inp file to set demand model as PDA"
+    junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=junctions[junctions.Demand!=0]
+
+    all_nodes=junctions.ID.tolist()                     # List of node ids of all nodes
+    all_elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+    xcoordinates=demand_junctions.X.tolist()            # x coordinates of demand nodes
+    ycoordinates=demand_junctions.Y.tolist()            # y coordinates of demand nodes
 
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
 
     # Adds the phrase TankforNode to each node id and stores it as a tank id
     tankids=['TankforNode'+str(id) for id in demand_nodes] 
@@ -74,10 +98,8 @@ def to_CVTank(path:str,Hmin:float,Hdes:float):
     VolCurve=['    ']*len(tankids)
     # Semicolons to end each tank line
     semicolons=[';']*len(tankids)
-    # Assemble all lists into a dataframe where each row is the definition for one simple tank
-    tanks_section=pd.DataFrame(list(zip(tankids,elevations,zeros,zeros,MaxLevel,diameters_tanks,zeros,VolCurve,semicolons)))
-    # Exports the tank section as a list of strings where each entry is a line of the tanks section
-    tanks_section=tanks_section.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the definition for one simple tank
+    tanks_section=__format_rows__(tankids,elevations,zeros,zeros,MaxLevel,diameters_tanks,zeros,VolCurve,semicolons)
     
     # Adds the phrase PipeforNode to each node id and stores it as a pipe id
     pipeids=['PipeforNode'+str(id) for id in demand_nodes]
@@ -89,153 +111,100 @@ def to_CVTank(path:str,Hmin:float,Hdes:float):
     hazen=[130]*len(pipeids)
     # Sets all created pipes to work as Check Valved to prevent backflow
     status=['CV']*len(pipeids)
-    # Assemble all lists into a dataframe where each row is the definition for one simple tank
-    pipes_addendum=pd.DataFrame(list(zip(pipeids,demand_nodes,tankids,lengths,diameters_pipes,hazen,zeros,status,semicolons)))
-    # Exports the pipe section as a list of strings where each entry is a line of the pipes section
-    pipes_addendum=pipes_addendum.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the definition for one simple tank
+    pipes_addendum=__format_rows__(pipeids,demand_nodes,tankids,lengths,diameters_pipes,hazen,zeros,status,semicolons)
 
     # Translates the tanks by a 100 m in both axes 
     xcoordinates=[x+2 for x in xcoordinates]
     ycoordinates=[y+2 for y in ycoordinates]
 
-    # Assemble all lists into a dataframe where each row is the coordinates for one simple tank
-    coordinates_add=pd.DataFrame(list(zip(tankids,xcoordinates,ycoordinates)))
-    # Exports the coordinate section as a list of strings where each entry is a line of the coordinates section
-    coordinates_add=coordinates_add.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the coordinates for one simple tank
+    coordinates_add=__format_rows__(tankids,xcoordinates,ycoordinates)
     
     # List of zero base demands for all nodes
     zerodemands=[0]*len(all_nodes)
     # White space indicating no patterns
     pattern=['     ']*len(all_nodes)
     semicolons=[';']*len(all_nodes)
-    nodes=pd.DataFrame(list(zip(all_nodes,all_elevations,zerodemands,pattern,semicolons)))
-    nodes=nodes.to_string(header=False,index=False).splitlines()
-
-    # opens .inp file to read
-    file=open(path,'r')
-    lines=[]            # list to store all lines in the .inp file
-    linecount=0         # Counter for the number of lines
-    junctions_marker=0  # To store the line number at which the junctions section starts
-    tanks_marker=0      # To store the line number at which the tanks section starts
-    pipes_marker=0      # To store the line number at which the pumps section starts
-    coords_marker=0     # To store the line number at which the vertices section starts
-    demand_model=0  # To detect demand model line
-
-    # Loops over each line in the input file 
-    for line in file:
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+2
-        # Record the position of the phrase [TANKS] and add 2 to skip the header line
-        if re.search('\[TANKS\]',line):
-            tanks_marker=linecount+2
-        # Record the position of the phrase [PUMPS] and subtract 1 to add pipes to the end of the pipe section
-        if re.search('\[PUMPS\]',line):
-            pipes_marker=linecount-1
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[VERTICES\]',line):
-            coords_marker=linecount-1
-        if re.search('Demand Model',line):
-            demand_model=linecount
-        linecount+=1
-        # Store all lines in a list
-        lines.append(line)
-    file.close()
-
-    # Translate the pipes marker by the length of the tank section that will be added before it (as it will displace all subsequent lines)
-    pipes_marker+=len(tanks_section)
-    # Translate the coordinates marker by the length of the added tanks and pipes
-    coords_marker+=len(tanks_section)+len(pipes_addendum)
-
-    # Inserts the created sections in their appropriate location in the list of lines
-    if demand_model:
-        lines[demand_model+1]=" Minimum Pressure   "+str(Hmin)
-        lines[demand_model+2]=" Required Pressure  "+str(Hdes)
-        demand_model+=len(pipes_addendum)+len(tanks_section)
-
-    lines[junctions_marker:junctions_marker+len(nodes)]=nodes
-    lines[tanks_marker:tanks_marker]=tanks_section
-    lines[pipes_marker:pipes_marker]=pipes_addendum
-    lines[coords_marker:coords_marker]=coordinates_add
-
-    # Opens a new file in the same directory to write the modified network .inp file in
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_CV-Tank.inp')
-    file=open(new_file_name,'w')
-    c=0     #line counter
+    nodes=__format_rows__(all_nodes,all_elevations,zerodemands,pattern,semicolons)
 
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        if c>=junctions_marker and c<=junctions_marker+len(nodes):
-            file.write(line+'\n')
-        elif c>=tanks_marker and c<=tanks_marker+len(tanks_section):
-            file.write(line+'\n')
-        elif c>=pipes_marker and c<=pipes_marker+len(pipes_addendum):
-            file.write(line+'\n')
-        elif c>=coords_marker and c<=coords_marker+len(coordinates_add):
-            file.write(line+'\n')
-        elif c>=demand_model and c<=demand_model+2:
-            file.write(line+'\n')
-        else: file.write(line)    
-        c+=1
-    file.close()
-    return new_file_name
+    # Indexes the .inp file into named sections and replaces or extends each section by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[OPTIONS]","Minimum Pressure",Hmin)
+    __set_entry__(sections,"[OPTIONS]","Required Pressure",Hdes)
+    __replace_rows__(sections,"[JUNCTIONS]",nodes)
+    __append_rows__(sections,"[TANKS]",tanks_section)
+    __append_rows__(sections,"[PIPES]",pipes_addendum)
+    __append_rows__(sections,"[COORDINATES]",coordinates_add)
 
+    # Writes the modified network .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
 
-def to_CVRes(path:str,Hmin:float,Hdes:float):
+
+def to_CVRes(path:str,Hmin:float,Hdes:float,network=None,in_memory:bool=False,lean:bool=False):
     """
     Converts an EPANET Input file to an EPANET input file that uses the unrestricted method CV-Reservoir (CV-Res)
 
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)  
 
     Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
 
     assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
 
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
 
     pressure_diff=Hdes-Hmin  
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    xcoordinates=[]       # For storing x coordinates of demand nodes
-    ycoordinates=[]       # For storing y coordinates of demand nodes
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-    ## MAYBE SAVE ALL NODE IDS IN DATAFRAME WITH ELEVATION AND BASE DEMAND AND THEN FILTER DATA FRAME LATER FOR DEMAND NODES ONLY
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-    assert network.options.hydraulic.demand_model=='PDA', "Please use EPANET to set demand model as PDA"
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            xcoordinates.append(node[1].coordinates[0])
-            ycoordinates.append(node[1].coordinates[1])
+
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_CV-Res.inp')
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"CV-Res"+("_Lean" if lean else ""),(Hmin,Hdes),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    assert network["demand_model"]=='PDA', "Please use EPANET to set demand model as PDA"
+    junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=junctions[junctions.Demand!=0]
+
+    all_nodes=junctions.ID.tolist()                     # List of node ids of all nodes
+    all_elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+    xcoordinates=demand_junctions.X.tolist()            # x coordinates of demand nodes
+    ycoordinates=demand_junctions.Y.tolist()            # y coordinates of demand nodes
 
 
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
     # Adds "AR" to each demand node id to be used as ID for AR
     reservoirids=["AR"+str(id) for id in demand_nodes]
     # Calculates the elevation of the AR
@@ -244,10 +213,8 @@ def to_CVRes(path:str,Hmin:float,Hdes:float):
     reservoir_patterns=["    "]*len(reservoirids)
     # Semicolons to end each line
     semicolons=[";"]*len(reservoirids)
-    # Dataframe with all the required fields for AR [ID   Elevation   Pattern   ;]
-    added_reservoirs=pd.DataFrame(list(zip(reservoirids,reservoir_elevs,reservoir_patterns,semicolons)))
-    # Exports the added reservoirs as a list of strings where each entry is a line of the reservoirs section
-    added_reservoirs=added_reservoirs.to_string(header=False,index=False).splitlines()
+    # Lines with all the required fields for AR [ID   Elevation   Pattern   ;]
+    added_reservoirs=__format_rows__(reservoirids,reservoir_elevs,reservoir_patterns,semicolons)
 
     # Adds the phrase PipeforNode to each node id and stores it as a pipe id
     pipeids=['PipeforNode'+str(id) for id in demand_nodes]
@@ -261,148 +228,96 @@ def to_CVRes(path:str,Hmin:float,Hdes:float):
     status=['CV']*len(pipeids)
     # sets all minor loss to 0
     minorloss=[0]*len(pipeids)
-    # Assemble all lists into a dataframe where each row is the definition for one simple tank
-    added_pipes=pd.DataFrame(list(zip(pipeids,demand_nodes,reservoirids,lengths,diameters_pipes,hazen,minorloss,status,semicolons)))
-    # Exports the pipe section as a list of strings where each entry is a line of the pipes section
-    added_pipes=added_pipes.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the definition for one simple tank
+    added_pipes=__format_rows__(pipeids,demand_nodes,reservoirids,lengths,diameters_pipes,hazen,minorloss,status,semicolons)
 
     # Translates the tanks by a 100 m in both axes 
     xcoordinates=[x+2 for x in xcoordinates]
     ycoordinates=[y+2 for y in ycoordinates]
 
-    # Assemble all lists into a dataframe where each row is the coordinates for one simple tank
-    added_coordinates=pd.DataFrame(list(zip(reservoirids,xcoordinates,ycoordinates)))
-    # Exports the coordinate section as a list of strings where each entry is a line of the coordinates section
-    added_coordinates=added_coordinates.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the coordinates for one simple tank
+    added_coordinates=__format_rows__(reservoirids,xcoordinates,ycoordinates)
 
     # List of zero base demands for all nodes
     zerodemands=[0]*len(all_nodes)
     # White space indicating no patterns
     pattern=['     ']*len(all_nodes)
     semicolons=[';']*len(all_nodes)
-    nodes=pd.DataFrame(list(zip(all_nodes,all_elevations,zerodemands,pattern,semicolons)))
-    nodes=nodes.to_string(header=False,index=False).splitlines()
-
-    # opens .inp file to read
-    file=open(path,'r')
-    lines=[]            # list to store all lines in the .inp file
-    linecount=0         # Counter for the number of lines
-    junctions_marker=0  # To store the line number at which the junctions section starts
-    reservoirs_marker=0 # To store the line number at which the reservoir section ends
-    pipes_marker=0      # To store the line number at which the pumps section starts
-    coords_marker=0     # To store the line number at which the vertices section starts
-
-    # Loops over each line in the input file 
-    for line in file:
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+2
-        # Record the position of the phrase [TANKS] and subtract 1 for the end of the reservoirs section
-        if re.search('\[TANKS\]',line):
-            reservoirs_marker=linecount-1
-        # Record the position of the phrase [PUMPS] and subtract 1 to add pipes to the end of the pipe section
-        if re.search('\[PUMPS\]',line):
-            pipes_marker=linecount-1
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[VERTICES\]',line):
-            coords_marker=linecount-1
-        if re.search('Demand Model',line):
-            demand_model=linecount
-        linecount+=1
-        # Store all lines in a list
-        lines.append(line)
-    file.close()
-
-    # Translate the pipes marker by the length of the tank section that will be added before it (as it will displace all subsequent lines)
-    pipes_marker+=len(added_reservoirs)
-    # Translate the coordinates marker by the length of the added tanks and pipes
-    coords_marker+=len(added_reservoirs)+len(added_pipes)
-
-    # Inserts the created sections in their appropriate location in the list of lines
-    if demand_model:
-        lines[demand_model+1]=" Minimum Pressure   "+str(Hmin)
-        lines[demand_model+2]=" Required Pressure  "+str(Hdes)
-        demand_model+=len(added_reservoirs)+len(added_pipes)
-    lines[junctions_marker:junctions_marker+len(nodes)]=nodes
-    lines[reservoirs_marker:reservoirs_marker]=added_reservoirs
-    lines[pipes_marker:pipes_marker]=added_pipes
-    lines[coords_marker:coords_marker]=added_coordinates
-
-    # Opens a new file in the same directory to write the modified network .inp file in
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_CV-Res.inp")
-    file=open(new_file_name,'w')
-    c=0     #line counter
-
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        if c>=junctions_marker and c<=junctions_marker+len(nodes):
-            file.write(line+'\n')
-        elif c>=reservoirs_marker and c<=reservoirs_marker+len(added_reservoirs):
-            file.write(line+'\n')
-        elif c>=pipes_marker and c<=pipes_marker+len(added_pipes):
-            file.write(line+'\n')
-        elif c>=coords_marker and c<=coords_marker+len(added_coordinates):
-            file.write(line+'\n')
-        elif c>=demand_model and c<=demand_model+2:
-            file.write(line+'\n')
-        else: file.write(line)    
-        c+=1
-    file.close()
-    return new_file_name
+    nodes=__format_rows__(all_nodes,all_elevations,zerodemands,pattern,semicolons)
 
+    # Indexes the .inp file into named sections and replaces or extends each section by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[OPTIONS]","Minimum Pressure",Hmin)
+    __set_entry__(sections,"[OPTIONS]","Required Pressure",Hdes)
+    __replace_rows__(sections,"[JUNCTIONS]",nodes)
+    __append_rows__(sections,"[RESERVOIRS]",added_reservoirs)
+    __append_rows__(sections,"[PIPES]",added_pipes)
+    __append_rows__(sections,"[COORDINATES]",added_coordinates)
 
-def to_FCVEM(path:str,Hmin:float,Hdes:float):
+    # Writes the modified network .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
+
+
+def to_FCVEM(path:str,Hmin:float,Hdes:float,network=None,in_memory:bool=False,lean:bool=False):
     """
     Converts an EPANET Input file to an EPANET input file that uses the flow-restricted method FCV-Emitter (FCV-EM)
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)  
 
     Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
 
     assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
 
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
     pressure_diff=Hdes-Hmin 
 
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    xcoordinates=[]       # For storing x coordinates of demand nodes
-    ycoordinates=[]       # For storing y coordinates of demand nodes
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-    ## MAYBE SAVE ALL NODE IDS IN DATAFRAME WITH ELEVATION AND BASE DEMAND AND THEN FILTER DATA FRAME LATER FOR DEMAND NODES ONLY
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-    assert network.options.hydraulic.demand_model=='PDA', "Please use EPANET to set demand model as PDA"
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            xcoordinates.append(node[1].coordinates[0])
-            ycoordinates.append(node[1].coordinates[1])
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_FCV-EM.inp')
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"FCV-EM"+("_Lean" if lean else ""),(Hmin,Hdes),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    assert network["demand_model"]=='PDA', "Please use EPANET to set demand model as PDA"
+    junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=junctions[junctions.Demand!=0]
+
+    all_nodes=junctions.ID.tolist()                     # List of node ids of all nodes
+    all_elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+    xcoordinates=demand_junctions.X.tolist()            # x coordinates of demand nodes
+    ycoordinates=demand_junctions.Y.tolist()            # y coordinates of demand nodes
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
 
     # Adds "EM" to each demand node id to be used as ID for the corresponding emitter
     emitterids=["EM"+str(id) for id in demand_nodes]
@@ -410,10 +325,8 @@ def to_FCVEM(path:str,Hmin:float,Hdes:float):
     emitter_coeffs=[demand*1000/np.sqrt(pressure_diff) for demand in desired_demands]
     # Semicolons to end each line
     semicolons=[";"]*len(emitterids)
-    # Dataframe with all the required fields for Emitters [ID   Coefficient   ;]
-    added_emitters=pd.DataFrame(list(zip(emitterids,emitter_coeffs,semicolons)))
-    # Exports the added reservoirs as a list of strings where each entry is a line of the reservoirs section
-    added_emitters=added_emitters.to_string(header=False,index=False).splitlines()
+    # Lines with all the required fields for Emitters [ID   Coefficient   ;]
+    added_emitters=__format_rows__(emitterids,emitter_coeffs,semicolons)
 
     # Adds the phrase "AN1forNode" to each node id as the id of the first artificial node (AN) added to each demand node
     anodeids=["ANforNode"+str(id) for id in demand_nodes]
@@ -424,13 +337,11 @@ def to_FCVEM(path:str,Hmin:float,Hdes:float):
     # Semicolons to end each line
     semicolons=[";"]*len(anodeids)
     # Dataframe with all the required fields for AN1 [ID   Elevation   Demand   Pattern   ;]
-    added_nodes=pd.DataFrame(list(zip(anodeids,elevations,base_demands,demand_patterns,semicolons)))
-    #DataFrame with the emitter nodes
-    emitter_nodes=pd.DataFrame(list(zip(emitterids,elevations,base_demands,demand_patterns,semicolons)))
+    added_nodes=__format_rows__(anodeids,elevations,base_demands,demand_patterns,semicolons)
+    # Lines with the emitter nodes
+    emitter_nodes=__format_rows__(emitterids,elevations,base_demands,demand_patterns,semicolons)
     # append emitter nodes to artificial nodes
-    added_nodes=pd.concat([added_nodes,emitter_nodes])
-    # Exports the added junctions as a list of strings where each entry is a line of the junctions section
-    added_nodes=added_nodes.to_string(header=False,index=False,col_space=10).splitlines()
+    added_nodes=itertools.chain(added_nodes,emitter_nodes)
 
     # Adds the phrase PipeforNode to each node id and stores it as a pipe id
     pipeids=['Pipe1forNode'+str(id) for id in demand_nodes]
@@ -448,9 +359,7 @@ def to_FCVEM(path:str,Hmin:float,Hdes:float):
     semicolons=[";"]*len(pipeids)
     # Assemble all lists into a dataframe where each row is the definition for one simple reservoir
     # Data frame with all required fields [ID   Node1   Node2   Length   Diameter   Roughness   MinorLoss   Status   ;]
-    added_pipes=pd.DataFrame(list(zip(pipeids,demand_nodes,anodeids,lengths,diameters_pipes,hazen,minorloss,status,semicolons)))
-    # Exports the pipe section as a list of strings where each entry is a line of the pipes section
-    added_pipes=added_pipes.to_string(header=False,index=False,col_space=10).splitlines()
+    added_pipes=__format_rows__(pipeids,demand_nodes,anodeids,lengths,diameters_pipes,hazen,minorloss,status,semicolons)
 
     # Adds the phrase APSVforNode to each node id and stores it as a PSV valve id
     valveids=["FCVforNode"+str(id) for id in demand_nodes]
@@ -466,8 +375,7 @@ def to_FCVEM(path:str,Hmin:float,Hdes:float):
     # Semicolons at the end of each line
     semicolons=[';']*len(valveids)
     # Data frame with all required fields [ID   Node1   Node2   Diameter   Type   Setting   MinorLoss   ;]
-    added_valves=pd.DataFrame(list(zip(valveids,anodeids,emitterids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)))
-    added_valves=added_valves.to_string(header=False,index=False,col_space=10).splitlines()
+    added_valves=__format_rows__(valveids,anodeids,emitterids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)
 
     # Set preferred translation distance for [AN1,AN2,AT] where AN is Artificial Node and AT is the Artifical Tank
     x_direct_distance=[30,60]
@@ -482,155 +390,91 @@ def to_FCVEM(path:str,Hmin:float,Hdes:float):
     added_ycoordinates=anode_ycoord+emitter_ycoord
     ids_coords=anodeids+emitterids
 
-    # Assemble all lists into a dataframe where each row is the coordinates for one artificial reservoir or node
-    added_coordinates=pd.DataFrame(list(zip(ids_coords,added_xcoordinates,added_ycoordinates)))
-    # Exports the coordinate section as a list of strings where each entry is a line of the coordinates section
-    added_coordinates=added_coordinates.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the coordinates for one artificial reservoir or node
+    added_coordinates=__format_rows__(ids_coords,added_xcoordinates,added_ycoordinates)
 
     # List of zero base demands for all nodes
     zerodemands=[0]*len(all_nodes)
     # White space indicating no patterns
     pattern=['     ']*len(all_nodes)
     semicolons=[';']*len(all_nodes)
-    original_nodes=pd.DataFrame(list(zip(all_nodes,all_elevations,zerodemands,pattern,semicolons)))
-    original_nodes=original_nodes.to_string(header=False,index=False,col_space=10).splitlines()
-
-    # opens .inp file to read
-    file=open(path,'r')
-    lines=[]            # list to store all lines in the .inp file
-    linecount=0         # Counter for the number of lines
-    junctions_marker=0  # To store the line number at which the junctions section starts
-    emitters_marker=0   # To store the line number at which the emitter section starts
-    pipes_marker=0      # To store the line number at which the pumps section starts
-    valves_marker=0     # to store the line number at which the valves section
-    coords_marker=0     # To store the line number at which the vertices section starts
-    exponent_line=0     # To store the line number of teh emitter exponent option
-
-    # Loops over each line in the input file 
-    for line in file:
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+2
-        # Record the position of the phrase [TANKS] and add 2 to skip the header line
-        if re.search('\[EMITTERS\]',line):
-            emitters_marker=linecount+2
-        # Record the position of the phrase [PUMPS] and subtract 1 to add pipes to the end of the pipe section
-        if re.search('\[PUMPS\]',line):
-            pipes_marker=linecount-1
-        # Record the position of the phrase [VALVES] and add 2 to skip the header line
-        if re.search('\[VALVES\]',line):
-            valves_marker=linecount+2
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[VERTICES\]',line):
-            coords_marker=linecount-1
-        if re.search('Emitter Exponent',line):
-            exponent_line=linecount
-        if re.search('Demand Model',line):
-            demand_model=linecount
-        linecount+=1
-        # Store all lines in a list
-        lines.append(line)
-    file.close()
-
-
-    # Translate the pipes marker by the length of the added nodes that will be added before it (as it will displace all subsequent lines)
-    pipes_marker+=len(added_nodes)
-    # Translate the valves marker by the length of the added nodes, pipes
-    valves_marker+=len(added_pipes)+len(added_nodes)
-    # Translate the emitters marker by the length of the added nodes, pipes and valves
-    emitters_marker+=len(added_valves)+len(added_pipes)+len(added_nodes)
-    # Translate the coordinates marker by the length of the added tanks, pipes and valves
-    coords_marker+=len(added_emitters)+len(added_pipes)+len(added_valves)+len(added_nodes)
-
-    # Inserts the created sections in their appropriate location in the list of lines
-    if demand_model:
-        lines[demand_model+1]=" Minimum Pressure   "+str(Hmin)
-        lines[demand_model+2]=" Required Pressure  "+str(Hdes)
-        demand_model+=len(added_nodes)+len(added_pipes)+len(added_valves)+len(added_emitters)
-    lines[exponent_line]="Emitter Exponent      0.5000\n"
-    lines[junctions_marker:junctions_marker+len(original_nodes)]=original_nodes
-    lines[junctions_marker+len(original_nodes):junctions_marker+len(original_nodes)]=added_nodes
-    lines[pipes_marker:pipes_marker]=added_pipes
-    lines[valves_marker:valves_marker]=added_valves
-    lines[emitters_marker:emitters_marker]=added_emitters
-    lines[coords_marker:coords_marker]=added_coordinates
-
-    # Opens a new file in the same directory to write the modified network .inp file in
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_FCV-EM.inp')
-    file=open(new_file_name,'w')
-    c=0     #line counter
+    original_nodes=__format_rows__(all_nodes,all_elevations,zerodemands,pattern,semicolons)
 
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        if c>=junctions_marker and c<=junctions_marker+len(original_nodes)+len(added_nodes):
-            file.write(line+'\n')
-        elif c>=emitters_marker and c<=emitters_marker+len(added_emitters):
-            file.write(line+'\n')
-        elif c>=pipes_marker and c<=pipes_marker+len(added_pipes):
-            file.write(line+'\n')
-        elif c>=valves_marker and c<=valves_marker+len(added_valves):
-            file.write(line+'\n')
-        elif c>=coords_marker and c<=coords_marker+len(added_coordinates):
-            file.write(line+'\n')
-        elif c>=demand_model and c<=demand_model+2:
-            file.write(line+'\n')
-        else: file.write(line)    
-        c+=1
-    file.close()
-    return new_file_name
+    # Indexes the .inp file into named sections and replaces or extends each section by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[OPTIONS]","Minimum Pressure",Hmin)
+    __set_entry__(sections,"[OPTIONS]","Required Pressure",Hdes)
+    __set_entry__(sections,"[OPTIONS]","Emitter Exponent","0.5000")
+    __replace_rows__(sections,"[JUNCTIONS]",itertools.chain(original_nodes,added_nodes))
+    __append_rows__(sections,"[PIPES]",added_pipes)
+    __append_rows__(sections,"[VALVES]",added_valves)
+    __append_rows__(sections,"[EMITTERS]",added_emitters)
+    __append_rows__(sections,"[COORDINATES]",added_coordinates)
+
+    # Writes the modified network .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
 
 
-def to_FCVRes(path:str,Hmin:float,Hdes:float):
+def to_FCVRes(path:str,Hmin:float,Hdes:float,network=None,in_memory:bool=False,lean:bool=False):
     """
     Converts an EPANET Input file to an EPANET input file that uses the flow-restricted method FCV-Reservoir (FCV-Res)
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)  
 
     Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
 
     assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
 
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
     pressure_diff=Hdes-Hmin 
 
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    xcoordinates=[]       # For storing x coordinates of demand nodes
-    ycoordinates=[]       # For storing y coordinates of demand nodes
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-    assert network.options.hydraulic.demand_model=='PDA', "Please use EPANET to set demand model as PDA"
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            xcoordinates.append(node[1].coordinates[0])
-            ycoordinates.append(node[1].coordinates[1])
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_FCV-Res.inp')
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"FCV-Res"+("_Lean" if lean else ""),(Hmin,Hdes),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    assert network["demand_model"]=='PDA', "Please use EPANET to set demand model as PDA"
+    junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=junctions[junctions.Demand!=0]
+
+    all_nodes=junctions.ID.tolist()                     # List of node ids of all nodes
+    all_elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+    xcoordinates=demand_junctions.X.tolist()            # x coordinates of demand nodes
+    ycoordinates=demand_junctions.Y.tolist()            # y coordinates of demand nodes
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
 
     # Adds "AR" to each demand node id to be used as ID for AR
     reservoirids=["AR"+str(id) for id in demand_nodes]
@@ -640,10 +484,8 @@ def to_FCVRes(path:str,Hmin:float,Hdes:float):
     reservoir_patterns=["    "]*len(reservoirids)
     # Semicolons to end each line
     semicolons=[";"]*len(reservoirids)
-    # Dataframe with all the required fields for AR [ID   Elevation   Pattern   ;]
-    added_reservoirs=pd.DataFrame(list(zip(reservoirids,reservoir_elevs,reservoir_patterns,semicolons)))
-    # Exports the added reservoirs as a list of strings where each entry is a line of the reservoirs section
-    added_reservoirs=added_reservoirs.to_string(header=False,index=False).splitlines()
+    # Lines with all the required fields for AR [ID   Elevation   Pattern   ;]
+    added_reservoirs=__format_rows__(reservoirids,reservoir_elevs,reservoir_patterns,semicolons)
 
     # Adds the phrase "AN1forNode" to each node id as the id of the first artificial node (AN) added to each demand node
     anodeids=["ANforNode"+str(id) for id in demand_nodes]
@@ -651,10 +493,8 @@ def to_FCVRes(path:str,Hmin:float,Hdes:float):
     base_demands=[0]*len(anodeids)
     # No demand pattern is assigned to any demand node
     demand_patterns=["     "]*len(anodeids)
-    # Dataframe with all the required fields for AN1 [ID   Elevation   Demand   Pattern   ;]
-    added_nodes=pd.DataFrame(list(zip(anodeids,elevations,base_demands,demand_patterns,semicolons)))
-    # Exports the added junctions as a list of strings where each entry is a line of the junctions section
-    added_nodes=added_nodes.to_string(header=False,index=False,col_space=10).splitlines()
+    # Lines with all the required fields for AN1 [ID   Elevation   Demand   Pattern   ;]
+    added_nodes=__format_rows__(anodeids,elevations,base_demands,demand_patterns,semicolons)
 
     # Adds the phrase PipeforNode to each node id and stores it as a pipe id
     pipeids=['Pipe1forNode'+str(id) for id in demand_nodes]
@@ -672,9 +512,7 @@ def to_FCVRes(path:str,Hmin:float,Hdes:float):
     semicolons=[";"]*len(pipeids)
     # Assemble all lists into a dataframe where each row is the definition for one simple reservoir
     # Data frame with all required fields [ID   Node1   Node2   Length   Diameter   Roughness   MinorLoss   Status   ;]
-    added_pipes=pd.DataFrame(list(zip(pipeids,anodeids,reservoirids,lengths,diameters_pipes,hazen,minorloss,status,semicolons)))
-    # Exports the pipe section as a list of strings where each entry is a line of the pipes section
-    added_pipes=added_pipes.to_string(header=False,index=False,col_space=10).splitlines()
+    added_pipes=__format_rows__(pipeids,anodeids,reservoirids,lengths,diameters_pipes,hazen,minorloss,status,semicolons)
 
     # Adds the phrase APSVforNode to each node id and stores it as a PSV valve id
     valveids=["FCVforNode"+str(id) for id in demand_nodes]
@@ -690,8 +528,7 @@ def to_FCVRes(path:str,Hmin:float,Hdes:float):
     # Semicolons at the end of each line
     semicolons=[';']*len(valveids)
     # Data frame with all required fields [ID   Node1   Node2   Diameter   Type   Setting   MinorLoss   ;]
-    added_valves=pd.DataFrame(list(zip(valveids,demand_nodes,anodeids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)))
-    added_valves=added_valves.to_string(header=False,index=False,col_space=10).splitlines()
+    added_valves=__format_rows__(valveids,demand_nodes,anodeids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)
 
     # Set preferred translation distance for [AN1,AN2,AT] where AN is Artificial Node and AT is the Artifical Tank
     x_direct_distance=[-30,-60]
@@ -706,150 +543,214 @@ def to_FCVRes(path:str,Hmin:float,Hdes:float):
     added_ycoordinates=anode_ycoord+reservoir_ycoord
     ids_coords=anodeids+reservoirids
 
-    # Assemble all lists into a dataframe where each row is the coordinates for one artificial reservoir or node
-    added_coordinates=pd.DataFrame(list(zip(ids_coords,added_xcoordinates,added_ycoordinates)))
-    # Exports the coordinate section as a list of strings where each entry is a line of the coordinates section
-    added_coordinates=added_coordinates.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the coordinates for one artificial reservoir or node
+    added_coordinates=__format_rows__(ids_coords,added_xcoordinates,added_ycoordinates)
 
     # List of zero base demands for all nodes
     zerodemands=[0]*len(all_nodes)
     # White space indicating no patterns
     pattern=['     ']*len(all_nodes)
     semicolons=[';']*len(all_nodes)
-    original_nodes=pd.DataFrame(list(zip(all_nodes,all_elevations,zerodemands,pattern,semicolons)))
-    original_nodes=original_nodes.to_string(header=False,index=False,col_space=10).splitlines()
-
-    # opens .inp file to read
-    file=open(path,'r')
-    lines=[]            # list to store all lines in the .inp file
-    linecount=0         # Counter for the number of lines
-    junctions_marker=0  # To store the line number at which the junctions section starts
-    reservoirs_marker=0 # To store the line number at which the reservoir section ends
-    pipes_marker=0      # To store the line number at which the pumps section starts
-    valves_marker=0     # to store the line number at which the valves section
-    coords_marker=0     # To store the line number at which the vertices section starts
-
-    # Loops over each line in the input file 
-    for line in file:
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+2
-        # Record the position of the phrase [TANKS] and subtract 1 for the end of the reservoirs section
-        if re.search('\[TANKS\]',line):
-            reservoirs_marker=linecount-1
-        # Record the position of the phrase [PUMPS] and subtract 1 to add pipes to the end of the pipe section
-        if re.search('\[PUMPS\]',line):
-            pipes_marker=linecount-1
-        # Record the position of the phrase [VALVES] and add 2 to skip the header line
-        if re.search('\[VALVES\]',line):
-            valves_marker=linecount+2
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[VERTICES\]',line):
-            coords_marker=linecount-1
-        if re.search('Demand Model',line):
-            demand_model=linecount
-        linecount+=1
-        # Store all lines in a list
-        lines.append(line)
-    file.close()
-
-    # Translate the reservoirs marker by the length of the added nodes (ANs) that will be added before it (as it will displace all subsequent lines)
-    reservoirs_marker+=len(added_nodes)
-    # Translate the pipes marker by the length of the reservoir section and the added nodesthat will be added before it (as it will displace all subsequent lines)
-    pipes_marker+=len(added_reservoirs)+len(added_nodes)
-    # Translate the coordinates marker by the length of the added reservoirs, pipes and nodes
-    valves_marker+=len(added_reservoirs)+len(added_pipes)+len(added_nodes)
-    # Translate the coordinates marker by the length of the added tanks, pipes, nodes and valves
-    coords_marker+=len(added_reservoirs)+len(added_pipes)+len(added_valves)+len(added_nodes)
-
-    # Inserts the created sections in their appropriate location in the list of lines
-    if demand_model:
-        lines[demand_model+1]=" Minimum Pressure   "+str(Hmin)
-        lines[demand_model+2]=" Required Pressure  "+str(Hdes)
-        demand_model+=len(added_nodes)+len(added_pipes)+len(added_valves)+len(added_reservoirs)
-    lines[junctions_marker:junctions_marker+len(original_nodes)]=original_nodes
-    lines[junctions_marker+len(original_nodes):junctions_marker+len(original_nodes)]=added_nodes
-    lines[reservoirs_marker:reservoirs_marker]=added_reservoirs
-    lines[pipes_marker:pipes_marker]=added_pipes
-    lines[valves_marker:valves_marker]=added_valves
-    lines[coords_marker:coords_marker]=added_coordinates
-
-    # Opens a new file in the same directory to write the modified network .inp file in
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_FCV-Res.inp')
-    file=open(new_file_name,'w')
-    c=0     #line counter
+    original_nodes=__format_rows__(all_nodes,all_elevations,zerodemands,pattern,semicolons)
 
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        if c>=junctions_marker and c<=junctions_marker+len(original_nodes)+len(added_nodes):
-            file.write(line+'\n')
-        elif c>=reservoirs_marker and c<=reservoirs_marker+len(added_reservoirs):
-            file.write(line+'\n')
-        elif c>=pipes_marker and c<=pipes_marker+len(added_pipes):
-            file.write(line+'\n')
-        elif c>=valves_marker and c<=valves_marker+len(added_valves):
-            file.write(line+'\n')
-        elif c>=coords_marker and c<=coords_marker+len(added_coordinates):
-            file.write(line+'\n')
-        elif c>=demand_model and c<=demand_model+2:
-            file.write(line+'\n')
-        else: file.write(line)    
-        c+=1
-    file.close()
-    return new_file_name
+    # Indexes the .inp file into named sections and replaces or extends each section by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[OPTIONS]","Minimum Pressure",Hmin)
+    __set_entry__(sections,"[OPTIONS]","Required Pressure",Hdes)
+    __replace_rows__(sections,"[JUNCTIONS]",itertools.chain(original_nodes,added_nodes))
+    __append_rows__(sections,"[RESERVOIRS]",added_reservoirs)
+    __append_rows__(sections,"[PIPES]",added_pipes)
+    __append_rows__(sections,"[VALVES]",added_valves)
+    __append_rows__(sections,"[COORDINATES]",added_coordinates)
+
+    # Writes the modified network .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
+
+
+def to_FCVTank(path:str,Hmin:float,Hdes:float,network=None,in_memory:bool=False,lean:bool=False):
+    """
+    Converts an EPANET Input file to an EPANET input file that uses the flow- and volume-restricted method FCV-Tank
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)  
+
+    Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
 
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
 
-def to_PSVTank(path:str,Hmin:float,Hdes:float):
+    Returns: path of produced file. Saves produced file in same directory as input file
+    """
+
+    assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
+
+    file=__source_path__(path)
+    name_only=file.stem
+    dir=file.parent
+    print("Selected File: ",name_only)
+    pressure_diff=Hdes-Hmin 
+
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_FCV-Tank.inp')
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"FCV-Tank"+("_Lean" if lean else ""),(Hmin,Hdes),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    assert network["demand_model"]=='PDA', "Please use EPANET or edit the inp file to set demand model as PDA"
+    junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=junctions[junctions.Demand!=0]
+
+    all_nodes=junctions.ID.tolist()                     # List of node ids of all nodes
+    all_elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand             # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation               # Elevations of demand nodes
+
+    # Get the supply duration in minutes (/60) as an integer
+    supply_duration=int(network["duration"]/60)
+
+    # Adds the phrase ANforNode to each node id as the id of the artificial node (AN) between the valve and the pipe of each demand node
+    anodeids=["ANforNode"+str(id) for id in demand_nodes]
+    # The ANs have the elevation of their demand node and no demand or pattern
+    zeros=[0]*len(anodeids)
+    blanks=["     "]*len(anodeids)
+    semicolons=[";"]*len(anodeids)
+    # Lines with all the required fields for AN [ID   Elevation   Demand   Pattern   ;]
+    added_nodes=__format_rows__(anodeids,elevations,zeros,blanks,semicolons)
+
+    # Adds the phrase TankforNode to each node id and stores it as a tank id
+    tankids=['TankforNode'+str(id) for id in demand_nodes]
+    # Diameters of the 1 m high tanks holding the desired volume of each demand node over the supply duration
+    diameters_tanks=np.round(np.sqrt(desired_demands*60*supply_duration*4/np.pi),4)
+    # Sets Maximum levels for all tanks as 1, no volume curves are assigned
+    MaxLevel=np.ones(len(tankids))
+    # Lines with all the required fields [ID   Elevation   InitLevel   MinLevel   MaxLevel   Diameter   MinVol   VolCurve   ;]
+    tanks_section=__format_rows__(tankids,elevations,zeros,zeros,MaxLevel,diameters_tanks,zeros,blanks,semicolons)
+
+    # Adds the phrase PipeforNode to each node id and stores it as the id of the pipe from the AN to the tank
+    pipeids=['PipeforNode'+str(id) for id in demand_nodes]
+    # Calculates the length of each 50 mm pipe so that it delivers the desired demand at the pressure difference (Hazen-Williams, C=130)
+    lengths=np.round(pressure_diff*130**1.852*0.05**4.87/10.67/desired_demands**1.852,4)
+    diameters_pipes=[50]*len(pipeids)
+    hazen=[130]*len(pipeids)
+    # Sets all created pipes to work as Check Valved to prevent backflow
+    status=['CV']*len(pipeids)
+    # Lines with all the required fields [ID   Node1   Node2   Length   Diameter   Roughness   MinorLoss   Status   ;]
+    added_pipes=__format_rows__(pipeids,anodeids,tankids,lengths,diameters_pipes,hazen,zeros,status,semicolons)
+
+    # Adds the phrase FCVforNode to each node id and stores it as a flow control valve id, from the demand node to its AN
+    valveids=["FCVforNode"+str(id) for id in demand_nodes]
+    # Sets all valve diameters to 12 (will not affect head loss across valve)
+    valve_diameters=[12.0000]*len(valveids)
+    valve_types=["FCV"]*len(valveids)
+    # Sets the valve setting for each valve to the base demand of the original demand nodes (converts back to LPS)
+    valve_settings=desired_demands*1000
+    valve_minor_loss=["0.0000"]*len(valveids)
+    # Lines with all the required fields [ID   Node1   Node2   Diameter   Type   Setting   MinorLoss   ;]
+    added_valves=__format_rows__(valveids,demand_nodes,anodeids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)
+
+    # Translates the ANs by 1 m and the tanks by 2 m in both axes
+    added_coordinates=__format_rows__(anodeids+tankids,np.concatenate([demand_junctions.X+1,demand_junctions.X+2]),
+                                      np.concatenate([demand_junctions.Y+1,demand_junctions.Y+2]))
+
+    # List of zero base demands for all nodes
+    zerodemands=[0]*len(all_nodes)
+    # White space indicating no patterns
+    pattern=['     ']*len(all_nodes)
+    semicolons=[';']*len(all_nodes)
+    original_nodes=__format_rows__(all_nodes,all_elevations,zerodemands,pattern,semicolons)
+
+    # Indexes the .inp file into named sections and replaces or extends each section by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[OPTIONS]","Minimum Pressure",Hmin)
+    __set_entry__(sections,"[OPTIONS]","Required Pressure",Hdes)
+    __replace_rows__(sections,"[JUNCTIONS]",itertools.chain(original_nodes,added_nodes))
+    __append_rows__(sections,"[TANKS]",tanks_section)
+    __append_rows__(sections,"[PIPES]",added_pipes)
+    __append_rows__(sections,"[VALVES]",added_valves)
+    __append_rows__(sections,"[COORDINATES]",added_coordinates)
+
+    # Writes the modified network .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
+
+
+def to_PSVTank(path:str,Hmin:float,Hdes:float,network=None,in_memory:bool=False,lean:bool=False):
     """
     Converts an EPANET Input file to an EPANET input file that uses the volume-restricted method PSV-Tank
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)  
 
     Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
 
     assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
 
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
     pressure_diff=Hdes-Hmin 
 
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    xcoordinates=[]       # For storing x coordinates of demand nodes
-    ycoordinates=[]       # For storing y coordinates of demand nodes
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-    assert network.options.hydraulic.demand_model=='PDA', "Please use EPANET to set demand model as PDA"
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            xcoordinates.append(node[1].coordinates[0])
-            ycoordinates.append(node[1].coordinates[1])
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_PSV-Tank.inp')
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"PSV-Tank"+("_Lean" if lean else ""),(Hmin,Hdes),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    assert network["demand_model"]=='PDA', "Please use EPANET to set demand model as PDA"
+    junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=junctions[junctions.Demand!=0]
+
+    all_nodes=junctions.ID.tolist()                     # List of node ids of all nodes
+    all_elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+    xcoordinates=demand_junctions.X.tolist()            # x coordinates of demand nodes
+    ycoordinates=demand_junctions.Y.tolist()            # y coordinates of demand nodes
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
 
     # Adds the phrase TankforNode to each node id and stores it as a tank id
     tankids=['ATforNode'+str(id) for id in demand_nodes] 
@@ -868,9 +769,7 @@ def to_PSVTank(path:str,Hmin:float,Hdes:float):
     semicolons=[';']*len(tankids)
     # Assemble all lists into a dataframe where each row is the definition for one simple tank
     # Required fields in EPANET .inp [ID   Elevation   InitLevel   MinLevel   MaxLevel    Diameter   MinVol    VolCurve   ;]
-    tanks_section=pd.DataFrame(list(zip(tankids,tank_elevations,zeros,zeros,MaxLevel,diameters_tanks,zeros,VolCurve,semicolons)))
-    # Exports the tank section as a list of strings where each entry is a line of the tanks section
-    added_tanks=tanks_section.to_string(header=False,index=False,col_space=10).splitlines()
+    added_tanks=__format_rows__(tankids,tank_elevations,zeros,zeros,MaxLevel,diameters_tanks,zeros,VolCurve,semicolons)
 
     # Adds the phrase "AN1forNode" to each node id as the id of the first artificial node (AN) added to each demand node
     node1ids=["AN1forNode"+str(id) for id in demand_nodes]
@@ -881,13 +780,11 @@ def to_PSVTank(path:str,Hmin:float,Hdes:float):
     # No demand pattern is assigned to any demand node
     demand_patterns=["     "]*len(node1ids)
     # Dataframe with all the required fields for AN1 [ID   Elevation   Demand   Pattern   ;]
-    nodes1=pd.DataFrame(list(zip(node1ids,elevations,base_demands,demand_patterns,semicolons)))
-    # Dataframe with all the required fields for AN2 [ID   Elevation   Demand   Pattern   ;]
-    nodes2=pd.DataFrame(list(zip(node2ids,elevations,base_demands,demand_patterns,semicolons)))
-    # Joins both dataframes into one dataframe with all the added nodes
-    added_nodes=pd.concat([nodes1,nodes2])
-    # Exports the added junctions section as a list of strings where each entry is a line of the junctions section
-    added_nodes=added_nodes.to_string(header=False,index=False,col_space=10).splitlines()
+    nodes1=__format_rows__(node1ids,elevations,base_demands,demand_patterns,semicolons)
+    # Lines with all the required fields for AN2 [ID   Elevation   Demand   Pattern   ;]
+    nodes2=__format_rows__(node2ids,elevations,base_demands,demand_patterns,semicolons)
+    # Joins both into one section with all the added nodes
+    added_nodes=itertools.chain(nodes1,nodes2)
 
     # Adds the phrase PipeforNode to each node id and stores it as a pipe id
     pipeids=['Pipe1forNode'+str(id) for id in demand_nodes]
@@ -912,9 +809,7 @@ def to_PSVTank(path:str,Hmin:float,Hdes:float):
     semicolons=[";"]*len(pipeids)
     # Assemble all lists into a dataframe where each row is the definition for one simple tank
     # Data frame with all required fields [ID   Node1   Node2   Length   Diameter   Roughness   MinorLoss   Status   ;]
-    added_pipes=pd.DataFrame(list(zip(pipeids,from_node,to_node,lengths,diameters_pipes,hazen,minorloss,status,semicolons)))
-    # Exports the pipe section as a list of strings where each entry is a line of the pipes section
-    added_pipes=added_pipes.to_string(header=False,index=False,col_space=10).splitlines()
+    added_pipes=__format_rows__(pipeids,from_node,to_node,lengths,diameters_pipes,hazen,minorloss,status,semicolons)
 
     # Adds the phrase APSVforNode to each node id and stores it as a PSV valve id
     valveids=["APSVforNode"+str(id) for id in demand_nodes]
@@ -930,8 +825,7 @@ def to_PSVTank(path:str,Hmin:float,Hdes:float):
     # Semicolons at the end of each line
     semicolons=[';']*len(valveids)
     # Data frame with all required fields [ID   Node1   Node2   Diameter   Type   Setting   MinorLoss   ;]
-    added_valves=pd.DataFrame(list(zip(valveids,node1ids,node2ids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)))
-    added_valves=added_valves.to_string(header=False,index=False,col_space=10).splitlines()
+    added_valves=__format_rows__(valveids,node1ids,node2ids,valve_diameters,valve_types,valve_settings,valve_minor_loss,semicolons)
 
     # Set preferred translation distance for [AN1,AN2,AT] where AN is Artificial Node and AT is the Artifical Tank
     x_direct_distance=[20,40,60]
@@ -948,106 +842,38 @@ def to_PSVTank(path:str,Hmin:float,Hdes:float):
     added_ycoordinates=node1_ycoord+node2_ycoord+tank_ycoord
     ids_coords=node1ids+node2ids+tankids
 
-    # Assemble all lists into a dataframe where each row is the coordinates for one simple tank
-    added_coordinates=pd.DataFrame(list(zip(ids_coords,added_xcoordinates,added_ycoordinates)))
-    # Exports the coordinate section as a list of strings where each entry is a line of the coordinates section
-    added_coordinates=added_coordinates.to_string(header=False,index=False,col_space=10).splitlines()
+    # Formats all lists into lines where each line is the coordinates for one simple tank
+    added_coordinates=__format_rows__(ids_coords,added_xcoordinates,added_ycoordinates)
 
     # List of zero base demands for all nodes
     zerodemands=[0]*len(all_nodes)
     # White space indicating no patterns
     pattern=['     ']*len(all_nodes)
     semicolons=[';']*len(all_nodes)
-    original_nodes=pd.DataFrame(list(zip(all_nodes,all_elevations,zerodemands,pattern,semicolons)))
-    original_nodes=original_nodes.to_string(header=False,index=False,col_space=10).splitlines()
-
-    # opens .inp file to read
-    file=open(path,'r')
-    lines=[]            # list to store all lines in the .inp file
-    linecount=0         # Counter for the number of lines
-    junctions_marker=0  # To store the line number at which the junctions section starts
-    tanks_marker=0      # To store the line number at which the tanks section starts
-    pipes_marker=0      # To store the line number at which the pumps section starts
-    valves_marker=0     # to store the line number at which the valves section
-    coords_marker=0     # To store the line number at which the vertices section starts
-
-    # Loops over each line in the input file 
-    for line in file:
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+2
-        # Record the position of the phrase [TANKS] and add 2 to skip the header line
-        if re.search('\[TANKS\]',line):
-            tanks_marker=linecount+2
-        # Record the position of the phrase [PUMPS] and subtract 1 to add pipes to the end of the pipe section
-        if re.search('\[PUMPS\]',line):
-            pipes_marker=linecount-1
-        # Record the position of the phrase [VALVES] and add 2 to skip the header line
-        if re.search('\[VALVES\]',line):
-            valves_marker=linecount+2
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[VERTICES\]',line):
-            coords_marker=linecount-1
-        if re.search('Demand Model',line):
-            demand_model=linecount
-        linecount+=1
-        # Store all lines in a list
-        lines.append(line)
-    file.close()
-
-    # Translate the tanks marker by the length of the added nodes (ANs) that will be added before it (as it will displace all subsequent lines)
-    tanks_marker+=len(added_nodes)
-    # Translate the pipes marker by the length of the tank section that will be added before it (as it will displace all subsequent lines)
-    pipes_marker+=len(added_tanks)+len(added_nodes)
-    # Translate the coordinates marker by the length of the added tanks, pipes and valves
-    valves_marker+=len(added_tanks)+len(added_pipes)+len(added_nodes)
-    # Translate the coordinates marker by the length of the added tanks, pipes and valves
-    coords_marker+=len(added_tanks)+len(added_pipes)+len(added_valves)+len(added_nodes)
-
-    # Inserts the created sections in their appropriate location in the list of lines
-    if demand_model:
-        lines[demand_model+1]=" Minimum Pressure   "+str(Hmin)
-        lines[demand_model+2]=" Required Pressure  "+str(Hdes)
-        demand_model+=len(added_nodes)+len(added_pipes)+len(added_valves)+len(added_tanks)
-    lines[junctions_marker:junctions_marker+len(original_nodes)]=original_nodes
-    lines[junctions_marker+len(original_nodes):junctions_marker+len(original_nodes)]=added_nodes
-    lines[tanks_marker:tanks_marker]=added_tanks
-    lines[pipes_marker:pipes_marker]=added_pipes
-    lines[valves_marker:valves_marker]=added_valves
-    lines[coords_marker:coords_marker]=added_coordinates
-
-    # Opens a new file in the same directory to write the modified network .inp file in
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+'_PSV-Tank.inp')
-    file=open(new_file_name,'w')
-    c=0     #line counter
+    original_nodes=__format_rows__(all_nodes,all_elevations,zerodemands,pattern,semicolons)
 
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        if c>=junctions_marker and c<=junctions_marker+len(original_nodes)+len(added_nodes):
-            file.write(line+'\n')
-        elif c>=tanks_marker and c<=tanks_marker+len(added_tanks):
-            file.write(line+'\n')
-        elif c>=pipes_marker and c<=pipes_marker+len(added_pipes):
-            file.write(line+'\n')
-        elif c>=valves_marker and c<=valves_marker+len(added_valves):
-            file.write(line+'\n')
-        elif c>=coords_marker and c<=coords_marker+len(added_coordinates):
-            file.write(line+'\n')
-        elif c>=demand_model and c<=demand_model+2:
-            file.write(line+'\n')
-        else: file.write(line)    
-        c+=1
-    file.close()
-    return new_file_name
+    # Indexes the .inp file into named sections and replaces or extends each section by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[OPTIONS]","Minimum Pressure",Hmin)
+    __set_entry__(sections,"[OPTIONS]","Required Pressure",Hdes)
+    __replace_rows__(sections,"[JUNCTIONS]",itertools.chain(original_nodes,added_nodes))
+    __append_rows__(sections,"[TANKS]",added_tanks)
+    __append_rows__(sections,"[PIPES]",added_pipes)
+    __append_rows__(sections,"[VALVES]",added_valves)
+    __append_rows__(sections,"[COORDINATES]",added_coordinates)
 
+    # Writes the modified network .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
 
-def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
+
+def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float,network=None,in_memory:bool=False,demand_classes:int=None,
+                      demand_tolerance:float=None,routing_step:float=None,lean:bool=False):
     """
     Converts an EPANET Input file to an EPA-SWMM input file that uses a flow-restricted method (Outlet-Outfall)
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
@@ -1056,67 +882,77 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
     del_x_max (float): Maximum pipe length used for discretizing larger pipes. 
     Input arbitrarily high value for no discretization
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    demand_classes (int): if given, consumer demands are quantized into this many classes of (about) equal numbers of consumers and one rating
+    curve is written per class instead of per distinct demand. Each class uses the mean desired demand of its consumers. The number of curves
+    and the volume error of quantization are printed, and the demand of each class is saved in the _Demands.csv, so OutletOutfall computes
+    satisfaction against the class demand rather than the consumer's own demand (few classes can leave large per-consumer errors, e.g.,
+    up to 185% of the volume of a consumer with 3 classes on Network 1). Default: None
+
+    demand_tolerance (float): alternative to demand_classes: consumer demands are grouped into as few classes as possible such that no
+    demand differs from the demand of its class by more than this fraction, e.g., 0.05 for 5%. Curves, errors and class demands are reported
+    and saved as with demand_classes. Default: None
+
+    routing_step (float): if given, pipes are discretized adaptively for this target SWMM routing step (s), which is also set as ROUTING_STEP.
+    Each pipe is split into the fewest parts that are at most del_x_max long, but never into parts shorter than the distance a wave travels
+    in one routing step (Courant number <= 1), where the expected wave speed is the full-pipe Hazen-Williams velocity from the pipe's diameter
+    and slope plus the gravity wave speed sqrt(g*D). Pipes with fast waves are therefore split into fewer (longer) parts than del_x_max gives,
+    so del_x_max is only an upper bound and the network never has more elements than without routing_step. Pipes shorter than one wave
+    travel distance are kept whole. The node count and the Courant-stable step of the discretized network are printed.
+    The reporting step is raised to the routing step if it is longer than 10 s.
+    Default: None (all pipes split by del_x_max only)
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
-    file=pathlib.Path(path)
+    assert demand_classes is None or demand_tolerance is None, "Choose either demand_classes or demand_tolerance"
+    assert demand_classes is None or demand_classes>=1, "Number of demand classes must be at least 1"
+    assert demand_tolerance is None or 0<demand_tolerance<1, "Demand tolerance must be a fraction between 0 and 1"
+
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
     pressure_diff=Hdes-Hmin 
 
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    coords=dict()         # For storing coordinates corresponding to each node as a tuple with the id as key
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        coords[node[1].name]=node[1].coordinates
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            
-
-    conduit_ids= []       # To store IDs of the original pipes in the EPANET file
-    conduit_from= []      # To store the origin node for each pipe
-    conduit_to= []        # To store the destination node for each pipe
-    conduit_lengths= []   # To store pipe lengths
-    conduit_diameters= [] # To store pipe diameters
-
-    # Loop over each link in the EPANET model
-    for link in network.links():
-
-        # Extract and store each of the aforementioned properties
-        conduit_ids.append(link[1].name)
-        conduit_from.append(link[1].start_node_name)
-        conduit_to.append(link[1].end_node_name)
-        conduit_lengths.append(link[1].length)
-        conduit_diameters.append(link[1].diameter)
-
-    conduit_ids=["P"+conduit for conduit in conduit_ids]
-    reservoir_ids=[]      # To store the source reservoirs' IDs
-    reservoir_heads={}    # To store the total head of each reservoir indexed by ID
-    reservoir_coords={}   # To store the coordinates as tuple (x,y) indexed by ID
-
-    # Loops over each reservoir
-    for reservoir in network.reservoirs():
-        reservoir_ids.append(reservoir[1].name)
-        reservoir_heads[reservoir_ids[-1]]=reservoir[1].base_head
-        reservoir_coords[reservoir_ids[-1]]=reservoir[1].coordinates
-    reservoir_elevations={reservoir:reservoir_heads[reservoir]-30 for reservoir in reservoir_heads}
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_Outlet-Outfall.inp")
+    if routing_step is not None:
+        new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_"+str(routing_step)+"s_Outlet-Outfall.inp")
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"Outlet-Outfall"+("_Lean" if lean else ""),(Hmin,Hdes,del_x_max,demand_classes,demand_tolerance,routing_step),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, pipes, reservoirs and options of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    all_junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=all_junctions[all_junctions.Demand!=0]
+
+    all_nodes=all_junctions.ID.tolist()                 # List of node ids of all nodes
+    coords=dict(zip(all_nodes,zip(all_junctions.X.tolist(),all_junctions.Y.tolist())))   # Coordinates corresponding to each node as a tuple with the id as key
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+
+    reservoirs=network["reservoirs"]
+    reservoir_ids=reservoirs.ID.tolist()                                                    # The source reservoirs' IDs
+    reservoir_heads=dict(zip(reservoir_ids,reservoirs.Head.tolist()))                       # The total head of each reservoir indexed by ID
+    reservoir_coords=dict(zip(reservoir_ids,zip(reservoirs.X.tolist(),reservoirs.Y.tolist())))   # The coordinates as tuple (x,y) indexed by ID
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
     supply_hh=str(supply_duration//60)     # The hour value of the supply duration (quotient of total supply in minutes/ 60)
     supply_mm=str(supply_duration%60)      # The minute value of the supply duration (remainder)
 
@@ -1126,33 +962,17 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
     if len(supply_hh)<2:
         supply_hh='0'+supply_hh
 
-    # Dataframe aggregating all node information gathered from the EPANET file
-    junctions=pd.DataFrame(zip(all_nodes,all_elevations,coords.values()),columns=["ID","Elevation","Coordinates"])
-    # Set the junction ID as the index of the Dataframe
-    junctions.set_index("ID",inplace=True)
-
-    # Dataframe aggregating all conduit information gathered from the EPANET file
-    conduits=pd.DataFrame(zip(conduit_ids,conduit_from,conduit_to,conduit_lengths,conduit_diameters),columns=["ID","from node","to node","Length","diameter"])
-    # Set the conduit ID as the index
-    conduits.set_index("ID",inplace=True)
-
-    connectivity=pd.DataFrame(index=junctions.index, columns=["US","DS"])
-
-    conduits, junctions, connectivity = __match_concentric__(conduits,junctions)
-
-    conduits,junctions=__discretize_pipes__(conduits,junctions,del_x_max,reservoir_ids,reservoir_elevations,reservoir_coords)
+    # Junction and conduit tables with concentric offsets and long pipes discretized, taken from the network digest when it holds them for this del_x_max
+    conduits,junctions,reservoir_elevations=__swmm_geometry__(network,del_x_max,routing_step)
+    conduits=conduits.rename(index=lambda conduit:"P"+conduit)
     
     MaxDepth=[0]*len(junctions)
     InitDepth=MaxDepth
     SurDepth=[100] * len(junctions)  # High value to prevent surcharging
     Aponded=InitDepth
 
-    # Creates dataframe with each row representing one line from the junctions section
-    junctions_section=pd.DataFrame(list(zip(junctions.index,junctions["Elevation"],MaxDepth,InitDepth,SurDepth,Aponded)))
-    # Converts the dataframe into a list of lines in the junctions section
-    junctions_section=junctions_section.to_string(header=False,index=False,col_space=10).splitlines()
-    # adds a new line character to the end of each line in the section
-    junctions_section=[line+'\n' for line in junctions_section]
+    # Formats each line of the junctions section
+    junctions_section=__format_rows__(junctions.index,junctions["Elevation"],MaxDepth,InitDepth,SurDepth,Aponded)
 
     # Add Outfall to each demand node ID
     outfall_ids=["Outfall"+str(id) for id in demand_nodes]
@@ -1165,12 +985,8 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
     # Not gated
     outfall_gated=["NO"]*len(outfall_ids)
 
-    # Creates dataframe with each row representing one line from the outfalls section
-    outfall_section=pd.DataFrame(zip(outfall_ids,outfall_elevations,outfall_type,stage_data,outfall_gated))
-    # Converts the dataframe into a list of lines in the outfalls section
-    outfall_section=outfall_section.to_string(header=False,index=False,col_space=10).splitlines()
-    # adds a new line character to the end of each line in the section
-    outfall_section=[line+'\n' for line in outfall_section]
+    # Formats each line of the outfalls section
+    outfall_section=__format_rows__(outfall_ids,outfall_elevations,outfall_type,stage_data,outfall_gated)
 
     reservoir_elevations=[0]*len(reservoir_ids)
     MaxDepth=[max(100,max(reservoir_heads.values())+10)]*len(reservoir_ids)
@@ -1182,29 +998,27 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
     reservoir_fevap=reservoir_expon
     reservoir_psi=reservoir_fevap
 
-    storage_section=pd.DataFrame(zip(reservoir_ids,reservoir_elevations,MaxDepth,InitDepth,reservoir_shape,reservoir_coeff,reservoir_expon,reservoir_const,reservoir_fevap,reservoir_psi))
-    storage_section=storage_section.to_string(header=False,index=False,col_space=10).splitlines()
-    storage_section=[line+'\n' for line in storage_section]
+    storage_section=__format_rows__(reservoir_ids,reservoir_elevations,MaxDepth,InitDepth,reservoir_shape,reservoir_coeff,reservoir_expon,reservoir_const,reservoir_fevap,reservoir_psi)
 
     roughness=[0.011]*len(conduits)
     conduit_zeros=[0]*len(conduits)
 
-    conduits_section=pd.DataFrame(zip(conduits.index,conduits["from node"],conduits["to node"],conduits["Length"],roughness,conduit_zeros,conduit_zeros,conduit_zeros,conduit_zeros))
-    conduits_section=conduits_section.to_string(header=False,index=False,col_space=10).splitlines()
-    conduits_section=[line+'\n' for line in conduits_section]
+    conduits_section=__format_rows__(conduits.index,conduits["from node"],conduits["to node"],conduits["Length"],roughness,conduit_zeros,conduit_zeros,conduit_zeros,conduit_zeros)
 
     outlet_ids = ["Outlet"+id for id in demand_nodes]
     outlet_from = demand_nodes
     outlet_to = outfall_ids
     outlet_offset=[0]*len(outlet_ids)
     outlet_type=["TABULAR/DEPTH"]*len(outlet_ids)
-    outlet_qtable=[str(round(demand*1000000)) for demand in desired_demands]  # To generate unique Table IDs for each demand rate (not demand node) i.e., juncitons with the same demand are assigned the same outlet curve
+    # Demand of the rating curve of each outlet: its desired demand, or the mean desired demand of its class if demands are quantized
+    curve_demands=desired_demands
+    if demand_classes is not None or demand_tolerance is not None:
+        curve_demands=__quantize_demands__(desired_demands,demand_classes,demand_tolerance,supply_duration)
+    outlet_qtable=[str(round(demand*1000000)) for demand in curve_demands]  # To generate unique Table IDs for each demand rate (not demand node) i.e., juncitons with the same demand are assigned the same outlet curve
     outlet_expon=["    "]*len(outlet_ids)
     outlet_gated=["YES"]*len(outlet_ids)
 
-    outlets=pd.DataFrame(list(zip(outlet_ids,outlet_from,outlet_to,outlet_offset,outlet_type,outlet_qtable,outlet_expon,outlet_gated)))
-    outlet_section=outlets.to_string(header=False,index=False,col_space=10).splitlines()
-    outlet_section=[line+'\n' for line in outlet_section]
+    outlet_section=__format_rows__(outlet_ids,outlet_from,outlet_to,outlet_offset,outlet_type,outlet_qtable,outlet_expon,outlet_gated)
 
     shape=["FORCE_MAIN"]*len(conduits.index)
     hwcoeffs=[130]*len(shape)
@@ -1212,11 +1026,9 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
     geom4=geom3
     nbarrels=[1]*len(shape)
 
-    xsections_section=pd.DataFrame(zip(conduits.index,shape,conduits["diameter"],hwcoeffs,geom3,geom4,nbarrels))
-    xsections_section=xsections_section.to_string(header=False,index=False, col_space=10).splitlines()
-    xsections_section=[line+'\n' for line in xsections_section]
+    xsections_section=__format_rows__(conduits.index,shape,conduits["diameter"],hwcoeffs,geom3,geom4,nbarrels)
 
-    table_ids=list(set(outlet_qtable))   # removes duplicates from list
+    table_ids=list(dict.fromkeys(outlet_qtable))   # removes duplicates from list, keeping the order of first appearance
     curves_name=[]
     curves_type=[]
     curves_x=[]
@@ -1235,9 +1047,7 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
         curves_x.append(" ")
         curves_y.append(" ")
 
-    curves=pd.DataFrame(list(zip(curves_name,curves_type,curves_x,curves_y)))
-    curves_section=curves.to_string(header=False,index=False,col_space=10).splitlines()
-    curves_section=[line+'\n' for line in curves_section]
+    curves_section=__format_rows__(curves_name,curves_type,curves_x,curves_y)
 
     coords_demand= { node: coords[node] for node in demand_nodes}
     coords_ids=list(junctions.index)+reservoir_ids+outfall_ids
@@ -1252,97 +1062,47 @@ def to_Outlet_Outfall(path:str,Hmin:float,Hdes:float,del_x_max:float):
     coords_y3=[coord[1] +20 for coord in coords_demand.values()]
     coords_y=coords_y1+coords_y2+coords_y3
 
-    coordinate_section=pd.DataFrame(zip(coords_ids,coords_x,coords_y))
-    coordinate_section=coordinate_section.to_string(header=False,index=False,col_space=10).splitlines()
-    coordinate_section=[line+'\n' for line in coordinate_section]
+    coordinate_section=__format_rows__(coords_ids,coords_x,coords_y)
 
     #Setting View Dimensions
     x_left=min(coords_x)-max(coords_x)/4
     x_right=max(coords_x)+max(coords_x)/4
     y_down=min(coords_y)-max(coords_y)/4
     y_up=max(coords_y)+max(coords_y)/4
-    dimensions_line=str(x_left)+" "+str(y_down)+" "+str(x_right)+" "+str(y_up)+"\n"
-
-    # opens .inp file to read
-    file=__swmm_template__()
-    lines=[]              # list to store all lines in the .inp file
-    linecount=0           # Counter for the number of lines
-    end_time=0
-    junctions_marker=0    # To store the line number at which the junctions section starts
-    outfalls_marker=0     # To store the line number at which the emitter section starts
-    storage_marker=0      # To store the line number at which the pumps section starts
-    conduits_marker=0     # to store the line number at which the valves section
-    outlets_marker=0      # To store the line number at which the vertices section starts
-    xsections_marker=0    # To store the line number of teh emitter exponent option
-    curves_marker=0
-    coords_marker=0
-
-    # Loops over each line in the input file 
-    for line in file:
-        if re.search("^END_TIME",line):
-            end_time=linecount
-        if re.search("^DIMENSIONS",line):
-            dimensions=linecount
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+3
-        # Record the position of the phrase [TANKS] and add 2 to skip the header line
-        if re.search('\[OUTFALLS\]',line):
-            outfalls_marker=linecount+3
-        # Record the position of the phrase [PUMPS] and subtract 1 to add pipes to the end of the pipe section
-        if re.search('\[STORAGE\]',line):
-            storage_marker=linecount+3
-        # Record the position of the phrase [VALVES] and add 2 to skip the header line
-        if re.search('\[CONDUITS\]',line):
-            conduits_marker=linecount+3
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[OUTLETS\]',line):
-            outlets_marker=linecount+3
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[XSECTIONS\]',line):
-            xsections_marker=linecount+3
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[CURVES\]',line):
-            curves_marker=linecount+3
-        # Record the position of the phrase [Vertices] and subtract 1 to add Tank cooridnates to the end of the coordinates section
-        if re.search('\[COORDINATES\]',line):
-            coords_marker=linecount+3
-        # Store all lines in a list
-        lines.append(line)
-        linecount+=1
-
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_Outlet-Outfall.inp")
-    file=open(new_file_name,'w')
-    lines[end_time]="END_TIME             "+str(supply_hh)+":"+str(supply_mm)+":00\n"
-    lines[dimensions]="DIMENSIONS "+dimensions_line
-    lines[coords_marker:coords_marker]=coordinate_section
-    lines[curves_marker:curves_marker]=curves_section
-    lines[xsections_marker:xsections_marker]=xsections_section
-    lines[outlets_marker:outlets_marker]=outlet_section
-    lines[conduits_marker:conduits_marker]=conduits_section
-    lines[storage_marker:storage_marker]=storage_section
-    lines[outfalls_marker:outfalls_marker]=outfall_section
-    lines[junctions_marker:junctions_marker]=junctions_section
-
-
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        file.write(line+'\n')    
-    file.close()
-
+    dimensions_line=str(x_left)+" "+str(y_down)+" "+str(x_right)+" "+str(y_up)
+
+    # Indexes the SWMM template into named sections and fills each section by name
+    sections=__index_sections__(__swmm_template__())
+    __set_entry__(sections,"[OPTIONS]","END_TIME",str(supply_hh)+":"+str(supply_mm)+":00")
+    if routing_step is not None:
+        __set_routing_step__(sections,routing_step)
+    __set_entry__(sections,"[MAP]","DIMENSIONS",dimensions_line)
+    __append_rows__(sections,"[JUNCTIONS]",junctions_section)
+    __append_rows__(sections,"[OUTFALLS]",outfall_section)
+    __append_rows__(sections,"[STORAGE]",storage_section)
+    __append_rows__(sections,"[CONDUITS]",conduits_section)
+    __append_rows__(sections,"[OUTLETS]",outlet_section)
+    __append_rows__(sections,"[XSECTIONS]",xsections_section)
+    __append_rows__(sections,"[CURVES]",curves_section)
+    __append_rows__(sections,"[COORDINATES]",coordinate_section)
+    # The runner reads the flows of the outlets (satisfaction) and the depths of the demand nodes (pressure)
+    __set_swmm_report__(sections,demand_nodes,outlet_ids)
+
+    # Writes the .inp file in the same directory in one pass
     demands=pd.DataFrame(zip(outlet_ids,desired_demands),columns=["ID","Demand"])
     demands.set_index("ID", inplace=True)
-    demands.to_csv(new_file_name.parent/pathlib.Path(new_file_name.stem+"_Demands.csv"))
-    return new_file_name
+    if curve_demands is not desired_demands:
+        demands["Class Demand"]=curve_demands
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean,demands=demands)
 
 
-def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
+def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float,network=None,in_memory:bool=False,routing_step:float=None,lean:bool=False):
     """
     Converts an EPANET Input file to an EPA-SWMM input file that uses a volume-restricted method (Outlet-Storage)
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
@@ -1351,66 +1111,63 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     del_x_max (float): Maximum pipe length used for discretizing larger pipes. 
     Input arbitrarily high value for no discretization
 
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    routing_step (float): if given, pipes are discretized adaptively for this target SWMM routing step (s), which is also set as ROUTING_STEP.
+    Each pipe is split into the fewest parts that are at most del_x_max long, but never into parts shorter than the distance a wave travels
+    in one routing step (Courant number <= 1), where the expected wave speed is the full-pipe Hazen-Williams velocity from the pipe's diameter
+    and slope plus the gravity wave speed sqrt(g*D). Pipes with fast waves are therefore split into fewer (longer) parts than del_x_max gives,
+    so del_x_max is only an upper bound and the network never has more elements than without routing_step. Pipes shorter than one wave
+    travel distance are kept whole. The node count and the Courant-stable step of the discretized network are printed.
+    The reporting step is raised to the routing step if it is longer than 10 s.
+    Default: None (all pipes split by del_x_max only)
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
     Returns: path of produced file. Saves produced file in same directory as input file
     """
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only[0:-4])
     pressure_diff=Hdes-Hmin 
 
-    demand_nodes=[]       # For storing list of nodes that have non-zero demands
-    desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
-    elevations=[]         # For storing elevations of demand nodes
-    coords=dict()         # For storing coordinates corresponding to each node as a tuple with the id as key
-    all_nodes=[]          # For storing list of node ids of all nodes
-    all_elevations=[]     # For storing elevations of all nodes
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        all_nodes.append(node[1].name)
-        all_elevations.append(node[1].elevation)
-        coords[node[1].name]=node[1].coordinates
-        # For all nodes that have non-zero demands
-        if node[1].base_demand != 0:
-            # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-            demand_nodes.append(node[1].name)
-            desired_demands.append(node[1].base_demand)
-            elevations.append(node[1].elevation)
-            
-
-    conduit_ids= []       # To store IDs of the original pipes in the EPANET file
-    conduit_from= []      # To store the origin node for each pipe
-    conduit_to= []        # To store the destination node for each pipe
-    conduit_lengths= []   # To store pipe lengths
-    conduit_diameters= [] # To store pipe diameters
-
-    # Loop over each link in the EPANET model
-    for link in network.links():
-
-        # Extract and store each of the aforementioned properties
-        conduit_ids.append(link[1].name)
-        conduit_from.append(link[1].start_node_name)
-        conduit_to.append(link[1].end_node_name)
-        conduit_lengths.append(link[1].length)
-        conduit_diameters.append(link[1].diameter)
-
-    reservoir_ids=[]      # To store the source reservoirs' IDs
-    reservoir_heads={}    # To store the total head of each reservoir indexed by ID
-    reservoir_coords={}   # To store the coordinates as tuple (x,y) indexed by ID
-
-    # Loops over each reservoir
-    for reservoir in network.reservoirs():
-        reservoir_ids.append(reservoir[1].name)
-        reservoir_heads[reservoir_ids[-1]]=reservoir[1].base_head
-        reservoir_coords[reservoir_ids[-1]]=reservoir[1].coordinates
-    reservoir_elevations={reservoir:reservoir_heads[reservoir]-30 for reservoir in reservoir_heads}
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_Outlet-Storage.inp")
+    if routing_step is not None:
+        new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_"+str(routing_step)+"s_Outlet-Storage.inp")
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"Outlet-Storage"+("_Lean" if lean else ""),(Hmin,Hdes,del_x_max,routing_step),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, pipes, reservoirs and options of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    all_junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=all_junctions[all_junctions.Demand!=0]
+
+    all_nodes=all_junctions.ID.tolist()                 # List of node ids of all nodes
+    coords=dict(zip(all_nodes,zip(all_junctions.X.tolist(),all_junctions.Y.tolist())))   # Coordinates corresponding to each node as a tuple with the id as key
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand.tolist()    # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation.tolist()      # Elevations of demand nodes
+
+    reservoirs=network["reservoirs"]
+    reservoir_ids=reservoirs.ID.tolist()                                                    # The source reservoirs' IDs
+    reservoir_heads=dict(zip(reservoir_ids,reservoirs.Head.tolist()))                       # The total head of each reservoir indexed by ID
+    reservoir_coords=dict(zip(reservoir_ids,zip(reservoirs.X.tolist(),reservoirs.Y.tolist())))   # The coordinates as tuple (x,y) indexed by ID
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
     supply_hh=str(supply_duration//60)     # The hour value of the supply duration (quotient of total supply in minutes/ 60)
     supply_mm=str(supply_duration%60)      # The minute value of the supply duration (remainder)
 
@@ -1420,33 +1177,16 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     if len(supply_hh)<2:
         supply_hh='0'+supply_hh
 
-    # Dataframe aggregating all node information gathered from the EPANET file
-    junctions=pd.DataFrame(zip(all_nodes,all_elevations,coords.values()),columns=["ID","Elevation","Coordinates"])
-    # Set the junction ID as the index of the Dataframe
-    junctions.set_index("ID",inplace=True)
-
-    # Dataframe aggregating all conduit information gathered from the EPANET file
-    conduits=pd.DataFrame(zip(conduit_ids,conduit_from,conduit_to,conduit_lengths,conduit_diameters),columns=["ID","from node","to node","Length","diameter"])
-    # Set the conduit ID as the index
-    conduits.set_index("ID",inplace=True)
-
-    connectivity=pd.DataFrame(index=junctions.index, columns=["US","DS"])
-
-    conduits, junctions, connectivity = __match_concentric__(conduits,junctions)
-
-    conduits,junctions=__discretize_pipes__(conduits,junctions,del_x_max,reservoir_ids,reservoir_elevations,reservoir_coords)
+    # Junction and conduit tables with concentric offsets and long pipes discretized, taken from the network digest when it holds them for this del_x_max
+    conduits,junctions,reservoir_elevations=__swmm_geometry__(network,del_x_max,routing_step)
 
     MaxDepth=[0]*len(junctions)
     InitDepth=MaxDepth
     SurDepth=[100] * len(junctions)  # High value to prevent surcharging
     Aponded=InitDepth
 
-    # Creates dataframe with each row representing one line from the junctions section
-    junctions_section=pd.DataFrame(list(zip(junctions.index,junctions["Elevation"],MaxDepth,InitDepth,SurDepth,Aponded)))
-    # Converts the dataframe into a list of lines in the junctions section
-    junctions_section=junctions_section.to_string(header=False,index=False,col_space=10).splitlines()
-    # adds a new line character to the end of each line in the section
-    junctions_section=[line+'\n' for line in junctions_section]
+    # Formats each line of the junctions section
+    junctions_section=__format_rows__(junctions.index,junctions["Elevation"],MaxDepth,InitDepth,SurDepth,Aponded)
 
     # Add Outfall to each demand node ID
     outfall_ids=["Outfall_FAKE"]
@@ -1459,12 +1199,8 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     # Not gated
     outfall_gated=["NO"]
 
-    # Creates dataframe with each row representing one line from the outfalls section
-    outfall_section=pd.DataFrame(zip(outfall_ids,outfall_elevations,outfall_type,stage_data,outfall_gated))
-    # Converts the dataframe into a list of lines in the outfalls section
-    outfall_section=outfall_section.to_string(header=False,index=False,col_space=10).splitlines()
-    # adds a new line character to the end of each line in the section
-    outfall_section=[line+'\n' for line in outfall_section]
+    # Formats each line of the outfalls section
+    outfall_section=__format_rows__(outfall_ids,outfall_elevations,outfall_type,stage_data,outfall_gated)
 
     tank_height=1
 
@@ -1479,7 +1215,7 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     storage_SurDepth=[0]*len(storage_ids)
     storage_fevap=[0]*len(storage_ids)
 
-    storage_units=pd.DataFrame(zip(storage_ids,storage_elevations,storage_MaxDepth,storage_InitDepth,storage_shape,storage_curves,blanks,blanks,storage_SurDepth,storage_fevap))
+    storage_units=__format_rows__(storage_ids,storage_elevations,storage_MaxDepth,storage_InitDepth,storage_shape,storage_curves,blanks,blanks,storage_SurDepth,storage_fevap)
 
     reservoir_elevations=reservoir_elevations.values()
     MaxDepth=[max(100,max(reservoir_heads.values())+10)]*len(reservoir_ids)
@@ -1491,17 +1227,13 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     reservoir_SurDepth=reservoir_expon
     reservoir_psi=reservoir_expon
 
-    storage_section=pd.DataFrame(zip(reservoir_ids,reservoir_elevations,MaxDepth,InitDepth,reservoir_shape,reservoir_coeff,reservoir_expon,reservoir_const,reservoir_SurDepth,reservoir_psi))
-    storage_section= pd.concat([storage_section,storage_units])
-    storage_section=storage_section.to_string(header=False,index=False,col_space=10).splitlines()
-    storage_section=[line+'\n' for line in storage_section]
+    storage_section=__format_rows__(reservoir_ids,reservoir_elevations,MaxDepth,InitDepth,reservoir_shape,reservoir_coeff,reservoir_expon,reservoir_const,reservoir_SurDepth,reservoir_psi)
+    storage_section=itertools.chain(storage_section,storage_units)
 
     roughness=[0.011]*len(conduits)
     conduit_zeros=[0]*len(conduits)
 
-    conduits_section=pd.DataFrame(zip(conduits.index,conduits["from node"],conduits["to node"],conduits["Length"],roughness,conduit_zeros,conduit_zeros,conduit_zeros,conduit_zeros))
-    conduits_section=conduits_section.to_string(header=False,index=False,col_space=10).splitlines()
-    conduits_section=[line+'\n' for line in conduits_section]
+    conduits_section=__format_rows__(conduits.index,conduits["from node"],conduits["to node"],conduits["Length"],roughness,conduit_zeros,conduit_zeros,conduit_zeros,conduit_zeros)
 
     outlet_ids = ["Outlet"+id for id in demand_nodes]
     outlet_from = demand_nodes[:]
@@ -1512,8 +1244,9 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     outlet_expon=["0.5"]*len(outlet_ids)
     outlet_gated=["YES"]*len(outlet_ids)
 
+    # The fake outlet drains the first junction of the network (a tiny flow that keeps the outfall connected)
     outlet_ids.append("Outlet_FAKE")
-    outlet_from.append("1")
+    outlet_from.append(all_nodes[0])
     outlet_to.append("Outfall_FAKE")
     outlet_offset.append(0)
     outlet_type.append("FUNCTIONAL/DEPTH")
@@ -1521,9 +1254,7 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     outlet_expon.append(0)
     outlet_gated.append("YES")
 
-    outlets=pd.DataFrame(list(zip(outlet_ids,outlet_from,outlet_to,outlet_offset,outlet_type,outlet_coeff,outlet_expon,outlet_gated)))
-    outlet_section=outlets.to_string(header=False,index=False,col_space=10).splitlines()
-    outlet_section=[line+'\n' for line in outlet_section]
+    outlet_section=__format_rows__(outlet_ids,outlet_from,outlet_to,outlet_offset,outlet_type,outlet_coeff,outlet_expon,outlet_gated)
 
     shape=["FORCE_MAIN"]*len(conduits.index)
     hwcoeffs=[130]*len(shape)
@@ -1531,9 +1262,7 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     geom4=geom3
     nbarrels=[1]*len(shape)
 
-    xsections_section=pd.DataFrame(zip(conduits.index,shape,conduits["diameter"],hwcoeffs,geom3,geom4,nbarrels))
-    xsections_section=xsections_section.to_string(header=False,index=False, col_space=10).splitlines()
-    xsections_section=[line+'\n' for line in xsections_section]
+    xsections_section=__format_rows__(conduits.index,shape,conduits["diameter"],hwcoeffs,geom3,geom4,nbarrels)
 
     table_ids=list(set(storage_curves))   # removes duplicates from list
     curves_name=[]
@@ -1557,9 +1286,7 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
         curves_x.append(" ")
         curves_y.append(" ")
 
-    curves=pd.DataFrame(list(zip(curves_name,curves_type,curves_x,curves_y)))
-    curves_section=curves.to_string(header=False,index=False,col_space=10).splitlines()
-    curves_section=[line+'\n' for line in curves_section]
+    curves_section=__format_rows__(curves_name,curves_type,curves_x,curves_y)
 
     controls_section=""
     for storage in storage_ids:
@@ -1567,7 +1294,6 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
         controls_section+="IF NODE "+storage+" DEPTH > "+str(tank_height)+"\n"
         controls_section+="THEN OUTLET Outlet"+storage[14:]+" SETTING = 0 \n\n"
     controls_section=controls_section.splitlines()
-    controls_section=[line+'\n' for line in controls_section]
 
     coords_demand= { node: coords[node] for node in demand_nodes}
     coords_ids=list(junctions.index)+reservoir_ids+storage_ids
@@ -1582,119 +1308,284 @@ def to_Outlet_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float):
     coords_y3=[coord[1] +2 for coord in coords_demand.values()]
     coords_y=coords_y1+coords_y2+coords_y3
 
-    coordinate_section=pd.DataFrame(zip(coords_ids,coords_x,coords_y))
-    coordinate_section=coordinate_section.to_string(header=False,index=False,col_space=10).splitlines()
-    coordinate_section=[line+'\n' for line in coordinate_section]
+    coordinate_section=__format_rows__(coords_ids,coords_x,coords_y)
 
     #Setting View Dimensions
     x_left=min(coords_x)-max(coords_x)/4
     x_right=max(coords_x)+max(coords_x)/4
     y_down=min(coords_y)-max(coords_y)/4
     y_up=max(coords_y)+max(coords_y)/4
-    dimensions_line=str(x_left)+" "+str(y_down)+" "+str(x_right)+" "+str(y_up)+"\n"
+    dimensions_line=str(x_left)+" "+str(y_down)+" "+str(x_right)+" "+str(y_up)
+
+    # Indexes the SWMM template into named sections and fills each section by name
+    sections=__index_sections__(__swmm_template__())
+    __set_entry__(sections,"[OPTIONS]","END_TIME",str(supply_hh)+":"+str(supply_mm)+":00")
+    if routing_step is not None:
+        __set_routing_step__(sections,routing_step)
+    __set_entry__(sections,"[MAP]","DIMENSIONS",dimensions_line)
+    __append_rows__(sections,"[JUNCTIONS]",junctions_section)
+    __append_rows__(sections,"[OUTFALLS]",outfall_section)
+    __append_rows__(sections,"[STORAGE]",storage_section)
+    __append_rows__(sections,"[CONDUITS]",conduits_section)
+    __append_rows__(sections,"[OUTLETS]",outlet_section)
+    __append_rows__(sections,"[XSECTIONS]",xsections_section)
+    __append_rows__(sections,"[CONTROLS]",controls_section)
+    __append_rows__(sections,"[CURVES]",curves_section)
+    __append_rows__(sections,"[COORDINATES]",coordinate_section)
+    # The runner reads the depths of the storage tanks (satisfaction) and of the demand nodes (pressure)
+    __set_swmm_report__(sections,storage_ids+demand_nodes,[])
+
+    # Writes the .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
+
+
+def to_Float_Storage(path:str,Hmin:float,Hdes:float,del_x_max:float,network=None,in_memory:bool=False,leak_fraction:float=0.1,lean:bool=False):
+    """
+    Converts an EPANET Input file to an EPA-SWMM input file that uses the Float-Storage method: each consumer fills a private tank through
+    a float valve that throttles the inflow as the tank fills (after Campisano et al. (2019)) while the tank is drawn down at the desired
+    consumption rate over the whole day. Each consumer also leaks a fraction of its supply through an outlet at the demand node.
+    The supply is stopped at the end of the supply duration by closing the pipes connected to the source reservoirs and the simulation
+    runs for the whole day (END_TIME 23:59)
 
-    # opens .inp file to read
-    lines=__swmm_template__()
-    linecount=0           # Counter for the number of lines
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
-    # Loops over each line in the input file 
-    for line in lines:
-        if re.search("^END_TIME",line):
-            end_time=linecount
-        if re.search("^DIMENSIONS",line):
-            dimensions=linecount
-        # Record the position of the phrase [JUNCTIONS] and add 3 to skip the header lines
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+3
-        # Record the position of the phrase [OUTFALLS] and add 3 to skip the header lines
-        if re.search('\[OUTFALLS\]',line):
-            outfalls_marker=linecount+3
-        # Record the position of the phrase [STORAGE] and add 3 to skip the header lines
-        if re.search('\[STORAGE\]',line):
-            storage_marker=linecount+3
-        # Record the position of the phrase [CONDUITS] and add 3 to skip the header lines
-        if re.search('\[CONDUITS\]',line):
-            conduits_marker=linecount+3
-        # Record the position of the phrase [OUTLETS] and add 3 to skip the header lines
-        if re.search('\[OUTLETS\]',line):
-            outlets_marker=linecount+3
-        # Record the position of the phrase [XSECTIONS] and add 3 to skip the header lines
-        if re.search('\[XSECTIONS\]',line):
-            xsections_marker=linecount+3
-        # Record the position of the phrase [CURVES] and add 3 to skip the header lines
-        if re.search('\[CURVES\]',line):
-            curves_marker=linecount+3
-        if re.search('\[CONTROLS\]',line):
-            controls_marker=linecount+1
-        # Record the position of the phrase [COORDINATES] and add 3 to skip the header lines
-        if re.search('\[COORDINATES\]',line):
-            coords_marker=linecount+3
-        # Store all lines in a list
-        linecount+=1
+    Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA). The tank inlets are placed Hmin above the demand nodes
 
+    Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
-    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_Outlet-Storage.inp")
-    file=open(new_file_name,'w')
-    lines[end_time]="END_TIME             "+str(supply_hh)+":"+str(supply_mm)+":00\n"
-    lines[dimensions]="DIMENSIONS "+dimensions_line
-
-    lines[coords_marker:coords_marker]=coordinate_section
-    lines[curves_marker:curves_marker]=curves_section
-    lines[controls_marker:controls_marker]=controls_section
-    lines[xsections_marker:xsections_marker]=xsections_section
-    lines[outlets_marker:outlets_marker]=outlet_section
-    lines[conduits_marker:conduits_marker]=conduits_section
-    lines[storage_marker:storage_marker]=storage_section
-    lines[outfalls_marker:outfalls_marker]=outfall_section
-    lines[junctions_marker:junctions_marker]=junctions_section
-
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        file.write(line+'\n')    
-    file.close()
-    return new_file_name
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes. 
+    Input arbitrarily high value for no discretization
+
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk. An in-memory model (dictionary with the path the file would have been
+    saved to and its text) is returned instead, which can be passed in place of a path to any Convert_Method or Run_Method function. Default: False
+
+    leak_fraction (float): discharge coefficient of the leak outlet of each consumer as a fraction of its tank inlet's. Default: 0.1
+
+    lean (bool): if True, the file is written for running only: the visual sections (coordinates, vertices, labels, etc.) are left out
+    and all nodes and links get short IDs (N1, N2, ... and L1, L2, ...). The file name ends in _Lean and the original IDs are saved in the
+    _IDs.csv mapping next to it (or under "ids" of an in-memory model), which the Run_Method functions use to report results by the original IDs.
+    Default: False
+
+    Returns: path of produced file. Saves produced file in same directory as input file
+    """
+    assert 0<=leak_fraction, "Leak fraction must not be negative"
+    return __float_storage__(path,Hmin,Hdes,del_x_max,network,in_memory,lean,"Float-Storage",leak_fraction)
+
+
+def to_Campisano(path:str,Hmin:float,Hdes:float,del_x_max:float=5,network=None,in_memory:bool=False,lean:bool=False):
+    """
+    Converts an EPANET Input file to an EPA-SWMM input file that follows the private tank model of Campisano et al. (2019): pipes are
+    refined to short conduits (5 m by default) and each consumer fills a private tank through a float valve while the tank is drawn down
+    at the desired consumption rate over the whole day (END_TIME 23:59). Unlike Float-Storage, consumers do not leak, the conduits are not
+    offset to be concentric, the tanks sit at the demand nodes and the supply ends when the source reservoirs (twice the volume of all tanks
+    in total) run dry
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes. Default: 5
+
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk and an in-memory model is returned instead (see to_Float_Storage). Default: False
 
+    lean (bool): if True, a lean file for running only is written, without visual sections and with short IDs (see to_Float_Storage). Default: False
 
-def change_duration(path:str,duration_hr:int,duration_min:int):
+    Returns: path of produced file. Saves produced file in same directory as input file
+    """
+    return __float_storage__(path,Hmin,Hdes,del_x_max,network,in_memory,lean,"Campisano",0)
+
+
+def to_3O2S1P(path:str,Hmin:float,Hdes:float,del_x_max:float,network=None,in_memory:bool=False,lean:bool=False):
+    """
+    Converts an EPANET Input file to an EPA-SWMM input file that uses the 3O2S1P method (three outlets, two storages and one pump per consumer):
+    each consumer fills a 1 m high private tank through a pressure-dependent outlet, the tank is drawn down at the desired consumption rate
+    over the whole day (END_TIME 23:59) and any inflow above the top of the tank spills into an overflow storage from which a pump returns it
+    to the demand node. The supply ends when the source reservoirs (the volume of all tanks in total) run dry
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes. 
+    Input arbitrarily high value for no discretization
+
+    network (mapping): network digest of the input file as built by to_all, so that the file is not read again. Default: None (reads the file)
+
+    in_memory (bool): if True, the produced file is not written to disk and an in-memory model is returned instead (see to_Float_Storage). Default: False
+
+    lean (bool): if True, a lean file for running only is written, without visual sections and with short IDs (see to_Float_Storage). Default: False
+
+    Returns: path of produced file. Saves produced file in same directory as input file
+    """
+    assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
+    assert del_x_max>0, "Delta x must be a positive number"
+
+    file=__source_path__(path)
+    name_only=file.stem
+    dir=file.parent
+    print("Selected File: ",name_only[0:-4])
+    pressure_diff=Hdes-Hmin
+
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_3O2S1P.inp")
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,"3O2S1P"+("_Lean" if lean else ""),(Hmin,Hdes,del_x_max),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, pipes, reservoirs and options of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    all_junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=all_junctions[all_junctions.Demand!=0]
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand             # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation               # Elevations of demand nodes
+    reservoirs=network["reservoirs"]
+    supply_duration=int(network["duration"]/60)         # in minutes
+
+    # Junction and conduit tables with long pipes discretized, taken from the network digest when it holds them for this del_x_max
+    conduits,junctions,reservoir_elevations=__swmm_geometry__(network,del_x_max)
+
+    # Junctions with no depth and a high surcharge depth to prevent surcharging
+    zeros=[0]*len(junctions)
+    junctions_section=__format_rows__(junctions.index,junctions["Elevation"],zeros,zeros,[100]*len(junctions),zeros)
+
+    # Free outfalls at the demand nodes receive the consumption drawn from the tanks
+    outfall_ids=["Outfall"+id for id in demand_nodes]
+    outfall_section=__format_rows__(outfall_ids,elevations,["FREE"]*len(outfall_ids),["    "]*len(outfall_ids),["NO"]*len(outfall_ids))
+
+    # Private tanks (1 m high, holding the desired volume over the supply duration) and 1 m2 overflow storages at the demand nodes
+    tank_height=1
+    storage_ids=["StorageforNode"+id for id in demand_nodes]
+    overflow_ids=["OverflowforNode"+id for id in demand_nodes]
+    storage_areas=desired_demands*60*supply_duration/tank_height
+    storage_curves,tank_curve_rows=__tank_curves__(storage_areas,tank_height)
+    blanks=['    ']*len(storage_ids)
+    storage_zeros=[0]*len(storage_ids)
+    storage_units=__format_rows__(storage_ids,elevations,[max(100,reservoirs.Head.max())]*len(storage_ids),storage_zeros,["TABULAR"]*len(storage_ids),
+                                  storage_curves,blanks,blanks,storage_zeros,storage_zeros)
+    overflow_units=__format_rows__(overflow_ids,elevations,[1]*len(overflow_ids),storage_zeros,["TABULAR"]*len(overflow_ids),
+                                   ["Overflow"]*len(overflow_ids),blanks,blanks,storage_zeros,storage_zeros)
+    # The source reservoirs hold the volume of all tanks between them
+    source_units,source_curve_rows=__source_storages__(reservoirs,reservoir_elevations,storage_areas.sum()*tank_height/len(reservoirs))
+    storage_section=itertools.chain(source_units,storage_units,overflow_units)
+
+    conduit_zeros=[0]*len(conduits)
+    conduits_section=__format_rows__(conduits.index,conduits["from node"],conduits["to node"],conduits["Length"],[0.011]*len(conduits),
+                                     conduit_zeros,conduit_zeros,conduit_zeros,conduit_zeros)
+    xsections_section=__format_rows__(conduits.index,["FORCE_MAIN"]*len(conduits),conduits["diameter"],[130]*len(conduits),
+                                      conduit_zeros,conduit_zeros,[1]*len(conduits))
+
+    # Three outlets per consumer: the pressure-dependent inlet of the tank, the spill from the top of the tank into the overflow storage
+    # and the consumption drawn from the tank
+    outlet_ids=["Outlet"+id for id in demand_nodes]
+    overflow_outlet_ids=["OverflowOutlet"+id for id in demand_nodes]
+    demand_outlet_ids=["DemandOutlet"+id for id in demand_nodes]
+    n=len(demand_nodes)
+    outlet_section=__format_rows__(outlet_ids+overflow_outlet_ids+demand_outlet_ids,demand_nodes+storage_ids+storage_ids,
+                                   storage_ids+overflow_ids+outfall_ids,[0]*n+[tank_height]*n+[0]*n,
+                                   ["FUNCTIONAL/DEPTH"]*n+["TABULAR/DEPTH"]*(2*n),
+                                   (desired_demands*1000/np.sqrt(pressure_diff)).tolist()+["Drain"]*n+["Demand"+id for id in demand_nodes],
+                                   ["0.5"]*n+["     "]*(2*n),["YES"]*(3*n))
+
+    # One pump per consumer returns the overflow to the demand node
+    pump_ids=["Pump"+id for id in demand_nodes]
+    pumps_section=__format_rows__(pump_ids,overflow_ids,demand_nodes,["OVERFLOW_PUMP"]*n,["ON"]*n,[0]*n,[0]*n)
+
+    # Tank, overflow, pump, drain, consumption and source curves
+    consumption_rates=desired_demands*supply_duration/1440*1000
+    curve_rows=[tank_curve_rows,
+                __curve_rows__(["Overflow"],"Storage",[0,1],[[1,1]]),
+                __curve_rows__(["OVERFLOW_PUMP"],"Pump4",[0,1],[[0,1000]]),
+                __curve_rows__(["Drain"],"Rating",[0,1],[[0,1000]]),
+                __curve_rows__(["Demand"+id for id in demand_nodes],"Rating",[0,0.01],np.column_stack([[0]*n,consumption_rates])),
+                source_curve_rows]
+    curves_section=__format_rows__(*[np.concatenate(column) for column in zip(*curve_rows)])
+
+    # Tanks, overflow storages and outfalls are translated from their demand nodes
+    offset=20
+    coords_ids,coords_x,coords_y=__consumer_coordinates__(junctions,reservoirs,demand_junctions,
+                                                          [(storage_ids,2*offset,0),(overflow_ids,offset,offset),(outfall_ids,3*offset,0)])
+
+    # Indexes the SWMM template into named sections and fills each section by name
+    sections=__index_sections__(__swmm_template__())
+    __set_entry__(sections,"[OPTIONS]","END_TIME","23:59:00")
+    __set_entry__(sections,"[MAP]","DIMENSIONS",__map_dimensions__(coords_x,coords_y))
+    __append_rows__(sections,"[JUNCTIONS]",junctions_section)
+    __append_rows__(sections,"[OUTFALLS]",outfall_section)
+    __append_rows__(sections,"[STORAGE]",storage_section)
+    __append_rows__(sections,"[CONDUITS]",conduits_section)
+    __append_rows__(sections,"[PUMPS]",pumps_section)
+    __append_rows__(sections,"[OUTLETS]",outlet_section)
+    __append_rows__(sections,"[XSECTIONS]",xsections_section)
+    __append_rows__(sections,"[CURVES]",curves_section)
+    __append_rows__(sections,"[COORDINATES]",__format_rows__(coords_ids,coords_x,coords_y))
+    # The runner reads the depths of the tanks and demand nodes and the flows of the tank inlets and overflows
+    __set_swmm_report__(sections,storage_ids+demand_nodes,outlet_ids+overflow_outlet_ids)
+
+    # Writes the .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
+
+
+def change_duration(path:str,duration_hr:int,duration_min:int,in_memory:bool=False):
     """
     Converts an EPANET .inp file from one supply duration to another, scaling the desired demand accordingly
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     duration_hr (int): New Supply Duration (HH)
 
     duration_min (int): New Supply Duration (MM)
 
+    in_memory (bool): if True, the produced file is not written to disk and an in-memory model is returned instead (see to_CVTank). Default: False
+
     Returns: path to produced file. Saves produced file in same directory
     """
 
     assert 0<=duration_hr<=24, 'Durations of 24 hours or more are not intermittent and thus not supported'
     assert 0<=duration_min<=59, 'Enter Valid Value for minutes 0-59'
 
-    file=pathlib.Path(path)
+    file=__source_path__(path)
     name_only=file.stem
     dir=file.parent
     print("Selected File: ",name_only)
-    demand_nodes = []       # For storing list of nodes that have non-zero demands
-    desired_demands = []    # For storing demand rates desired by each node for desired volume calculations
-    elevations = []
-    patterns = []
-
-    # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(file)
-
-    # Iterates over the junction list in the Network object
-    for node in network.junctions():
-        # Record node ID (name), desired demand (base_demand) in CMS, elevations, x and y coordinates
-        demand_nodes.append(node[1].name)
-        desired_demands.append(node[1].base_demand)
-        elevations.append(node[1].elevation)
-        patterns.append(node[1].demand_timeseries_list._list[0].pattern_name)
+
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only+"_"+str(duration_hr)+"hr.inp")
+    cache_entry,cached=__from_cache__(path,None,"Duration",(duration_hr,duration_min),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass
+    network=__read_inp__(path)
+    junctions=network["junctions"]
+
+    demand_nodes=junctions.ID.tolist()              # List of all node ids
+    desired_demands=junctions.Demand.tolist()       # Demand rates desired by each node (CMS)
+    elevations=junctions.Elevation.tolist()         # Elevations of all nodes
+    patterns=junctions.Pattern.tolist()             # Demand pattern of each node (blank if none)
 
     # Get the supply duration in minutes (/60) as an integer
-    supply_duration=int(network.options.time.duration/60)
+    supply_duration=int(network["duration"]/60)
     new_duration=duration_hr*60+duration_min
     demand_multiplier=supply_duration/new_duration
     if duration_min <10:
@@ -1703,57 +1594,295 @@ def change_duration(path:str,duration_hr:int,duration_min:int):
 
     desired_demands=[demand*demand_multiplier*1000 for demand in desired_demands]
     semicolons=[";" for demand in desired_demands]
-    node_section=pd.DataFrame(list(zip(demand_nodes,elevations,desired_demands,patterns,semicolons)))
-    node_section=node_section.to_string(header=False,index=False,col_space=10).splitlines()
-
-    # opens .inp file to read
-    file=open(path,'r')
-    lines=[]            # list to store all lines in the .inp file
-    linecount=0         # Counter for the number of lines
-    junctions_marker=0  # To store the line number at which the junctions section starts
-    supply_duration_line=0
-
-    # Loops over each line in the input file 
-    for line in file:
-        # Record the position of the phrase [JUNCTIONS] and add 2 to skip the header line
-        if re.search('\[JUNCTIONS\]',line):
-            junctions_marker=linecount+2
-        if re.search('Duration',line):
-            supply_duration_line=linecount
-        linecount+=1
-        # Store all lines in a list
-        lines.append(line)
-    file.close()
-
-    # Inserts the created sections in their appropriate location in the list of lines
-    lines[supply_duration_line]="Duration      "+str(duration_hr)+":"+duration_min+"\n"
-    lines[junctions_marker:junctions_marker+len(node_section)]=node_section
-
-    print(lines[supply_duration_line])
-    # Opens a new file in the same directory to write the modified network .inp file in
-    new_file_name=dir/pathlib.Path(name_only+"_"+str(duration_hr)+"hr.inp")
-    file=open(new_file_name,'w')
-    c=0     #line counter
+    node_section=__format_rows__(demand_nodes,elevations,desired_demands,patterns,semicolons)
 
-    # All lines added by this script are missing a new line character at the end, the conditional statements below add the new line character for these lines only and writes all lines to the file
-    for line in lines:
-        if c>=junctions_marker and c<=junctions_marker+len(node_section)+len(node_section):
-            file.write(line+'\n')
-        else: file.write(line)    
-        c+=1
-    file.close()
+    # Indexes the .inp file into named sections and replaces the duration and the junctions by name
+    sections=__index_sections__(network["lines"])
+    __set_entry__(sections,"[TIMES]","Duration",str(duration_hr)+":"+duration_min)
+    __replace_rows__(sections,"[JUNCTIONS]",node_section)
+
+    print("Duration      "+str(duration_hr)+":"+duration_min)
+    # Writes the modified network .inp file in the same directory in one pass
+    if in_memory:
+        return __to_cache__(cache_entry,__in_memory__(sections,new_file_name))
+    __write_sections__(sections,new_file_name)
+    return __to_cache__(cache_entry,new_file_name)
+
+
+def change_durations(path:str,durations:list,methods:list=None,Hmin:float=None,Hdes:float=None,del_x_max:float=None,in_memory:bool=False):
+    """
+    Converts an EPANET .inp file to several supply durations at once, reading the source a single time and scaling the desired demands
+    of all durations together. Optionally converts each new file to the IWS methods directly, without reading it again
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    durations (list): New Supply Durations in hours e.g., [6,12,1.5]. Fractions of an hour are rounded to the nearest minute
+
+    methods (list): names of the methods to convert each new file to (keys of to_all's outputs, e.g., ['CV-Tank','Outlet-Outfall']).
+    Default: None (only the duration is changed)
+
+    Hmin (float): Minimum pressure in meters, required if methods are given. Default: None
+
+    Hdes (float): Desired pressure in meters, required if methods are given. Default: None
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes, required if an EPA-SWMM method is given. Default: None
+
+    in_memory (bool): if True, the produced files are not written to disk and in-memory models are returned instead (see to_CVTank). Default: False
+
+
+    Returns: dictionary of duration -> path to produced file. If methods are given, dictionary of duration -> dictionary of method name -> path
+    to produced file, with the file of the new duration itself under 'PDA'. Files are saved in the same directory as <name>_<duration>_PDA.inp
+    (e.g., Network1_6hr30min_PDA.inp) so that the converted files of different durations do not overwrite each other
+    """
+    assert len(durations)>0, "Provide at least one supply duration"
+    assert all(0<duration<=24 for duration in durations), 'Durations of 24 hours or more are not intermittent and thus not supported'
+    methods=list(methods or [])
+    unknown=[method for method in methods if method not in __method_converters__]
+    assert not unknown, "Unknown methods "+str(unknown)+". Choose from "+str(list(__method_converters__))
+    if methods:
+        assert Hmin is not None and Hdes is not None, "Hmin and Hdes are required to convert to the IWS methods"
+    swmm=any(method in __swmm_methods__ for method in methods)
+    if swmm:
+        assert del_x_max is not None, "del_x_max is required for the EPA-SWMM methods"
+
+    file=__source_path__(path)
+    name_only=file.stem
+    dir=file.parent
+    print("Selected File: ",name_only)
+
+    # Reads the junctions, options and lines of the EPANET .inp file in a single pass for all durations
+    network=__read_inp__(path)
+    junctions=network["junctions"]
+
+    # Get the supply duration in minutes (/60) as an integer and the new durations in hours and minutes
+    supply_duration=int(network["duration"]/60)
+    hours=[int(duration) for duration in durations]
+    minutes=[int(round((duration-int(duration))*60)) for duration in durations]
+    new_durations=np.array([hour*60+minute for hour,minute in zip(hours,minutes)],dtype=float)
+
+    # Desired demands of every duration in one broadcast: D x J, written in the same units as change_duration
+    desired_demands=np.outer(supply_duration/new_durations,junctions.Demand)*1000
+    semicolons=[";"]*len(junctions)
+
+    # The source is indexed into sections once. Each duration only changes [TIMES] and [JUNCTIONS]
+    sections=__index_sections__(network["lines"])
+
+    # The converters receive a digest of each new file built from the source instead of reading it: only the demands, the duration and
+    # the lines differ and the SWMM geometry does not depend on the demands. Files whose demands would be read back differently than
+    # they are written (US customary units or a [DEMANDS] section overriding the junction demands) are read from their text instead
+    derived=(network["flow_units"] not in ("CFS","GPM","MGD","IMGD","AFD")
+             and not any(row.split(';')[0].strip() for row in sections.get("[DEMANDS]",{"rows":[]})["rows"]))
+    geometry=__swmm_geometry__(network,del_x_max) if swmm and derived else None
+
+    # Named so that the methods of each duration produce distinct files (the converters drop the _PDA suffix)
+    stem=name_only[0:-4] if name_only.endswith("_PDA") else name_only
+    outputs={}
+    for i,duration in enumerate(durations):
+        duration_text=str(hours[i])+":"+str(minutes[i]).zfill(2)
+        new_file_name=dir/pathlib.Path(stem+"_"+__duration_label__(duration)+"_PDA.inp")
+
+        variant={name:{part:list(lines) for part,lines in section.items()} for name,section in sections.items()}
+        __set_entry__(variant,"[TIMES]","Duration",duration_text)
+        __replace_rows__(variant,"[JUNCTIONS]",__format_rows__(junctions.ID,junctions.Elevation,desired_demands[i],junctions.Pattern,semicolons))
+        print("Duration      "+duration_text)
+
+        # Rendered once: the text is both written and read by the converters
+        model=__in_memory__(variant,new_file_name)
+        if not in_memory:
+            with open(new_file_name,'w') as new_file:
+                new_file.write(model["text"])
+        result=model if in_memory else new_file_name
+        if not methods:
+            outputs[duration]=result
+            continue
+
+        if derived:
+            variant_network=dict(network)
+            variant_junctions=junctions.copy()
+            variant_junctions.Demand=desired_demands[i]*__flow_factors__[network["flow_units"]]
+            variant_network.update(junctions=variant_junctions,times=dict(network["times"],DURATION=duration_text),
+                                   duration=__time_to_seconds__(duration_text),lines=model["text"].splitlines(keepends=True))
+            variant_network=__freeze_network__(variant_network,del_x_max,geometry)
+        else:
+            variant_network=__read_inp__(model)
+            variant_network=__freeze_network__(variant_network,del_x_max,__swmm_geometry__(variant_network,del_x_max) if swmm else None)
+
+        outputs[duration]={"PDA":result}
+        for method in methods:
+            outputs[duration][method]=__convert__(method,result,Hmin,Hdes,del_x_max,variant_network,in_memory)
+    return outputs
+
+
+def skeletonize(path:str,pipe_diameter_threshold:float=None,tolerance:float=1.0,branch_trim:bool=True,series_pipe_merge:bool=True,
+                parallel_pipe_merge:bool=True,report:bool=True,in_memory:bool=False):
+    """
+    Simplifies an EPANET .inp file before conversion by removing dead-end branches without consumers, merging pipes in series at junctions
+    without consumers and combining parallel pipes. Consumers (junctions with demands) are never removed, so every method keeps the same demand nodes.
+    Merged pipes are hydraulically equivalent under Hazen-Williams (same head loss for any flow) and keep the pipe volume that fills during supply.
+    The produced file can be passed to any converter, e.g., to_CVTank(skeletonize(path),Hmin,Hdes)
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    pipe_diameter_threshold (float): only pipes with diameters up to this value (m) are simplified. Default: None (all pipes)
+
+    tolerance (float): maximum elevation error (m) of series merging: a junction is merged away only if its elevation is within this distance
+    of the straight line between its neighbours, so that the merged pipe keeps the elevation profile filled by the IWS methods. Default: 1.0
+
+    branch_trim (bool): remove dead-end junctions without demand and their pipes (repeated until no such dead ends remain). Default: True
+
+    series_pipe_merge (bool): merge the two pipes of junctions without demand that connect exactly two pipes. Default: True
+
+    parallel_pipe_merge (bool): combine pipes that connect the same two nodes. Default: True
+
+    report (bool): print the reduction in element counts and run both networks with EPANET to report the reduction in runtime and the
+    largest pressure difference at the consumers. Default: True
+
+    in_memory (bool): if True, the produced file is not written to disk and an in-memory model is returned instead (see to_CVTank). Default: False
+
+    Returns: path of produced file. Saves produced file in same directory as input file as <name>_Skeleton_PDA.inp
+    """
+    assert pipe_diameter_threshold is None or pipe_diameter_threshold>0, "Pipe diameter threshold must be a positive number"
+    assert tolerance>=0, "Tolerance must be a positive number"
+
+    file=__source_path__(path)
+    name_only=file.stem
+    dir=file.parent
+    print("Selected File: ",name_only)
+
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    stem=name_only[0:-4] if name_only.endswith("_PDA") else name_only
+    new_file_name=dir/pathlib.Path(stem+"_Skeleton_PDA.inp")
+    cache_entry,cached=__from_cache__(path,None,"Skeleton",(pipe_diameter_threshold,tolerance,branch_trim,series_pipe_merge,parallel_pipe_merge),
+                                      new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    with tempfile.TemporaryDirectory() as temporary:
+        # WNTR reads and writes files only, in-memory models are passed through the temporary directory
+        source=file
+        if isinstance(path,dict):
+            source=pathlib.Path(temporary)/file.name
+            with open(source,'w') as source_file:
+                source_file.write(path["text"])
+        wn=wntr.network.WaterNetworkModel(str(source))
+        original_counts=(wn.num_junctions,wn.num_pipes)
+
+        if wn.options.hydraulic.headloss!='H-W' and (series_pipe_merge or parallel_pipe_merge):
+            print("Pipe merging requires the Hazen-Williams head loss formula, only dead-end branches are trimmed")
+            series_pipe_merge=parallel_pipe_merge=False
+
+        removed_volume=__skeletonize_network__(wn,pipe_diameter_threshold,tolerance,branch_trim,series_pipe_merge,parallel_pipe_merge)
+
+        skeleton_file=pathlib.Path(temporary)/new_file_name.name
+        wntr.network.write_inpfile(wn,str(skeleton_file),units=wn.options.hydraulic.inpfile_units)
+        with open(skeleton_file,'r') as skeleton:
+            text=skeleton.read()
+
+        if report:
+            print("Junctions: ",original_counts[0]," -> ",wn.num_junctions,", Pipes: ",original_counts[1]," -> ",wn.num_pipes,
+                  ", Removed dead-end pipe volume: ",np.round(removed_volume,3)," m3")
+            __report_skeleton__(source,skeleton_file,temporary)
+
+    # Writes the skeletonized network .inp file in the same directory
+    model={"path":new_file_name,"text":text}
+    if in_memory:
+        return __to_cache__(cache_entry,model)
+    with open(new_file_name,'w') as skeleton:
+        skeleton.write(text)
+    return __to_cache__(cache_entry,new_file_name)
+
+
+def aggregate_consumers(path:str,max_distance:float,elevation_tolerance:float=1.0,max_consumers:int=None,report:bool=True,in_memory:bool=False):
+    """
+    Lumps neighbouring consumers into one consumer per cluster before conversion, so that every method adds one set of artificial elements
+    per cluster instead of one per consumer. Each cluster is represented by its consumer with the largest desired demand, which receives the
+    combined demand of the cluster (so the desired volume is kept), while the other consumers of the cluster keep no demand. Clusters only join
+    consumers with the same demand pattern that are within max_distance of pipe length and elevation_tolerance of elevation of the
+    representative, which bounds the pressure error of each lumped consumer by the elevation tolerance plus the head loss over max_distance.
+    The produced file can be passed to any converter, e.g., to_CVTank(aggregate_consumers(path,100),Hmin,Hdes)
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    max_distance (float): maximum distance (m) along pipes between a consumer and the representative of its cluster
+
+    elevation_tolerance (float): maximum elevation difference (m) between a consumer and the representative of its cluster. Default: 1.0
+
+    max_consumers (int): maximum number of consumers in a cluster. Default: None (no limit)
+
+    report (bool): print the reduction in consumers and run both networks with EPANET to report the runtimes and the largest difference
+    between the demand satisfaction of each consumer and that of its representative. Default: True
+
+    in_memory (bool): if True, the produced file is not written to disk and an in-memory model is returned instead (see to_CVTank), with
+    the consumer mapping under "consumers". Default: False
+
+    Returns: path of produced file. Saves produced file in same directory as input file as <name>_Aggregated_PDA.inp and the consumer mapping
+    as <name>_Aggregated_PDA_Consumers.csv with the columns ID (consumer), Representative and Share (fraction of the cluster demand).
+    Results of the converted files are mapped back to all consumers with Compare_Method.disaggregate
+    """
+    assert max_distance>=0, "Maximum distance must be a positive number"
+    assert elevation_tolerance>=0, "Elevation tolerance must be a positive number"
+    assert max_consumers is None or max_consumers>=1, "Clusters must allow at least one consumer"
+
+    file=__source_path__(path)
+    name_only=file.stem
+    dir=file.parent
+    print("Selected File: ",name_only)
+
+    # Not cached: the consumer mapping written next to the produced file is needed to disaggregate the results
+    stem=name_only[0:-4] if name_only.endswith("_PDA") else name_only
+    new_file_name=dir/pathlib.Path(stem+"_Aggregated_PDA.inp")
+
+    with tempfile.TemporaryDirectory() as temporary:
+        # WNTR reads and writes files only, in-memory models are passed through the temporary directory
+        source=file
+        if isinstance(path,dict):
+            source=pathlib.Path(temporary)/file.name
+            with open(source,'w') as source_file:
+                source_file.write(path["text"])
+        wn=wntr.network.WaterNetworkModel(str(source))
+
+        consumers=__cluster_consumers__(wn,max_distance,elevation_tolerance,max_consumers)
+        # Moves the demand of each cluster to its representative
+        for representative,cluster in consumers.groupby("Representative",sort=False):
+            for id in cluster.ID:
+                if id!=representative:
+                    wn.get_node(id).demand_timeseries_list[0].base_value=0.0
+            wn.get_node(representative).demand_timeseries_list[0].base_value=cluster.Demand.sum()
+        consumers["Share"]=consumers.Demand/consumers.groupby("Representative").Demand.transform("sum")
+        consumers=consumers[["ID","Representative","Share"]]
+
+        aggregated_file=pathlib.Path(temporary)/new_file_name.name
+        wntr.network.write_inpfile(wn,str(aggregated_file),units=wn.options.hydraulic.inpfile_units)
+        with open(aggregated_file,'r') as aggregated:
+            text=aggregated.read()
+
+        if report:
+            print("Consumers: ",len(consumers)," -> ",consumers.Representative.nunique()," (largest cluster ",consumers.Representative.value_counts().max(),")")
+            __report_aggregation__(source,aggregated_file,consumers,temporary)
+
+    # Writes the aggregated network .inp file and the consumer mapping in the same directory
+    if in_memory:
+        return {"path":new_file_name,"text":text,"consumers":consumers}
+    with open(new_file_name,'w') as aggregated:
+        aggregated.write(text)
+    consumers.to_csv(dir/pathlib.Path(new_file_name.stem+"_Consumers.csv"),index=False)
     return new_file_name
 
 
-def to_all(path:pathlib.Path,Hmin:float,Hdes:float,del_x_max:float):
+def to_all(path:pathlib.Path,Hmin:float,Hdes:float,del_x_max:float,workers:int=None,in_memory:bool=False,lean:bool=False):
     '''
-    converts a PDA .inp file to all 7 other methods
+    converts a PDA .inp file to all 7 other methods. The file is read (and its pipes discretized) once into a shared network digest
+    and the seven method writers run in parallel threads
 
     Parameters
     -----------
-    dir (str): Directory in which origin file is located  
-
-    file (str): Filename with extension of origin file  
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
 
     Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
 
@@ -1762,160 +1891,1679 @@ def to_all(path:pathlib.Path,Hmin:float,Hdes:float,del_x_max:float):
     del_x_max (float): Maximum pipe length used for discretizing larger pipes. 
     Input arbitrarily high value for no discretization
 
-    Returns: list of paths of produced files. Saves produced file sin same directory as input file
+    workers (int): Number of threads running the method writers. Default: None (one per method). Input 1 to run them one after another
+
+    in_memory (bool): if True, no files are written and the in-memory models of all methods are returned instead (see to_CVTank). Default: False
+
+    lean (bool): if True, lean files for running only are written, without visual sections and with short IDs (see to_CVTank). Default: False
+
+    Returns: list of paths of produced files (or in-memory models). Saves produced file sin same directory as input file
     '''
 
     assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
     assert del_x_max>0, "Delta x must be a positive number"
-    output_paths=[]
-    output_paths.append(to_CVRes(path,Hmin,Hdes))
-    output_paths.append(to_CVTank(path,Hmin,Hdes))
-    output_paths.append(to_FCVEM(path,Hmin,Hdes))
-    output_paths.append(to_FCVRes(path,Hmin,Hdes))
-    output_paths.append(to_PSVTank(path,Hmin,Hdes))
-    output_paths.append(to_Outlet_Outfall(path,Hmin,Hdes,del_x_max))
-    output_paths.append(to_Outlet_Storage(path,Hmin,Hdes,del_x_max))
+    assert workers is None or workers>=1, "Number of workers must be at least 1"
+
+    network=__network_digest__(path,del_x_max)
+    writers=list(__study_methods__)
+
+    def write(method):
+        return __convert__(method,path,Hmin,Hdes,del_x_max,network,in_memory,lean)
+
+    # The writers only read the digest, so they can share it across threads. Output paths keep the order of the methods above
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or len(writers)) as executor:
+        output_paths=list(executor.map(write,writers))
 
     return output_paths
 
 
-def __match_concentric__(conduits:pd.DataFrame,junctions:pd.DataFrame):
+def convert_directory(pattern:str,Hmin:float,Hdes:float,del_x_max:float,durations:list=None,methods:list=None,workers:int=None,
+                      index_path:pathlib.Path=None,lean:bool=False):
+    """
+    Converts every PDA .inp file matching a glob pattern to several supply durations and methods in parallel worker processes.
+    Each source and duration is read once and shared by all of its methods. A file that fails to convert is recorded in the summary
+    and the remaining files are converted. On Windows and macOS, call this function from under if __name__=="__main__":
+
+    Parameters
+    -----------
+    pattern (str): glob pattern of the source PDA .inp files, e.g., "DMAs/*_PDA.inp". Use ** to match subdirectories
+
+    Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes of the EPA-SWMM methods.
+    Input arbitrarily high value for no discretization
+
+    durations (list): supply durations in hours to convert each source to, e.g., [4, 6, 12.5]. Default: None (keeps the duration of the sources)
+    The PDA file of each duration is saved next to its source as <name>_<duration>_PDA.inp (e.g., Network1_6hr_PDA.inp for Network1_PDA.inp)
+    (these files match patterns such as *_PDA.inp in later batches)
+
+    methods (list): names of the methods to convert to, any of 'CV-Res', 'CV-Tank', 'FCV-EM', 'FCV-Res', 'PSV-Tank', 'FCV-Tank', 'Outlet-Outfall',
+    'Outlet-Storage', 'Float-Storage', 'Campisano' and '3O2S1P'. Default: None (the 7 methods of to_all)
+
+    workers (int): Number of worker processes. Default: None (one per CPU)
+
+    index_path (str): path of a csv file to save the summary index to. Default: None (not saved)
+
+    lean (bool): if True, the methods are written as lean files for running only, without visual sections and with short IDs (see to_CVTank).
+    The PDA files of changed durations are written in full. Default: False
+
+
+    Returns: summary index as a Pandas DataFrame with one row per produced file and the columns Source, Duration (hr), Method
+    (PDA for the files of changed duration), Output (path of produced file, empty if failed), Read (s) (time taken to read the source of that
+    duration once), Time (s) (time taken to produce the file) and Error (empty if successful)
+    """
+    assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
+    assert del_x_max>0, "Delta x must be a positive number"
+    assert workers is None or workers>=1, "Number of workers must be at least 1"
+
+    sources=sorted(glob.glob(str(pattern),recursive=True))
+    assert len(sources)>0, "No files match the pattern "+str(pattern)
+    if methods is None:
+        methods=list(__study_methods__)
+    unknown=[method for method in methods if method not in __method_converters__]
+    assert len(unknown)==0, "Unknown methods "+str(unknown)+". Choose from "+str(list(__method_converters__))
+    if durations is None:
+        durations=[None]
+
+    # One task per source and duration, so that the methods of a task share one read of the file
+    tasks=[(source,duration) for source in sources for duration in durations]
+    rows=[]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures={executor.submit(__convert_task__,source,duration,methods,Hmin,Hdes,del_x_max,lean):(source,duration) for source,duration in tasks}
+        for i,future in enumerate(concurrent.futures.as_completed(futures)):
+            source,duration=futures[future]
+            try:
+                task_rows=future.result()
+            # The worker process itself failed (e.g., ran out of memory), all files of the task are recorded as failed
+            except Exception as error:
+                task_rows=[__summary_row__(source,duration,method,None,np.nan,np.nan,error) for method in methods]
+            rows.extend(task_rows)
+            failed=sum(row["Error"]!="" for row in task_rows)
+            print(str(i+1)+"/"+str(len(tasks))," ",pathlib.Path(source).name," ",__duration_label__(duration)," ",
+                  "OK" if failed==0 else str(failed)+" failed")
+
+    index=pd.DataFrame(rows,columns=["Source","Duration (hr)","Method","Output","Read (s)","Time (s)","Error"])
+    method_order={method:i for i,method in enumerate(["PDA"]+list(__method_converters__))}
+    index=index.sort_values(["Source","Duration (hr)","Method"],key=lambda column:column.map(method_order) if column.name=="Method" else column)
+    index=index.reset_index(drop=True)
+    print("Converted ",int((index.Error=="").sum())," files, ",int((index.Error!="").sum())," failed")
+    if index_path is not None:
+        index.to_csv(index_path,index=False)
+    return index
+
+
+def make_template(path:str,method:str,Hmin:float,Hdes:float,del_x_max:float=None):
+    """
+    Converts an EPANET .inp file to one method and keeps the converted file as a template for scenarios that only change the desired demands
+    or the pressure thresholds (see write_scenarios). The source is read once and its network digest is kept with the template
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    method (str): name of the method to convert to, any of 'CV-Res', 'CV-Tank', 'FCV-EM', 'FCV-Res', 'PSV-Tank', 'FCV-Tank', 'Outlet-Outfall',
+    'Outlet-Storage', 'Float-Storage', 'Campisano' and '3O2S1P'
+
+    Hmin (float): Value of the minimum pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    Hdes (float): Value of the desired pressure Hmin used for Pressure-Dependent Analysis (PDA)
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes, required for the EPA-SWMM methods. Default: None
+
+
+    Returns: template (dictionary) with the method, its parameters, the network digest of the source, the path and text of the converted file
+    and the position of each section in the text
+    """
+    assert method in __method_converters__, "Unknown method "+str(method)+". Choose from "+str(list(__method_converters__))
+    assert method not in __swmm_methods__ or del_x_max is not None, "del_x_max is required for the EPA-SWMM methods"
+
+    network=__network_digest__(path,del_x_max if method in __swmm_methods__ else None)
+    model=__convert__(method,path,Hmin,Hdes,del_x_max,network,in_memory=True)
+    return {"method":method,"Hmin":Hmin,"Hdes":Hdes,"del_x_max":del_x_max,"source":path,"network":network,
+            "path":model["path"],"text":model["text"],"spans":__section_spans__(model["text"])}
+
+
+def write_scenarios(template:dict,scenarios:dict,in_memory:bool=False):
+    """
+    Writes scenario variants of a converted file from its template (see make_template) by patching only the sections that depend on the
+    desired demands and pressure thresholds (e.g., [TANKS] and [PIPES] of CV-Tank, [EMITTERS] and [VALVES] of FCV-EM, [CURVES] and [OUTLETS]
+    of Outlet-Outfall or [STORAGE] and [OUTLETS] of Outlet-Storage). All other sections (e.g., the junctions, conduits and coordinates) are
+    copied from the template text as they are. Variants are identical to converting each scenario from scratch
+
+    Parameters
+    -----------
+    template (dict): template returned by make_template
+
+    scenarios (dict): scenario name -> dictionary of the changes of that scenario, any of
+        'Hmin' (float) and 'Hdes' (float): new pressure thresholds. Default: those of the template
+        'demand_multiplier' (float): factor applied to the desired demands of all consumers. Default: 1
+        'demands' (dict): consumer ID -> new desired demand (m3/s), applied after the multiplier. Default: None (no change)
+    Demands can be changed but not set to zero, so that every scenario keeps the consumers (and the artificial elements) of the template
+
+    in_memory (bool): if True, the produced files are not written to disk and in-memory models are returned instead (see to_CVTank). Default: False
+
+
+    Returns: dictionary of scenario name -> path of produced file. Saves produced files next to the template's file as <template name>_<scenario name>.inp
+    (e.g., Network1_12hr_CV-Tank_High.inp), with the desired demands for Outlet-Outfall
+    """
+    method=template["method"]
+    network=template["network"]
+    junctions=network["junctions"]
+    consumers=junctions.Demand!=0
+    base_path=pathlib.Path(template["path"])
+
+    outputs={}
+    for name,changes in scenarios.items():
+        unknown=set(changes)-{"Hmin","Hdes","demand_multiplier","demands"}
+        assert not unknown, "Unknown scenario changes "+str(sorted(unknown))
+        Hmin=changes.get("Hmin",template["Hmin"])
+        Hdes=changes.get("Hdes",template["Hdes"])
+
+        # Desired demands of the scenario, keeping the consumers of the template
+        demands=junctions.Demand*changes.get("demand_multiplier",1)
+        if changes.get("demands"):
+            positions={id:i for i,id in enumerate(junctions.ID.tolist())}
+            assert all(id in positions for id in changes["demands"]), "Scenario demands of nodes that are not in the network"
+            for id,demand in changes["demands"].items():
+                demands[positions[id]]=demand
+        assert ((demands!=0)==consumers).all(), "Scenarios must keep the consumers of the template (no demands set to or from zero)"
+
+        variant=dict(network)
+        variant_junctions=junctions.copy()
+        variant_junctions.Demand=demands
+        variant["junctions"]=variant_junctions
+        variant=types.MappingProxyType(variant)
+
+        # The converter only assembles the sections: rows are formatted when a section is written, so that copied sections are never formatted
+        with contextlib.redirect_stdout(io.StringIO()):
+            __capture__.sections=True
+            try:
+                model=__convert__(method,template["source"],Hmin,Hdes,template["del_x_max"],variant,in_memory=True)
+            finally:
+                __capture__.sections=False
+        new_file_name=base_path.parent/pathlib.Path(base_path.stem+"_"+str(name)+".inp")
+
+        buffer=io.StringIO()
+        for section_name,section in model["sections"].items():
+            span=template["spans"].get(section_name)
+            if section_name in __template_static__ and span is not None:
+                buffer.write(template["text"][span[0]:span[1]])
+            else:
+                __write_sections__({section_name:section},buffer)
+        result={"path":new_file_name,"text":buffer.getvalue(),**{key:value for key,value in model.items() if key not in ("path","sections")}}
+
+        if not in_memory:
+            with open(new_file_name,'w') as new_file:
+                new_file.write(result["text"])
+            if result.get("demands") is not None:
+                result["demands"].to_csv(new_file_name.parent/pathlib.Path(new_file_name.stem+"_Demands.csv"))
+            result=new_file_name
+        outputs[name]=result
+        print("Scenario ",name,": ",pathlib.Path(new_file_name).name)
+    return outputs
+
+
+def set_cache(directory:pathlib.Path=None,max_size_mb:float=1024,max_entries:int=None):
+    """
+    Enables (or disables) the conversion cache. When enabled, every Convert_Method function first looks up its conversion in the cache
+    and returns a copy of the cached file instead of converting again. Conversions are keyed by the content of the source file, the method,
+    its parameters (Hmin, Hdes, del_x_max or the new duration) and the package version. New conversions are added to the cache and the least
+    recently used entries are removed once the cache exceeds its limits.
+    The cache can also be enabled by setting the IWS_MODELLING_CACHE environment variable to the cache directory (e.g., in CI)
+
+    Parameters
+    -----------
+    directory (str): directory of the cache. relative or full absolute path, created if missing. Default: None (disables the cache)
+
+    max_size_mb (float): Maximum total size of the cached files in MB. Default: 1024
+
+    max_entries (int): Maximum number of cached conversions. Default: None (no limit)
+
+    Returns: None
+    """
+    assert max_size_mb is None or max_size_mb>0, "Maximum cache size must be a positive number"
+    assert max_entries is None or max_entries>=1, "Maximum number of entries must be at least 1"
+
+    if directory is not None:
+        directory=pathlib.Path(directory).expanduser()
+        directory.mkdir(parents=True,exist_ok=True)
+    __cache_settings__.update(directory=directory,max_size_mb=max_size_mb,max_entries=max_entries)
+
 
+def cache_info(directory:pathlib.Path=None):
+    """
+    Lists the conversions stored in the conversion cache
+
+    Parameters
+    -----------
+    directory (str): directory of the cache. Default: None (the directory set with set_cache or IWS_MODELLING_CACHE)
+
+
+    Returns: Pandas DataFrame with one row per cached conversion (most recently used first) indexed by the cache key,
+    with the columns Method, Source (name of the source file), Parameters, Version, Size (MB) and Last Used
+    """
+    entries=__cache_entries__(__cache_directory__(directory))
+    columns=["Method","Source","Parameters","Version","Size (MB)","Last Used"]
+    rows=[[entry["method"],entry["source"],entry["parameters"],entry["version"],entry["size"]/1e6,
+           pd.Timestamp(entry["last_used"],unit='s')] for entry in entries]
+    return pd.DataFrame(rows,index=pd.Index([entry["key"] for entry in entries],name="Key"),columns=columns)
+
+
+def prune_cache(max_size_mb:float=None,max_entries:int=None,directory:pathlib.Path=None):
+    """
+    Removes the least recently used conversions from the conversion cache until it is within the given limits
+
+    Parameters
+    -----------
+    max_size_mb (float): Maximum total size of the cached files in MB. Default: None (the limit set with set_cache)
+
+    max_entries (int): Maximum number of cached conversions. Default: None (the limit set with set_cache)
+
+    directory (str): directory of the cache. Default: None (the directory set with set_cache or IWS_MODELLING_CACHE)
+
+
+    Returns: number of removed conversions
+    """
+    if max_size_mb is None:
+        max_size_mb=__cache_settings__["max_size_mb"]
+    if max_entries is None:
+        max_entries=__cache_settings__["max_entries"]
+    return __prune_cache__(__cache_directory__(directory),max_size_mb,max_entries)
+
+
+def clear_cache(directory:pathlib.Path=None):
+    """
+    Removes all conversions from the conversion cache
+
+    Parameters
+    -----------
+    directory (str): directory of the cache. Default: None (the directory set with set_cache or IWS_MODELLING_CACHE)
+
+
+    Returns: number of removed conversions
+    """
+    directory=__cache_directory__(directory)
+    entries=__cache_entries__(directory)
+    with __cache_lock__:
+        for entry in entries:
+            shutil.rmtree(directory/entry["key"],ignore_errors=True)
+    return len(entries)
+
+
+def __convert__(method:str,path,Hmin:float,Hdes:float,del_x_max:float,network,in_memory:bool=False,lean:bool=False):
+    # Calls the converter of a method by name, passing del_x_max only to the EPA-SWMM methods
+    if method in __swmm_methods__:
+        return __method_converters__[method](path,Hmin,Hdes,del_x_max,network=network,in_memory=in_memory,lean=lean)
+    return __method_converters__[method](path,Hmin,Hdes,network=network,in_memory=in_memory,lean=lean)
+
+
+def __convert_task__(source:str,duration:float,methods:list,Hmin:float,Hdes:float,del_x_max:float,lean:bool=False):
+    # Converts one source to one duration and all requested methods in a worker process. Errors are recorded in the summary rows
+    # instead of raised so that one bad file does not stop the batch
+    rows=[]
+    path=pathlib.Path(source)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if duration is not None:
+            start=time.perf_counter()
+            try:
+                hours=int(duration)
+                minutes=int(round((duration-hours)*60))
+                model=change_duration(path,hours,minutes,in_memory=True)
+                # Named so that the methods of each duration produce distinct files (the converters drop the _PDA suffix)
+                stem=path.stem[0:-4] if path.stem.endswith("_PDA") else path.stem
+                path=path.parent/pathlib.Path(stem+"_"+__duration_label__(duration)+"_PDA.inp")
+                with open(path,'w') as file:
+                    file.write(model["text"])
+                rows.append(__summary_row__(source,duration,"PDA",path,np.nan,time.perf_counter()-start,None))
+            except Exception as error:
+                rows.append(__summary_row__(source,duration,"PDA",None,np.nan,time.perf_counter()-start,error))
+                return rows+[__summary_row__(source,duration,method,None,np.nan,np.nan,"Duration change failed") for method in methods]
+
+        # Reads the file once for all methods (with the SWMM geometry only if a SWMM method is requested)
+        start=time.perf_counter()
+        try:
+            network=__network_digest__(path,del_x_max if any(method in __swmm_methods__ for method in methods) else None)
+        except Exception as error:
+            return rows+[__summary_row__(source,duration,method,None,time.perf_counter()-start,np.nan,error) for method in methods]
+        read_time=time.perf_counter()-start
+
+        for method in methods:
+            start=time.perf_counter()
+            try:
+                output=__convert__(method,path,Hmin,Hdes,del_x_max,network,lean=lean)
+                rows.append(__summary_row__(source,duration,method,output,read_time,time.perf_counter()-start,None))
+            except Exception as error:
+                rows.append(__summary_row__(source,duration,method,None,read_time,time.perf_counter()-start,error))
+    return rows
+
+
+def __summary_row__(source:str,duration:float,method:str,output,read_time:float,convert_time:float,error):
+    # One row of the convert_directory summary index
+    if isinstance(error,Exception):
+        error=type(error).__name__+": "+str(error)
+    return {"Source":str(source),"Duration (hr)":np.nan if duration is None else duration,"Method":method,
+            "Output":"" if output is None else str(output),"Read (s)":read_time,"Time (s)":convert_time,"Error":error or ""}
+
+
+def __duration_label__(duration:float):
+    # Label of a supply duration in file names, e.g., 6hr or 6hr30min
+    if duration is None:
+        return "source duration"
+    hours=int(duration)
+    minutes=int(round((duration-hours)*60))
+    return str(hours)+"hr"+(str(minutes)+"min" if minutes>0 else "")
+
+
+def __quantize_demands__(desired_demands:list,demand_classes:int,demand_tolerance:float,supply_duration:float):
+    # Groups the desired demands into classes and returns the demand of each consumer's class (the mean desired demand of the class,
+    # so that the desired volume of each class is kept). Prints the number of classes and the volume error this introduces
+    demands=np.asarray(desired_demands,dtype=float)
+    values,inverse,counts=np.unique(demands,return_inverse=True,return_counts=True)
+
+    if demand_classes is not None:
+        # Equal-count bins over the sorted demands. Equal demands always fall in the same class
+        starts=np.cumsum(counts)-counts
+        value_class=np.floor(starts*min(demand_classes,len(demands))/len(demands)).astype(int)
+    else:
+        # Greedy grouping of the sorted demands: a class is extended while all of its demands stay within the tolerance of its mean
+        value_class=np.empty(len(values),dtype=int)
+        current=0
+        first=0
+        class_total=0.0
+        class_count=0
+        for i in range(len(values)):
+            mean=(class_total+values[i]*counts[i])/(class_count+counts[i])
+            if i>first and (mean-values[first]>demand_tolerance*values[first] or values[i]-mean>demand_tolerance*values[i]):
+                current+=1
+                first=i
+                class_total=0.0
+                class_count=0
+            class_total+=values[i]*counts[i]
+            class_count+=counts[i]
+            value_class[i]=current
+    value_class=np.unique(value_class,return_inverse=True)[1]
+
+    # Count-weighted mean demand of each class
+    class_demands=np.bincount(value_class,weights=values*counts)/np.bincount(value_class,weights=counts)
+    curve_demands=class_demands[value_class][inverse]
+
+    # Volume errors over the supply duration (minutes): per consumer relative to its desired volume, and of the whole network
+    errors=curve_demands-demands
+    relative_errors=np.abs(errors)/np.where(demands!=0,np.abs(demands),1)
+    print("Demand classes: ",len(class_demands)," rating curves for ",len(values)," distinct demands")
+    print("Volume error: total ",np.round(errors.sum()*supply_duration*60,6)," m3 (",np.round(errors.sum()/demands.sum()*100,4),"% )",
+          ", per consumer mean ",np.round(relative_errors.mean()*100,2),"% max ",np.round(relative_errors.max()*100,2),"%")
+    return curve_demands.tolist()
+
+
+def __skeletonize_network__(wn,pipe_diameter_threshold:float,tolerance:float,branch_trim:bool,series_pipe_merge:bool,parallel_pipe_merge:bool):
+    # Simplifies a WNTR network model in place until no more elements can be removed. Returns the pipe volume (m3) of removed dead-end branches
+    threshold=np.inf if pipe_diameter_threshold is None else pipe_diameter_threshold
+    # Elements used by controls are kept as they are
+    protected=set()
+    for name,control in wn.controls():
+        protected.update(element.name for element in control.requires())
+
+    def simple_pipe(pipe):
+        return (pipe.name not in protected and pipe.diameter<=threshold and not pipe.check_valve
+                and str(pipe.initial_status).upper() in ("OPEN","1","LINKSTATUS.OPEN"))
+
+    def removable(junction_name):
+        junction=wn.get_node(junction_name)
+        return (junction_name not in protected and junction.emitter_coefficient in (None,0)
+                and sum(demand.base_value for demand in junction.demand_timeseries_list)==0)
+
+    removed_volume=0.0
+    changed=True
+    while changed:
+        changed=False
+        # Links of each node, rebuilt on every pass
+        node_links={name:[] for name in wn.node_name_list}
+        for name,link in wn.links():
+            node_links[link.start_node_name].append(name)
+            node_links[link.end_node_name].append(name)
+
+        for junction_name in list(wn.junction_name_list):
+            links=node_links[junction_name]
+            if not removable(junction_name) or any(link not in wn.pipe_name_list for link in links):
+                continue
+            pipes=[wn.get_link(link) for link in links]
+            if not all(simple_pipe(pipe) for pipe in pipes):
+                continue
+
+            # Dead end without consumers: carries no flow, only its volume is lost
+            if branch_trim and len(pipes)==1:
+                pipe=pipes[0]
+                other=pipe.end_node_name if pipe.start_node_name==junction_name else pipe.start_node_name
+                removed_volume+=pipe.length*np.pi*pipe.diameter**2/4
+                wn.remove_link(pipe.name)
+                wn.remove_node(junction_name)
+                node_links[other].remove(pipe.name)
+                node_links.pop(junction_name)
+                changed=True
+
+            # Junction between two pipes without consumers: one equivalent pipe if the junction lies on the line between its neighbours
+            elif series_pipe_merge and len(pipes)==2:
+                first,second=pipes
+                start=first.start_node_name if first.end_node_name==junction_name else first.end_node_name
+                end=second.end_node_name if second.start_node_name==junction_name else second.start_node_name
+                if start==end or first.name==second.name:
+                    continue
+                start_elevation=__node_elevation__(wn,start)
+                end_elevation=__node_elevation__(wn,end)
+                interpolated=start_elevation+(end_elevation-start_elevation)*first.length/(first.length+second.length)
+                if abs(wn.get_node(junction_name).elevation-interpolated)>tolerance:
+                    continue
+                length,diameter,roughness,minor_loss=__series_equivalent__(first,second)
+                wn.remove_link(first.name)
+                wn.remove_link(second.name)
+                wn.remove_node(junction_name)
+                wn.add_pipe(first.name,start,end,length=length,diameter=diameter,roughness=roughness,minor_loss=minor_loss)
+                # The equivalent pipe takes the name of the first pipe
+                node_links.pop(junction_name)
+                node_links[end][node_links[end].index(second.name)]=first.name
+                changed=True
+
+        if parallel_pipe_merge:
+            # Pipes connecting the same pair of nodes, combined into the first of them
+            groups={}
+            for name,pipe in wn.pipes():
+                if simple_pipe(pipe):
+                    groups.setdefault(frozenset((pipe.start_node_name,pipe.end_node_name)),[]).append(pipe)
+            for nodes,pipes in groups.items():
+                # Loops from a node to itself are left as they are
+                if len(pipes)<2 or len(nodes)<2:
+                    continue
+                first=pipes[0]
+                length,diameter,roughness,minor_loss=__parallel_equivalent__(pipes)
+                for pipe in pipes:
+                    wn.remove_link(pipe.name)
+                wn.add_pipe(first.name,first.start_node_name,first.end_node_name,length=length,diameter=diameter,roughness=roughness,minor_loss=minor_loss)
+                changed=True
+    return removed_volume
+
+
+def __node_elevation__(wn,name:str):
+    # Ground elevation of a junction or tank, or the head of a reservoir
+    node=wn.get_node(name)
+    if hasattr(node,"elevation"):
+        return node.elevation
+    return node.base_head
+
+
+def __series_equivalent__(first,second):
+    # Pipe equivalent to two pipes in series under Hazen-Williams: the total length, the diameter that keeps the total volume,
+    # the roughness that keeps the head loss (sum of L/(C^1.852 D^4.87)) and the minor loss that keeps K/D^4
+    length=first.length+second.length
+    diameter=np.sqrt((first.length*first.diameter**2+second.length*second.diameter**2)/length)
+    resistance=sum(pipe.length/(pipe.roughness**1.852*pipe.diameter**4.87) for pipe in (first,second))
+    roughness=(length/(resistance*diameter**4.87))**(1/1.852)
+    minor_loss=(first.minor_loss/first.diameter**4+second.minor_loss/second.diameter**4)*diameter**4
+    return length,diameter,roughness,minor_loss
+
+
+def __parallel_equivalent__(pipes:list):
+    # Pipe equivalent to parallel pipes under Hazen-Williams: the length of the first pipe, the diameter that keeps the total volume,
+    # the roughness that keeps the total conductance (sum of C D^2.63 / L^0.54) and the minor loss that keeps the combined resistance
+    length=pipes[0].length
+    diameter=np.sqrt(sum(pipe.length*pipe.diameter**2 for pipe in pipes)/length)
+    conductance=sum(pipe.roughness*pipe.diameter**2.63/pipe.length**0.54 for pipe in pipes)
+    roughness=conductance*length**0.54/diameter**2.63
+    # Minor losses K v^2/2g act like resistances K/A^2, combined in parallel as 1/sqrt(r) = sum 1/sqrt(r_i). Any loss-free pipe makes it loss-free
+    if all(pipe.minor_loss>0 for pipe in pipes):
+        minor_loss=diameter**4/sum(pipe.diameter**2/np.sqrt(pipe.minor_loss) for pipe in pipes)**2
+    else:
+        minor_loss=0.0
+    return length,diameter,roughness,minor_loss
+
+
+def __report_skeleton__(source:pathlib.Path,skeleton_file:pathlib.Path,temporary:str):
+    # Runs the original and skeletonized networks with EPANET and prints the runtimes and the largest pressure difference at the consumers
+    results=[]
+    for name,inp in (("original",source),("skeleton",skeleton_file)):
+        wn=wntr.network.WaterNetworkModel(str(inp))
+        start=time.perf_counter()
+        results.append(wntr.sim.EpanetSimulator(wn).run_sim(file_prefix=str(pathlib.Path(temporary)/name)))
+        results[-1].runtime=time.perf_counter()-start
+    original,skeleton=results
+    consumers=skeleton.node["pressure"].columns.intersection(original.node["pressure"].columns)
+    error=(skeleton.node["pressure"][consumers]-original.node["pressure"][consumers]).abs().max().max()
+    print("EPANET runtime: ",np.round(original.runtime,3)," s -> ",np.round(skeleton.runtime,3)," s, Largest pressure difference at remaining nodes: ",
+          np.round(error,4)," m")
+
+
+def __cluster_consumers__(wn,max_distance:float,elevation_tolerance:float,max_consumers:int):
+    # Groups the consumers of a WNTR network model into clusters, largest demand first: each unassigned consumer becomes a representative and
+    # takes the unassigned consumers with the same pattern found within max_distance along pipes (Dijkstra search) and the elevation tolerance.
+    # Consumers with several demand categories are left on their own. Returns a DataFrame with the columns ID, Representative and Demand (m3/s)
+    demands={}
+    patterns={}         # Pattern of each consumer with a single demand category, the only consumers that are lumped
+    for name,junction in wn.junctions():
+        demand_list=junction.demand_timeseries_list
+        if len(demand_list)>0 and sum(demand.base_value for demand in demand_list)>0:
+            demands[name]=sum(demand.base_value for demand in demand_list)
+            if len(demand_list)==1:
+                patterns[name]=demand_list[0].pattern_name
+
+    neighbours={name:[] for name in wn.node_name_list}
+    for name,pipe in wn.pipes():
+        neighbours[pipe.start_node_name].append((pipe.end_node_name,pipe.length))
+        neighbours[pipe.end_node_name].append((pipe.start_node_name,pipe.length))
+
+    representatives={}
+    limit=np.inf if max_consumers is None else max_consumers
+    for seed in sorted(demands,key=lambda name:-demands[name]):
+        if seed in representatives:
+            continue
+        representatives[seed]=seed
+        if seed not in patterns:
+            continue
+        elevation=wn.get_node(seed).elevation
+        members=1
+        distances={seed:0.0}
+        queue=[(0.0,seed)]
+        while queue and members<limit:
+            distance,node=heapq.heappop(queue)
+            if distance>distances[node]:
+                continue
+            if (node not in representatives and node in patterns and patterns[node]==patterns[seed]
+                and abs(wn.get_node(node).elevation-elevation)<=elevation_tolerance):
+                representatives[node]=seed
+                members+=1
+            for neighbour,length in neighbours[node]:
+                if distance+length<=max_distance and distance+length<distances.get(neighbour,np.inf):
+                    distances[neighbour]=distance+length
+                    heapq.heappush(queue,(distance+length,neighbour))
+
+    ids=list(demands)
+    return pd.DataFrame({"ID":ids,"Representative":[representatives[id] for id in ids],"Demand":[demands[id] for id in ids]})
+
+
+def __report_aggregation__(source:pathlib.Path,aggregated_file:pathlib.Path,consumers:pd.DataFrame,temporary:str):
+    # Runs the original and aggregated networks with EPANET and prints the runtimes and the largest difference between the demand
+    # satisfaction of each consumer in the original network and that of its representative in the aggregated network
+    satisfactions=[]
+    runtimes=[]
+    for name,inp in (("original",source),("aggregated",aggregated_file)):
+        wn=wntr.network.WaterNetworkModel(str(inp))
+        start=time.perf_counter()
+        results=wntr.sim.EpanetSimulator(wn).run_sim(file_prefix=str(pathlib.Path(temporary)/name))
+        runtimes.append(time.perf_counter()-start)
+        expected=wntr.metrics.expected_demand(wn)
+        satisfactions.append(results.node["demand"]/expected.where(expected>0).reindex(results.node["demand"].index,method="ffill"))
+    original,aggregated=satisfactions
+    error=(aggregated[consumers.Representative].to_numpy()-original[consumers.ID].to_numpy())
+    print("EPANET runtime: ",np.round(runtimes[0],3)," s -> ",np.round(runtimes[1],3)," s, Largest demand satisfaction difference: ",
+          np.round(np.nanmax(np.abs(error))*100,2)," %")
+
+
+def __section_spans__(text:str):
+    # Start and end position of each section of a written file in its text, from its header line up to the header of the next section
+    spans={}
+    name=""
+    start=0
+    position=0
+    for line in text.splitlines(keepends=True):
+        stripped=line.strip()
+        if stripped.startswith('[') and ']' in stripped:
+            spans[name]=(start,position)
+            name=stripped[:stripped.index(']')+1].upper()
+            start=position
+        position+=len(line)
+    spans[name]=(start,position)
+    return spans
+
+
+def __network_digest__(path,del_x_max:float=None):
+    """
+    Reads an EPANET .inp file once into a read-only network digest shared by all method writers
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+    del_x_max (float): Maximum pipe length used for discretizing larger pipes for the EPA-SWMM methods. Default: None (no SWMM geometry)
+
+
+    Returns: read-only mapping with the entries of __read_inp__ (arrays made read-only and lines as a tuple) and, if del_x_max is given,
+    "del_x_max" and "geometry": the concentric and discretized (conduits, junctions, reservoir elevations) of __swmm_geometry__
+    """
+    network=__read_inp__(path)
+    geometry=__swmm_geometry__(network,del_x_max) if del_x_max is not None else None
+    return __freeze_network__(network,del_x_max,geometry)
+
+
+def __freeze_network__(network:dict,del_x_max:float=None,geometry:tuple=None):
+    # Makes a network read by __read_inp__ read-only (arrays, lines as a tuple and options) and attaches the SWMM geometry if given
+    for key in ("junctions","reservoirs","pipes"):
+        network[key].flags.writeable=False
+    network["lines"]=tuple(network["lines"])
+    network["options"]=types.MappingProxyType(network["options"])
+    network["times"]=types.MappingProxyType(network["times"])
+    if geometry is not None:
+        conduits,junctions,reservoir_elevations=geometry
+        network["del_x_max"]=del_x_max
+        network["geometry"]=(conduits,junctions,types.MappingProxyType(reservoir_elevations))
+    return types.MappingProxyType(network)
+
+
+def __swmm_geometry__(network,del_x_max:float,routing_step:float=None,timings:dict=None):
+    # Builds the junction and conduit tables of the EPA-SWMM methods with concentric offsets and pipes longer than del_x_max discretized
+    # (adaptively for a target routing step if given). Geometry already in a network digest for the same del_x_max (and no routing step)
+    # is returned as copies so that writers can modify it. If a timings dictionary is given, the seconds taken by the concentric
+    # matching and the discretization are stored in it under "Concentric" and "Discretize" (e.g., for the scaling benchmark)
+    if network.get("del_x_max")==del_x_max and "geometry" in network and routing_step is None:
+        conduits,junctions,reservoir_elevations=network["geometry"]
+        return conduits.copy(),junctions.copy(),dict(reservoir_elevations)
+
+    all_junctions=network["junctions"]
+    # Dataframe aggregating all node information gathered from the EPANET file, with the junction ID as the index
+    junctions=pd.DataFrame({"Elevation":all_junctions.Elevation.tolist(),"Coordinates":list(zip(all_junctions.X.tolist(),all_junctions.Y.tolist()))},
+                           index=pd.Index(all_junctions.ID.tolist(),name="ID"))
+
+    pipes=network["pipes"]
+    # Dataframe aggregating all conduit information gathered from the EPANET file, with the conduit ID as the index
+    conduits=pd.DataFrame({"from node":pipes.Node1.tolist(),"to node":pipes.Node2.tolist(),"Length":pipes.Length.tolist(),"diameter":pipes.Diameter.tolist()},
+                          index=pd.Index(pipes.ID.tolist(),name="ID"))
+
+    reservoirs=network["reservoirs"]
+    reservoir_ids=reservoirs.ID.tolist()
+    reservoir_coords=dict(zip(reservoir_ids,zip(reservoirs.X.tolist(),reservoirs.Y.tolist())))
+    reservoir_elevations={reservoir:head-30 for reservoir,head in zip(reservoir_ids,reservoirs.Head.tolist())}
+
+    start=time.perf_counter()
+    conduits,junctions,connectivity=__match_concentric__(conduits,junctions)
+    matched=time.perf_counter()
+    conduits,junctions=__discretize_pipes__(conduits,junctions,del_x_max,reservoir_ids,reservoir_elevations,reservoir_coords,routing_step)
+    if timings is not None:
+        timings["Concentric"]=matched-start
+        timings["Discretize"]=time.perf_counter()-matched
+    if routing_step is not None:
+        # Courant-stable step of the discretized network: the shortest travel time of a wave through any conduit
+        travel_times=conduits["Length"].to_numpy(dtype=float)/__wave_speeds__(conduits,junctions)
+        stable_step=travel_times.min() if len(conduits)>0 else np.inf
+        print("Adaptive discretization: ",len(conduits)," conduits and ",len(junctions)," junctions, Courant-stable routing step ",
+              np.round(stable_step,3)," s (target ",routing_step," s, ",int((travel_times<routing_step).sum())," conduits too short to be stable at the target)")
+    return conduits,junctions,reservoir_elevations
+
+
+def __incidence_index__(conduits:pd.DataFrame,junctions:pd.DataFrame):
+    """
+    Builds a node-to-link incidence index of the network in compressed sparse row (CSR) form
+
+    Parameters
+    -----------
+    conduits (pd.DataFrame): conduits indexed by ID with the columns "from node" and "to node"
+
+    junctions (pd.DataFrame): junctions indexed by ID. Links to nodes that are not junctions (e.g., reservoirs) are left out
+
+
+    Returns: indptr, links, upstream
+
+    indptr: NumPy array of size N+1. The links connected to the i-th junction are links[indptr[i]:indptr[i+1]]
+
+    links: NumPy array of positions of conduits in the conduits DataFrame. For each junction, conduits starting at it come first, then conduits ending at it, each in conduit order
+
+    upstream: NumPy boolean array of the same size as links, True where the conduit starts at the junction (its upstream end)
+    """
+    from_index=junctions.index.get_indexer(conduits["from node"])
+    to_index=junctions.index.get_indexer(conduits["to node"])
+    # A conduit that starts and ends at the same junction is only counted at its upstream end
+    to_index[to_index==from_index]=-1
+
+    conduit_positions=np.arange(len(conduits))
+    nodes=np.concatenate([from_index,to_index])
+    links=np.concatenate([conduit_positions,conduit_positions])
+    upstream=np.concatenate([np.ones(len(conduits),dtype=bool),np.zeros(len(conduits),dtype=bool)])
+    valid=nodes>=0
+    nodes,links,upstream=nodes[valid],links[valid],upstream[valid]
+
+    # Groups the entries by junction, upstream ends before downstream ends, then in conduit order
+    order=np.lexsort((links,~upstream,nodes))
+    nodes,links,upstream=nodes[order],links[order],upstream[order]
+    indptr=np.zeros(len(junctions)+1,dtype=np.int64)
+    np.cumsum(np.bincount(nodes,minlength=len(junctions)),out=indptr[1:])
+    return indptr,links,upstream
+
+
+def __match_concentric__(conduits:pd.DataFrame,junctions:pd.DataFrame):
+    # Offsets the ends of conduits so that all conduits meeting at a junction are concentric with the largest one connected to it
+    indptr,links,upstream=__incidence_index__(conduits,junctions)
+    diameters=conduits["diameter"].to_numpy(dtype=float)
+    degree=np.diff(indptr)
+    connected=degree>0
+
+    # Largest diameter connected to each junction, reduced over the CSR segments of the junctions that have links
+    max_diameters=np.full(len(junctions),np.nan)
+    if len(links):
+        max_diameters[connected]=np.maximum.reduceat(diameters[links],indptr[:-1][connected])
+
+    # Offset of each conduit end from the junction's largest diameter (zero for the largest conduits)
+    end_diameters=diameters[links]
+    end_max=np.repeat(max_diameters,degree)
+    offsets=np.where(end_diameters<end_max,(end_max-end_diameters)/2,0)
+    # Conduit ends connected to nodes other than junctions (e.g., reservoirs) are left without an offset
+    in_offsets=np.full(len(conduits),np.nan)
+    out_offsets=np.full(len(conduits),np.nan)
+    in_offsets[links[upstream]]=offsets[upstream]
+    out_offsets[links[~upstream]]=offsets[~upstream]
+    conduits["InOffset"]=in_offsets
+    conduits["OutOffset"]=out_offsets
+
+    # Conduits starting (US) and ending (DS) at each junction and the largest diameter connected to it
+    conduit_ids=conduits.index.to_numpy()
+    linked_ids=conduit_ids[links]
     connectivity=pd.DataFrame(index=junctions.index, columns=["US","DS"])
+    connectivity["US"]=[linked_ids[start:end][upstream[start:end]].tolist() for start,end in zip(indptr[:-1],indptr[1:])]
+    connectivity["DS"]=[linked_ids[start:end][~upstream[start:end]].tolist() for start,end in zip(indptr[:-1],indptr[1:])]
+    connectivity["Max D"]=max_diameters
 
-    for junction in junctions.index:
-        upst_connected=[] #List of pipes whose upstream end connects to this node
-        downst_connected=[] #List of pipes whose downstream end connects to this node
-        for conduit in conduits.index:
-            if conduits.at[conduit,"from node"]==junction:
-                upst_connected.append(conduit)
-            elif conduits.at[conduit,"to node"]==junction:
-                downst_connected.append(conduit)
-        connected_conduits=upst_connected+downst_connected
-        connected_diameters=[conduits.at[conduit,"diameter"] for conduit in connected_conduits]
-        max_diameter=max(connected_diameters)
-        for conduit in upst_connected:
-            if conduits.at[conduit,"diameter"]<max_diameter:
-                conduits.at[conduit,"InOffset"]=(max_diameter-conduits.at[conduit,"diameter"])/2
-            else: conduits.at[conduit,"InOffset"]=0
-        for conduit in downst_connected:
-            if conduits.at[conduit,"diameter"]<max_diameter:
-                conduits.at[conduit,"OutOffset"]=(max_diameter-conduits.at[conduit,"diameter"])/2
-            else: conduits.at[conduit,"OutOffset"]=0
-        connectivity.at[junction,"US"]=upst_connected
-        connectivity.at[junction,"DS"]=downst_connected
-        connectivity.at[junction,"Max D"]=max_diameter
-    
     return conduits,junctions,connectivity
 
-def __discretize_pipes__(conduits:pd.DataFrame,junctions:pd.DataFrame,del_x_max,reservoir_ids,reservoir_elevations,reservoir_coords):
-# Loop over each conduit in the original file
-    for conduit in conduits.index:
-
-        length=conduits["Length"][conduit]  #Stores the length of the current conduit for shorthand
-
-        # If the conduit is bigger than the maximum allowable length (delta x), we will break it down into smaller pipes
-        if length>del_x_max:
-            # Number of smaller pipes is calculated from 
-            n_parts=math.ceil(length/del_x_max)
-            # Calculate the length of each part 
-            part_length=length/n_parts
-            # Start node ID (for shorthand)
-            start_node=conduits["from node"][conduit]
-            # Inlet Offset for the Current Conduit
-            in_offset=conduits["InOffset"][conduit]
-            # End node ID (for shorthand)
-            end_node=conduits["to node"][conduit]
-            #Outlet Offset for the Current Conduit
-            out_offset=conduits["OutOffset"][conduit]
-            # If the start node is a reservoir
-            if start_node in reservoir_ids:
-                # MAke the start elevation the same as the end but add 1 (since reservoirs don't have ground elevation in EPANET)
-                start_elevation=junctions.at[end_node,"Elevation"]+1
-                reservoir_elevations[start_node]=start_elevation+1
-            # Otherwise make the start elevation equal to the elevation of the start node + the offset of the pipe
-            else: start_elevation=junctions.at[start_node,"Elevation"]+in_offset
-            
-            # If the end node is a reservoir
-            if end_node in reservoir_ids:
-                # Make the end elevation the same as the start but subtract 1 (since reservoirs don't have ground elevation in EPANET)
-                end_elevation=start_elevation-1
-            # Make the end elevation equal to the elevation of the end node + the offset of the pipe
-            else: end_elevation=junctions.at[end_node,"Elevation"]+out_offset
-            # Calculate the uniform drop (or rise) in elevation for all the intermediate nodes about to be created when this pipe is broken into several smaller ones
-            unit_elev_diff=(end_elevation-start_elevation)/n_parts
-
-            # if the starting node is a reservoir
-            if start_node in reservoir_ids:
-                # Get coordinates from reservoir data
-                start_x=reservoir_coords[start_node][0]
-                start_y=reservoir_coords[start_node][1]
-            else:
-                # Get the coordinates from the junction data
-                start_x=junctions.at[start_node,"Coordinates"][0]
-                start_y=junctions.at[start_node,"Coordinates"][1]
-            
-            # If the end node is a reservoir
-            if end_node in reservoir_ids:
-                # Get the coordinates from the reservoir data
-                end_x=reservoir_coords[end_node][0]
-                end_y=reservoir_coords[end_node][1]
-            else:
-                # Get them from the junctions data
-                end_x=junctions.at[end_node,"Coordinates"][0]
-                end_y=junctions.at[end_node,"Coordinates"][1]
-                
-            # Calculate the unit difference in x and y coordinates for this pipe and its segments
-            unit_x_diff=(end_x-start_x)/n_parts
-            unit_y_diff=(end_y-start_y)/n_parts
-
-
-    # THIS LOOP GENERATES THE SMALLER PIPES TO REPLACE THE ORIGINAL LONG PIPE
-            # For each part to be created
-            for part in np.arange(1,n_parts+1):
-
-                # CREATING THE LINKS
-                # Create the ID for the new smaller pipe as OriginPipeID-PartNumber
-                new_id=conduit+"-"+str(part)
-                # Set the new pipe's diameter equal to the original one
-                conduits.at[new_id,"diameter"]=conduits["diameter"][conduit]
-                # Set the start node as OriginStartNode-NewNodeNumber-OriginEndNode  as in the first intermediate nodes between node 13 and 14 will be named 13-1-14
-                conduits.at[new_id,"from node"]=start_node+"-"+str(part-1)+"-"+end_node
-
-                # Set Inlet and Outlet Offsets to Zero by default
-                conduits.at[new_id,"InOffset"]=0
-                conduits.at[new_id,"OutOffset"]=0
-
-                # if this is the first part, use the original start node 
-                if part==1:
-                    conduits.at[new_id,"from node"]=start_node
-                    # Set the first inlet offset to concentrically match the upstream pipe
-                    conduits.at[new_id,"InOffset"]=in_offset
-                # Set the end node as OriginStartNode-NewNodeNumber+1-OriginEndNode  as in the second intermediate nodes between node 13 and 14 will be named 13-2-14
-                conduits.at[new_id,"to node"]=start_node+"-"+str(part)+"-"+end_node
-                # If this is the last part, use the original end node as the end node
-                if part==n_parts:
-                    conduits.at[new_id,"to node"]=end_node
-                    # Set the last outlet offset to concentrically match the downstream pipe
-                    conduits.at[new_id,"OutOffset"]=out_offset
-                # Set the new pipe's length to the length of each part
-                conduits.at[new_id,"Length"]=part_length
-
-                # if this is NOT the last part (as the last pipe segment joins a pre-existing node and does not need a node to be created)
-                if part<n_parts:
-                    # Create a new node at the end of this pipe segment whose elevation is translated from the start elevation using the unit slope and the part number
-                    junctions.at[conduits.at[new_id,"to node"],"Elevation"]=start_elevation+part*unit_elev_diff
-                    # Calculate the coordinates for the new node using the unit difference in x and y coordinates
-                    junctions.at[conduits.at[new_id,"to node"],"Coordinates"]=(start_x+part*unit_x_diff,start_y+part*unit_y_diff)
-
-            # After writing the new smaller pipes, delete the original pipe (since it is now redundant)
-            conduits.drop(conduit,inplace=True)
+def __discretize_pipes__(conduits:pd.DataFrame,junctions:pd.DataFrame,del_x_max,reservoir_ids,reservoir_elevations,reservoir_coords,routing_step=None):
+    # Breaks every conduit longer than del_x_max into equal parts joined by new intermediate junctions, all conduits at once.
+    # With a target routing step, conduits are never split into parts shorter than the distance a wave travels in one step
+    lengths=conduits["Length"].to_numpy(dtype=float)
+    # Number of parts of each conduit: conduits bigger than the maximum allowable length (delta x) will be broken down into smaller pipes
+    n_all=np.maximum(np.ceil(lengths/del_x_max),1)
+    if routing_step is not None:
+        # Fewest parts at most del_x_max long, reduced where they would be shorter than one wave travel distance (Courant number > 1)
+        n_all=np.maximum(np.minimum(n_all,np.floor(lengths/(__wave_speeds__(conduits,junctions)*routing_step))),1)
+    split=n_all>1
+    if not split.any():
+        conduits[["InOffset","OutOffset"]]=conduits[["InOffset","OutOffset"]].fillna(0)
+        return conduits,junctions
+
+    long_ids=conduits.index.to_numpy()[split]
+    start_nodes=conduits["from node"].to_numpy()[split]
+    end_nodes=conduits["to node"].to_numpy()[split]
+    in_offsets=conduits["InOffset"].to_numpy(dtype=float)[split]
+    out_offsets=conduits["OutOffset"].to_numpy(dtype=float)[split]
+    diameters=conduits["diameter"].to_numpy()[split]
+    # Number of smaller pipes and the length of each part
+    n_parts=n_all[split].astype(np.int64)
+    part_lengths=lengths[split]/n_parts
+
+    reservoir_set=set(reservoir_ids)
+    start_is_reservoir=np.array([node in reservoir_set for node in start_nodes])
+    end_is_reservoir=np.array([node in reservoir_set for node in end_nodes])
+    # Junction elevations of the start and end nodes (NaN for reservoirs, which don't have ground elevation in EPANET)
+    start_junction_elevations=junctions["Elevation"].reindex(start_nodes).to_numpy(dtype=float)
+    end_junction_elevations=junctions["Elevation"].reindex(end_nodes).to_numpy(dtype=float)
+    # A reservoir start is set 1 m above the end junction, otherwise the start is the elevation of the start node + the offset of the pipe
+    start_elevations=np.where(start_is_reservoir,end_junction_elevations+1,start_junction_elevations+in_offsets)
+    # A reservoir end is set 1 m below the start, otherwise the end is the elevation of the end node + the offset of the pipe
+    end_elevations=np.where(end_is_reservoir,start_elevations-1,end_junction_elevations+out_offsets)
+    # Reservoirs feeding a broken down pipe are placed 1 m above its start (the last such pipe in conduit order decides)
+    for node,elevation in zip(start_nodes[start_is_reservoir],start_elevations[start_is_reservoir]):
+        reservoir_elevations[node]=elevation+1
+    # Uniform drop (or rise) in elevation for all the intermediate nodes of each pipe
+    unit_elev_diffs=(end_elevations-start_elevations)/n_parts
+
+    # Coordinates of the start and end nodes, from the reservoir data for reservoirs and from the junction data otherwise
+    node_coords=dict(zip(junctions.index,junctions["Coordinates"]))
+    node_coords.update(reservoir_coords)
+    start_x=np.array([node_coords[node][0] for node in start_nodes],dtype=float)
+    start_y=np.array([node_coords[node][1] for node in start_nodes],dtype=float)
+    end_x=np.array([node_coords[node][0] for node in end_nodes],dtype=float)
+    end_y=np.array([node_coords[node][1] for node in end_nodes],dtype=float)
+    unit_x_diffs=(end_x-start_x)/n_parts
+    unit_y_diffs=(end_y-start_y)/n_parts
+
+    # One entry per part: the pipe it belongs to and its part number (1 to n_parts)
+    owner=np.repeat(np.arange(len(n_parts)),n_parts)
+    part=np.arange(len(owner))-np.repeat(np.cumsum(n_parts)-n_parts,n_parts)+1
+    first=part==1
+    last=part==n_parts[owner]
+
+    # New pipes are named OriginPipeID-PartNumber and intermediate nodes OriginStartNode-NewNodeNumber-OriginEndNode,
+    # as in the first intermediate node between node 13 and 14 will be named 13-1-14
+    part_ids=[conduit+"-"+str(number) for conduit,number in zip(long_ids[owner].tolist(),part.tolist())]
+    inner_nodes=np.array([start+"-"+str(number)+"-"+end for start,end,number in zip(start_nodes[owner].tolist(),end_nodes[owner].tolist(),part.tolist())],dtype=object)
+    # Each part ends at its intermediate node (the original end node for the last part) and starts where the previous part ends (the original start node for the first)
+    to_nodes=np.where(last,end_nodes[owner],inner_nodes)
+    from_nodes=np.where(first,start_nodes[owner],np.roll(inner_nodes,1))
+
+    new_conduits=pd.DataFrame({"from node":from_nodes,"to node":to_nodes,"Length":part_lengths[owner],"diameter":diameters[owner],
+                               # Only the first and last parts keep the offsets that concentrically match the neighbouring pipes
+                               "InOffset":np.where(first,in_offsets[owner],0.0),"OutOffset":np.where(last,out_offsets[owner],0.0)},
+                              index=pd.Index(part_ids,name=conduits.index.name))
+    # The original long pipes are replaced by their parts, which are added after the remaining pipes
+    conduits=__keep_last__(pd.concat([conduits[~split],new_conduits[conduits.columns]]))
+
+    # New nodes at the end of every part except the last one (which joins a pre-existing node), translated from the start using the unit slope and coordinate differences
+    inner=~last
+    new_junctions=pd.DataFrame({"Elevation":start_elevations[owner][inner]+part[inner]*unit_elev_diffs[owner][inner],
+                                "Coordinates":list(zip(start_x[owner][inner]+part[inner]*unit_x_diffs[owner][inner],start_y[owner][inner]+part[inner]*unit_y_diffs[owner][inner]))},
+                               index=pd.Index(inner_nodes[inner],name=junctions.index.name))
+    junctions=__keep_last__(pd.concat([junctions,new_junctions[junctions.columns]]))
 
     conduits[["InOffset","OutOffset"]]=conduits[["InOffset","OutOffset"]].fillna(0)
 
     return conduits,junctions
 
 
+def __set_routing_step__(sections:dict,routing_step:float):
+    # Sets the SWMM routing step (s). SWMM requires the reporting step (10 s in the template) to be at least the routing step
+    __set_entry__(sections,"[OPTIONS]","ROUTING_STEP",routing_step)
+    if routing_step>10:
+        seconds=math.ceil(routing_step)
+        __set_entry__(sections,"[OPTIONS]","REPORT_STEP","%02d:%02d:%02d" % (seconds//3600,seconds%3600//60,seconds%60))
+
+
+def __set_swmm_report__(sections:dict,nodes:list,links:list):
+    # Reports only the nodes and links read by the runner of the method instead of all elements (including every discretization junction
+    # and conduit), which keeps the .out file small. IDs are listed a few per line as EPA-SWMM limits the length of input lines
+    rows=[line for line in sections["[REPORT]"]["rows"] if line.split(';')[0].split()[:1] not in (["SUBCATCHMENTS"],["NODES"],["LINKS"])]
+    rows.append("SUBCATCHMENTS NONE")
+    for kind,ids in (("NODES",nodes),("LINKS",links)):
+        if len(ids)==0:
+            rows.append(kind+" NONE")
+        for start in range(0,len(ids),10):
+            rows.append(kind+" "+" ".join(ids[start:start+10]))
+    __replace_rows__(sections,"[REPORT]",rows)
+
+
+def __float_storage__(path,Hmin:float,Hdes:float,del_x_max:float,network,in_memory:bool,lean:bool,method:str,leak_fraction:float):
+    # Writes the float valve methods: Float-Storage, or the original model of Campisano et al. (2019) without leaks, concentric conduits,
+    # tank inlets raised by Hmin or supply stop rule and with twice the volume of all tanks in the sources
+    assert 0<=Hmin<=Hdes, "Hmin must be smaller than Hdes"
+    assert del_x_max>0, "Delta x must be a positive number"
+    campisano=method=="Campisano"
+
+    file=__source_path__(path)
+    name_only=file.stem
+    dir=file.parent
+    print("Selected File: ",name_only[0:-4])
+    pressure_diff=Hdes-Hmin
+
+    # Returns the cached conversion if this source was already converted with the same parameters (see set_cache)
+    new_file_name=dir/pathlib.Path(name_only[0:-4]+"_"+str(del_x_max)+"m_"+method+".inp")
+    if lean:
+        new_file_name=new_file_name.with_name(new_file_name.stem+"_Lean.inp")
+    cache_entry,cached=__from_cache__(path,network,method+("_Lean" if lean else ""),(Hmin,Hdes,del_x_max,leak_fraction),new_file_name,in_memory)
+    if cached is not None:
+        return cached
+
+    # Reads the junctions, pipes, reservoirs and options of the EPANET .inp file in a single pass
+    if network is None:
+        network=__read_inp__(path)
+    all_junctions=network["junctions"]
+    # Filters the junctions for nodes that have non-zero demands
+    demand_junctions=all_junctions[all_junctions.Demand!=0]
+    demand_nodes=demand_junctions.ID.tolist()           # List of nodes that have non-zero demands
+    desired_demands=demand_junctions.Demand             # Demand rates desired by each node (CMS) for desired volume calculations
+    elevations=demand_junctions.Elevation               # Elevations of demand nodes
+    reservoirs=network["reservoirs"]
+    reservoir_ids=reservoirs.ID.tolist()
+
+    # Get the supply duration in minutes (/60) as an integer and as HH:MM for the supply stop rule
+    supply_duration=int(network["duration"]/60)
+    supply_clock="%02d:%02d" % (supply_duration//60,supply_duration%60)
+
+    # Junction and conduit tables with concentric offsets and long pipes discretized, taken from the network digest when it holds them for this del_x_max
+    conduits,junctions,reservoir_elevations=__swmm_geometry__(network,del_x_max)
+    if campisano:
+        conduits[["InOffset","OutOffset"]]=0
+
+    # Junctions with no depth and a high surcharge depth to prevent surcharging
+    zeros=[0]*len(junctions)
+    junctions_section=__format_rows__(junctions.index,junctions["Elevation"],zeros,zeros,[100]*len(junctions),zeros)
+
+    # Free outfalls at the demand nodes receive the consumption drawn from the tanks (and the leaks of Float-Storage)
+    n=len(demand_nodes)
+    outfall_ids=["Outfall"+id for id in demand_nodes]
+    leak_outfall_ids=[] if campisano else ["L_Outfall"+id for id in demand_nodes]
+    n_outfalls=len(outfall_ids)+len(leak_outfall_ids)
+    outfall_section=__format_rows__(outfall_ids+leak_outfall_ids,np.tile(elevations,n_outfalls//max(n,1)),["FREE"]*n_outfalls,
+                                    ["    "]*n_outfalls,["NO"]*n_outfalls)
+
+    # Private tanks (1 m high, holding the desired volume over the supply duration) at the demand nodes, raised by Hmin in Float-Storage
+    tank_height=1
+    storage_ids=["StorageforNode"+id for id in demand_nodes]
+    storage_areas=desired_demands*60*supply_duration/tank_height
+    storage_curves,tank_curve_rows=__tank_curves__(storage_areas,tank_height)
+    blanks=['    ']*n
+    storage_zeros=[0]*n
+    storage_units=__format_rows__(storage_ids,elevations+(0 if campisano else Hmin),[max(100,reservoirs.Head.max())]*n,storage_zeros,
+                                  ["TABULAR"]*n,storage_curves,blanks,blanks,storage_zeros,storage_zeros)
+    # The source reservoirs hold the volume of all tanks (twice the volume per reservoir for Campisano)
+    source_volume=storage_areas.sum()*tank_height*(2/len(reservoir_ids) if campisano else 1)
+    source_units,source_curve_rows=__source_storages__(reservoirs,reservoir_elevations,source_volume)
+    storage_section=itertools.chain(source_units,storage_units)
+
+    conduits_section=__format_rows__(conduits.index,conduits["from node"],conduits["to node"],conduits["Length"],[0.011]*len(conduits),
+                                     conduits["InOffset"],conduits["OutOffset"],[0]*len(conduits),[0]*len(conduits))
+    xsections_section=__format_rows__(conduits.index,["FORCE_MAIN"]*len(conduits),conduits["diameter"],[130]*len(conduits),
+                                      [0]*len(conduits),[0]*len(conduits),[1]*len(conduits))
+
+    # The tank inlets (and leaks) of Float-Storage are at the centre of the largest conduit connected to the demand node
+    inlet_offsets=[0]*n if campisano else (__max_diameters__(conduits,demand_nodes)/2).tolist()
+    inlet_coeffs=desired_demands*1000/np.sqrt(pressure_diff)
+    # The pressure-dependent tank inlets, throttled by the float valve rules, and the consumption drawn from the tanks
+    outlet_ids=["Outlet"+id for id in demand_nodes]
+    demand_outlet_ids=["DemandOutlet"+id for id in demand_nodes]
+    outlet_columns=[outlet_ids+demand_outlet_ids,demand_nodes+storage_ids,storage_ids+outfall_ids,inlet_offsets+[0]*n,
+                    ["FUNCTIONAL/DEPTH"]*n+["TABULAR/DEPTH"]*n,inlet_coeffs.tolist()+["Demand"+id for id in demand_nodes],
+                    ["0.5"]*n+["     "]*n,["YES"]*(2*n)]
+    # Leaks at the demand nodes discharge a fraction of the inlet flow of each consumer at the same pressure
+    if not campisano:
+        leak_columns=[["LeakforNode"+id for id in demand_nodes],demand_nodes,leak_outfall_ids,inlet_offsets,["FUNCTIONAL/DEPTH"]*n,
+                      (inlet_coeffs*leak_fraction).tolist(),["0.5"]*n,["YES"]*n]
+        outlet_columns=[column+leak_column for column,leak_column in zip(outlet_columns,leak_columns)]
+    outlet_section=__format_rows__(*outlet_columns)
+
+    # Float valves: once a tank is 90% full, its inlet setting follows one shared curve that closes the valve smoothly as the tank fills
+    # (the curve's x-value is the depth of the tank in the rule's condition)
+    valve_depths,valve_settings=__float_valve_curve__(0.9*tank_height,tank_height)
+    controls_section=[line for id,storage in zip(demand_nodes,storage_ids)
+                      for line in ("RULE Outlet"+id,"IF NODE "+storage+" DEPTH >= "+str(0.9*tank_height),"THEN OUTLET Outlet"+id+" SETTING = CURVE FloatValve","")]
+    # Float-Storage stops the supply at the end of the supply duration by closing the conduits connected to the sources
+    source_conduits=conduits.index[conduits["from node"].isin(reservoir_ids)|conduits["to node"].isin(reservoir_ids)].tolist()
+    if not campisano and source_conduits:
+        controls_section+=["RULE STOPSUPPLY","IF SIMULATION CLOCKTIME > "+supply_clock]
+        controls_section+=[("THEN" if i==0 else "AND")+" CONDUIT "+conduit+" STATUS = CLOSED" for i,conduit in enumerate(source_conduits)]
+
+    # Tank, consumption, float valve and source curves. Consumers draw the desired volume at a constant rate over the day
+    consumption_rates=desired_demands*supply_duration/1440*1000
+    curve_rows=[tank_curve_rows,
+                __curve_rows__(["Demand"+id for id in demand_nodes],"Rating",[0,0.01],np.column_stack([[0]*n,consumption_rates])),
+                source_curve_rows,
+                __curve_rows__(["FloatValve"],"Control",valve_depths,[valve_settings])]
+    curves_section=__format_rows__(*[np.concatenate(column) for column in zip(*curve_rows)])
+
+    # Tanks and outfalls are translated from their demand nodes
+    offset=2
+    coords_ids,coords_x,coords_y=__consumer_coordinates__(junctions,reservoirs,demand_junctions,
+                                                          [(storage_ids,2*offset,0),(outfall_ids,3*offset,offset),(leak_outfall_ids,offset,-1.5*offset)])
+
+    # Indexes the SWMM template into named sections and fills each section by name
+    sections=__index_sections__(__swmm_template__())
+    __set_entry__(sections,"[OPTIONS]","END_TIME","23:59:00")
+    __set_entry__(sections,"[MAP]","DIMENSIONS",__map_dimensions__(coords_x,coords_y))
+    __append_rows__(sections,"[JUNCTIONS]",junctions_section)
+    __append_rows__(sections,"[OUTFALLS]",outfall_section)
+    __append_rows__(sections,"[STORAGE]",storage_section)
+    __append_rows__(sections,"[CONDUITS]",conduits_section)
+    __append_rows__(sections,"[OUTLETS]",outlet_section)
+    __append_rows__(sections,"[XSECTIONS]",xsections_section)
+    __append_rows__(sections,"[CONTROLS]",controls_section)
+    __append_rows__(sections,"[CURVES]",curves_section)
+    __append_rows__(sections,"[COORDINATES]",__format_rows__(coords_ids,coords_x,coords_y))
+    # The runner reads the depths of the tanks and demand nodes and the flows of the tank inlets
+    __set_swmm_report__(sections,storage_ids+demand_nodes,outlet_ids)
+
+    # Writes the .inp file in the same directory in one pass
+    return __save_model__(sections,new_file_name,cache_entry,in_memory,lean)
+
+
+def __tank_curves__(areas,tank_height:float):
+    # Storage curves of the private tanks: the area of each tank up to its top and 1 m2 above it. Tanks of the same area (to 4 decimals)
+    # share a curve named by the area*10000, written in order of first appearance
+    curve_ids=np.round(np.asarray(areas,dtype=float)*10000).astype(np.int64)
+    tables=pd.unique(curve_ids)
+    table_areas=tables/10000
+    depths=[0,tank_height,tank_height+0.0001,100]
+    rows=__curve_rows__(tables,"Storage",depths,np.column_stack([table_areas,table_areas,np.ones(len(tables)),np.ones(len(tables))]))
+    return curve_ids,rows
+
+
+def __source_storages__(reservoirs,reservoir_elevations:dict,volume:float):
+    # Source reservoirs as tabular storage units of finite volume: 1 m2 up to 2 m below the initial head and the given area in the top 2 m,
+    # so that the sources run dry once they have supplied about twice that volume
+    reservoir_ids=reservoirs.ID.tolist()
+    assert len(reservoir_ids)>0, "The network needs at least one reservoir as a source"
+    heads=reservoirs.Head.astype(float)
+    elevations=np.array([reservoir_elevations[id] for id in reservoir_ids],dtype=float)
+    init_depths=heads-elevations
+    n=len(reservoir_ids)
+    curve_ids=["Source"+id for id in reservoir_ids]
+    units=__format_rows__(reservoir_ids,elevations,[max(100,heads.max()+10)]*n,init_depths,["TABULAR"]*n,curve_ids,
+                          ['    ']*n,['    ']*n,[0]*n,[0]*n)
+    depths=np.column_stack([[0]*n,init_depths-2,init_depths-1,init_depths])
+    areas=np.column_stack([np.ones(n),np.ones(n),np.full(n,volume),np.full(n,volume)])
+    return units,__curve_rows__(curve_ids,"Storage",depths,areas)
+
+
+def __curve_rows__(names,curve_type:str,x,y):
+    # Columns of the [CURVES] rows of K curves of P points each: the first row of each curve holds its type and a ; line ends each curve.
+    # x holds the P x-values shared by all curves or K rows of them and y holds K rows of P y-values
+    names=np.asarray(names,dtype=object)
+    k=len(names)
+    y=np.asarray(y,dtype=float).reshape(k,-1)
+    p=y.shape[1]
+    x=np.broadcast_to(np.asarray(x,dtype=float),(k,p))
+    name_column=np.empty((k,p+1),dtype=object)
+    name_column[:,:p]=names[:,None]
+    name_column[:,p]=";"
+    type_column=np.full((k,p+1)," ",dtype=object)
+    type_column[:,0]=curve_type
+    x_column=np.full((k,p+1)," ",dtype=object)
+    x_column[:,:p]=x.tolist()
+    y_column=np.full((k,p+1)," ",dtype=object)
+    y_column[:,:p]=y.tolist()
+    return [column.ravel() for column in (name_column,type_column,x_column,y_column)]
+
+
+def __float_valve_curve__(h_min:float,h_max:float,m:float=2.5,n:float=4,points:int=51):
+    # Setting of a float valve at tank depths from h_min (fully open) to h_max (closed): tanh(m*r)*tanh(n*r) with r the relative distance to h_max
+    depths=np.linspace(h_min,h_max,points)
+    relative=(h_max-depths)/(h_max-h_min)
+    return np.round(depths,6),np.round(np.tanh(m*relative)*np.tanh(n*relative),6)
+
+
+def __max_diameters__(conduits:pd.DataFrame,nodes:list):
+    # Largest diameter of the conduits connected to each node (0 for nodes without conduits)
+    diameters=conduits["diameter"].to_numpy(dtype=float)
+    ends=pd.Series(np.concatenate([diameters,diameters]),index=np.concatenate([conduits["from node"].to_numpy(),conduits["to node"].to_numpy()]))
+    return ends.groupby(level=0).max().reindex(nodes).fillna(0).to_numpy()
+
+
+def __consumer_coordinates__(junctions:pd.DataFrame,reservoirs,demand_junctions,translated:list):
+    # Coordinates of all junctions, the reservoirs and the artificial nodes of each consumer, given as (IDs, x offset, y offset) from the demand nodes
+    coordinates=np.array(junctions["Coordinates"].tolist(),dtype=float).reshape(-1,2)
+    ids=list(junctions.index)+reservoirs.ID.tolist()
+    xs=[coordinates[:,0],reservoirs.X.astype(float)]
+    ys=[coordinates[:,1],reservoirs.Y.astype(float)]
+    for node_ids,x_offset,y_offset in translated:
+        if len(node_ids)==0:
+            continue
+        ids+=node_ids
+        xs.append(demand_junctions.X+x_offset)
+        ys.append(demand_junctions.Y+y_offset)
+    return ids,np.concatenate(xs),np.concatenate(ys)
+
+
+def __map_dimensions__(coords_x,coords_y):
+    # View dimensions of the EPA-SWMM map: the extent of all coordinates with a margin of a quarter of the largest coordinate
+    x_left=float(np.min(coords_x)-np.max(coords_x)/4)
+    x_right=float(np.max(coords_x)+np.max(coords_x)/4)
+    y_down=float(np.min(coords_y)-np.max(coords_y)/4)
+    y_up=float(np.max(coords_y)+np.max(coords_y)/4)
+    return str(x_left)+" "+str(y_down)+" "+str(x_right)+" "+str(y_up)
+
+
+def __wave_speeds__(conduits:pd.DataFrame,junctions:pd.DataFrame):
+    # Expected wave speed (m/s) in each conduit: the full-pipe Hazen-Williams velocity (C=130 as in [XSECTIONS]) driven by the slope
+    # between its ends plus the gravity wave speed sqrt(g*D). Ends at reservoirs (no ground elevation) are taken as flat
+    elevations=junctions["Elevation"]
+    start_elevations=elevations.reindex(conduits["from node"]).to_numpy(dtype=float)+conduits["InOffset"].fillna(0).to_numpy(dtype=float)
+    end_elevations=elevations.reindex(conduits["to node"]).to_numpy(dtype=float)+conduits["OutOffset"].fillna(0).to_numpy(dtype=float)
+    lengths=conduits["Length"].to_numpy(dtype=float)
+    diameters=conduits["diameter"].to_numpy(dtype=float)
+    slopes=np.nan_to_num(np.abs(end_elevations-start_elevations)/np.where(lengths>0,lengths,np.inf))
+    velocities=0.849*130*(diameters/4)**0.63*slopes**0.54
+    return velocities+np.sqrt(9.81*diameters)
+
+
+def __keep_last__(frame:pd.DataFrame):
+    # Keeps one row per ID at the position of its first occurrence with the values of its last occurrence (e.g., nodes shared by parallel pipes)
+    if frame.index.is_unique:
+        return frame
+    return frame[~frame.index.duplicated(keep='last')].reindex(frame.index.unique())
+
+
+def __read_inp__(path):
+    """
+    Reads the sections of an EPANET input file needed by the converters in a single pass, without building a WNTR network model
+
+    Parameters
+    -----------
+    path (str or dict): path to input file (relative or full absolute path) or an in-memory model returned by a converter with in_memory=True
+
+
+    Returns: dictionary with the following entries. All values are converted to SI units (m, m3/s) as in WNTR
+
+    junctions: record array with fields ID, Elevation, Demand, Pattern, X, Y (one entry per junction in file order)
+
+    reservoirs: record array with fields ID, Head, Pattern, X, Y
+
+    pipes: record array with fields ID, Node1, Node2, Length, Diameter, Roughness, MinorLoss, Status
+
+    options, times: dictionaries of the raw [OPTIONS] and [TIMES] entries with upper case keys e.g., "DEMAND MODEL", "DURATION"
+
+    flow_units, demand_model, minimum_pressure, required_pressure, duration (s): parsed values of the corresponding options
+
+    lines: list of all lines in the file (including the new line character)
+    """
+    # In-memory models returned by the converters are read from their text
+    if isinstance(path,dict):
+        lines=path["text"].splitlines(keepends=True)
+    else:
+        with open(path,'r') as file:
+            lines=file.readlines()
+
+    # Sections that are parsed, everything else is only kept in lines
+    parsed=("[JUNCTIONS]","[RESERVOIRS]","[PIPES]","[DEMANDS]","[COORDINATES]","[OPTIONS]","[TIMES]")
+    rows={section:[] for section in parsed}
+    section=None
+
+    for line in lines:
+        # Removes comments and skips empty lines
+        current=line.split(';')[0].split()
+        if not current:
+            continue
+        if current[0].startswith('['):
+            section=current[0].upper()
+            continue
+        if section in rows:
+            rows[section].append(current)
+
+    options=__read_keyed_entries__(rows["[OPTIONS]"],__two_word_options__)
+    times=__read_keyed_entries__(rows["[TIMES]"],__two_word_times__)
+
+    flow_units=options.get("UNITS","GPM").split()[0].upper()
+    assert flow_units in __flow_factors__, "Unsupported flow units "+flow_units
+    flow_factor=__flow_factors__[flow_units]
+    # US customary flow units use feet and inches, all metric flow units use meters and millimeters
+    traditional=flow_units in ("CFS","GPM","MGD","IMGD","AFD")
+    length_factor=0.3048 if traditional else 1
+    diameter_factor=0.0254 if traditional else 0.001
+    pressure_factor=0.3048/0.4333 if traditional else 1
+
+    coordinates={current[0]:(float(current[1]),float(current[2])) for current in rows["[COORDINATES]"]}
+
+    # The [DEMANDS] section overrides the demand given in the [JUNCTIONS] section (the first demand listed for each junction is kept)
+    demand_overrides={}
+    for current in rows["[DEMANDS]"]:
+        if current[0] not in demand_overrides:
+            demand_overrides[current[0]]=(float(current[1])*flow_factor,current[2] if len(current)>2 else '')
+
+    junction_ids=[current[0] for current in rows["[JUNCTIONS]"]]
+    junction_demands=[float(current[2])*flow_factor if len(current)>2 else 0.0 for current in rows["[JUNCTIONS]"]]
+    junction_patterns=[current[3] if len(current)>3 else '' for current in rows["[JUNCTIONS]"]]
+    for i,id in enumerate(junction_ids):
+        if id in demand_overrides:
+            junction_demands[i],junction_patterns[i]=demand_overrides[id]
+    junction_coords=[coordinates.get(id,(0.0,0.0)) for id in junction_ids]
+    junctions=np.rec.fromarrays([np.array(junction_ids,dtype=str),
+                                 np.array([float(current[1]) for current in rows["[JUNCTIONS]"]])*length_factor,
+                                 np.array(junction_demands,dtype=float),
+                                 np.array(junction_patterns,dtype=str),
+                                 np.array([coord[0] for coord in junction_coords],dtype=float),
+                                 np.array([coord[1] for coord in junction_coords],dtype=float)],
+                                names="ID,Elevation,Demand,Pattern,X,Y")
+
+    reservoir_ids=[current[0] for current in rows["[RESERVOIRS]"]]
+    reservoir_coords=[coordinates.get(id,(0.0,0.0)) for id in reservoir_ids]
+    reservoirs=np.rec.fromarrays([np.array(reservoir_ids,dtype=str),
+                                  np.array([float(current[1]) for current in rows["[RESERVOIRS]"]],dtype=float)*length_factor,
+                                  np.array([current[2] if len(current)>2 else '' for current in rows["[RESERVOIRS]"]],dtype=str),
+                                  np.array([coord[0] for coord in reservoir_coords],dtype=float),
+                                  np.array([coord[1] for coord in reservoir_coords],dtype=float)],
+                                 names="ID,Head,Pattern,X,Y")
+
+    # Darcy-Weisbach roughness is a length (millifeet or mm), Hazen-Williams and Chezy-Manning coefficients are unitless
+    roughness_factor=1
+    if options.get("HEADLOSS","H-W").upper()=="D-W":
+        roughness_factor=0.001*0.3048 if traditional else 0.001
+    pipes=np.rec.fromarrays([np.array([current[0] for current in rows["[PIPES]"]],dtype=str),
+                             np.array([current[1] for current in rows["[PIPES]"]],dtype=str),
+                             np.array([current[2] for current in rows["[PIPES]"]],dtype=str),
+                             np.array([float(current[3]) for current in rows["[PIPES]"]],dtype=float)*length_factor,
+                             np.array([float(current[4]) for current in rows["[PIPES]"]],dtype=float)*diameter_factor,
+                             np.array([float(current[5]) for current in rows["[PIPES]"]],dtype=float)*roughness_factor,
+                             np.array([float(current[6]) if len(current)>6 else 0.0 for current in rows["[PIPES]"]],dtype=float),
+                             np.array([current[7].upper() if len(current)>7 else 'OPEN' for current in rows["[PIPES]"]],dtype=str)],
+                            names="ID,Node1,Node2,Length,Diameter,Roughness,MinorLoss,Status")
+
+    network={"junctions":junctions,
+             "reservoirs":reservoirs,
+             "pipes":pipes,
+             "options":options,
+             "times":times,
+             "flow_units":flow_units,
+             "demand_model":options.get("DEMAND MODEL","DDA").split()[0].upper(),
+             "minimum_pressure":float(options.get("MINIMUM PRESSURE","0").split()[0])*pressure_factor,
+             "required_pressure":float(options.get("REQUIRED PRESSURE","0.1").split()[0])*pressure_factor,
+             "duration":__time_to_seconds__(times.get("DURATION","0")),
+             "lines":lines}
+    return network
+
+
+def __read_keyed_entries__(rows,two_word_keys):
+    # Splits [OPTIONS] or [TIMES] entries into keys (one or two words) and values
+    entries={}
+    for current in rows:
+        if len(current)>2 and (current[0]+" "+current[1]).upper() in two_word_keys:
+            entries[(current[0]+" "+current[1]).upper()]=" ".join(current[2:])
+        else:
+            entries[current[0].upper()]=" ".join(current[1:])
+    return entries
+
+
+def __time_to_seconds__(value:str):
+    # Converts an EPANET time entry (e.g., "4:00", "4", "240 MIN", "1.5 HOURS") to seconds. Plain numbers are in hours
+    current=value.split()
+    if not current:
+        return 0
+    if ':' in current[0]:
+        hhmmss=[float(part) for part in current[0].split(':')]+[0,0]
+        return hhmmss[0]*3600+hhmmss[1]*60+hhmmss[2]
+    unit=current[1].upper() if len(current)>1 else "HOURS"
+    for prefix,seconds in (("SEC",1),("MIN",60),("HOUR",3600),("DAY",86400)):
+        if unit.startswith(prefix):
+            return float(current[0])*seconds
+    return float(current[0])*3600
+
+
+def __index_sections__(lines):
+    """
+    Indexes the lines of an EPANET or EPA-SWMM input file (or the SWMM template) into named sections in one pass
+
+    Parameters
+    -----------
+    lines (list): lines of the input file, with or without the new line character
+
+
+    Returns: dictionary of section name (e.g., "[JUNCTIONS]") -> dictionary with three lists of lines (without new line characters):
+    head (the section header and the column header comments that follow it), rows (the body of the section) and tail (blank lines at the end of the section).
+    Lines before the first section are stored under the name "". Repeated sections are merged into the first one
+    """
+    sections={"":{"head":[],"rows":[],"tail":[]}}
+    current=sections[""]["rows"]
+    for line in lines:
+        line=line.rstrip('\n')
+        stripped=line.strip()
+        if stripped.startswith('[') and ']' in stripped:
+            name=stripped[:stripped.index(']')+1].upper()
+            if name in sections:
+                # Repeated section: its body is added to the first section with the same name
+                current=sections[name]["rows"]
+            else:
+                sections[name]={"head":[line],"rows":[],"tail":[]}
+                current=sections[name]["rows"]
+            continue
+        current.append(line)
+
+    # Splits each body into the column header comments at the start, the rows and the blank lines at the end
+    for section in sections.values():
+        body=section["rows"]
+        start=0
+        while start<len(body) and body[start].strip().startswith(';'):
+            start+=1
+        end=len(body)
+        while end>start and not body[end-1].strip():
+            end-=1
+        section["head"].extend(body[:start])
+        section["tail"]=body[end:]
+        section["rows"]=body[start:end]
+    return sections
+
+
+def __append_rows__(sections:dict,name:str,rows):
+    # Adds rows (lines without the new line character, or a generator of lines from __format_rows__) to the end of a section, creating the section before [END] if it does not exist
+    if name not in sections:
+        end=sections.pop("[END]",None)
+        sections[name]={"head":[name],"rows":[],"tail":[""]}
+        if end is not None:
+            sections["[END]"]=end
+    # Added rows are kept as separate blocks so that generators are only consumed when the file is written
+    sections[name].setdefault("added",[]).append(rows)
+
+
+def __replace_rows__(sections:dict,name:str,rows):
+    # Replaces all rows of a section, keeping its header and column header comments
+    __append_rows__(sections,name,[])
+    sections[name]["rows"]=[]
+    sections[name]["added"]=[rows]
+
+
+def __set_entry__(sections:dict,name:str,key:str,value):
+    # Sets the value of a keyed entry such as an option (e.g., "Minimum Pressure" in [OPTIONS] or END_TIME in the SWMM [OPTIONS]), adding it if missing
+    __append_rows__(sections,name,[])
+    n_words=len(key.split())
+    key_words=key.upper().split()
+    new_line=key.ljust(21)+str(value)
+    rows=sections[name]["rows"]
+    for i,line in enumerate(rows):
+        if [word.upper() for word in line.split(';')[0].split()[:n_words]]==key_words:
+            rows[i]=new_line
+            return
+    rows.append(new_line)
+
+
+def __format_rows__(*columns,width:int=10,chunk:int=50000):
+    """
+    Formats the fields of an input file section into fixed-width lines. Lines are generated chunk by chunk when the file is written,
+    so large sections are streamed to the output file without holding all of their text in memory. Floats are rounded like
+    DataFrame.to_string, which wrote the sections before, as results of some methods (e.g., PSV-Tank) are sensitive to the last digits of
+    the loss coefficients
+
+    Parameters
+    -----------
+    columns (list, NumPy array or Pandas Series): values of each field of the section in order, all of the same length
+
+    width (int): minimum width of each field. Default: 10
+
+    chunk (int): number of lines formatted at a time. Default: 50000
+
+
+    Returns: generator of lines (without the new line character)
+    """
+    # Copies the columns as lists of Python values so that later changes to the inputs do not alter the section
+    columns=[column.tolist() if hasattr(column,"tolist") else list(column) for column in columns]
+    n_rows=len(columns[0]) if columns else 0
+    assert all(len(column)==n_rows for column in columns), "All fields of a section must have the same length"
+    template=("{!s:<"+str(width)+"} ")*len(columns)
+    columns=[__format_floats__(column) for column in columns]
+
+    def generate():
+        for start in range(0,n_rows,chunk):
+            block=zip(*(column[start:start+chunk] for column in columns))
+            yield from [template.format(*row).rstrip() for row in block]
+    return generate()
+
+
+def __format_floats__(column:list):
+    # Writes the floats of a field like DataFrame.to_string (6 decimals with the trailing zeros common to the field dropped), switching the
+    # whole field to scientific notation with 7 significant digits if it holds values too small to show or wide values above 1e6.
+    # Integers and text are written as they are
+    positions=[position for position,value in enumerate(column) if isinstance(value,float)]
+    if not positions:
+        return column
+    values=[column[position] for position in positions]
+    texts=["%.6f" % value for value in values]
+    numbers=[text for text in texts if "." in text]
+    trim=min((len(text)-len(text.rstrip("0")) for text in numbers),default=0)
+    texts=[text[:len(text)-trim] if "." in text else text for text in texts]
+    # Leaves one zero after the decimal point if all decimals were dropped
+    texts=[text+"0" if text.endswith(".") else text for text in texts]
+    magnitudes=[abs(value) for value in values]
+    if any(0<magnitude<1e-6 for magnitude in magnitudes) or (max(map(len,texts))>12 and max(magnitudes)>1e6):
+        texts=["%.6e" % value for value in values]
+    column=list(column)
+    for position,text in zip(positions,texts):
+        column[position]=text
+    return column
+
+
+def __write_sections__(sections:dict,path):
+    # Writes all sections to a file (or an open text stream) in one buffered pass, consuming the added row generators as it goes
+    if not hasattr(path,'write'):
+        with open(path,'w') as file:
+            return __write_sections__(sections,file)
+    for section in sections.values():
+        for part in (section["head"],section["rows"],*section.get("added",[]),section["tail"]):
+            path.writelines(line+'\n' for line in part)
+
+
+def __in_memory__(sections:dict,path:pathlib.Path,**extra):
+    # Renders all sections into a string instead of a file. The model keeps the path the file would have been written to
+    # and any extra data the method writes next to the file (e.g., the desired demands of Outlet-Outfall)
+    # While write_scenarios captures sections, they are returned unrendered
+    if getattr(__capture__,"sections",False):
+        return {"path":path,"sections":sections,**extra}
+    buffer=io.StringIO()
+    __write_sections__(sections,buffer)
+    return {"path":path,"text":buffer.getvalue(),**extra}
+
+
+def __save_model__(sections:dict,new_file_name:pathlib.Path,cache_entry:dict,in_memory:bool,lean:bool,**extra):
+    # Writes the sections of a converted file (or renders them into an in-memory model) with the side files of the method
+    # (e.g., the desired demands of Outlet-Outfall), making the file lean first if requested, and adds the result to the cache
+    if lean:
+        extra["ids"]=__make_lean__(sections)
+    # In-memory models carry the side files along instead of the csv files
+    if in_memory:
+        return __to_cache__(cache_entry,__in_memory__(sections,new_file_name,**extra))
+    __write_sections__(sections,new_file_name)
+    for key,(suffix,read_options) in __side_files__.items():
+        if extra.get(key) is not None:
+            extra[key].to_csv(new_file_name.parent/pathlib.Path(new_file_name.stem+suffix))
+    return __to_cache__(cache_entry,new_file_name)
+
+
+def __make_lean__(sections:dict):
+    """
+    Turns the sections of a converted file into the sections of a lean file for running only: the visual sections are removed and all
+    node and link IDs are replaced by short IDs (N1, N2, ... for nodes and L1, L2, ... for links) wherever they are defined or referenced
+
+    Parameters
+    -----------
+    sections (dict): sections of the file as indexed by __index_sections__ and filled by the converter. Changed in place
+
+
+    Returns: Pandas DataFrame indexed by the short IDs (ID) with the original ID (Original) and the Type (Node or Link) of each element
+    """
+    for name in __visual_sections__:
+        sections.pop(name,None)
+
+    # Rows of the sections that hold IDs split into fields without comments (consuming the added row generators) and the IDs in order of definition
+    fields={}
+    short_ids={"node":{},"link":{}}
+    for name,section in sections.items():
+        if name not in __lean_fields__ and name not in __lean_keyed__:
+            continue
+        rows=[]
+        for part in (section["rows"],*section.get("added",[])):
+            for line in part:
+                current=line.split(';')[0].split()
+                if current:
+                    rows.append(current)
+        fields[name]=rows
+        kind="node" if name in __lean_nodes__ else "link" if name in __lean_links__ else None
+        if kind is not None:
+            prefix="N" if kind=="node" else "L"
+            defined=short_ids[kind]
+            for current in rows:
+                if current[0] not in defined:
+                    defined[current[0]]=prefix+str(len(defined)+1)
+
+    nodes=short_ids["node"]
+    links=short_ids["link"]
+    for name,rows in fields.items():
+        node_fields,link_fields=__lean_fields__.get(name,((),()))
+        for current in rows:
+            for i in node_fields:
+                if i<len(current):
+                    current[i]=nodes.get(current[i],current[i])
+            for i in link_fields:
+                if i<len(current):
+                    current[i]=links.get(current[i],current[i])
+            keyword=current[0].upper()
+            if name in ("[CONTROLS]","[RULES]"):
+                # Rules reference elements by a type keyword followed by the ID, e.g., IF NODE StorageforNode1 DEPTH > 1 THEN OUTLET Outlet1 SETTING = 0
+                for i in range(len(current)-1):
+                    kind=__lean_rule_keywords__.get(current[i].upper())
+                    if kind is not None:
+                        current[i+1]=short_ids[kind].get(current[i+1],current[i+1])
+            elif name=="[REPORT]" and keyword in ("NODES","LINKS"):
+                table=nodes if keyword=="NODES" else links
+                current[1:]=[table.get(id,id) for id in current[1:]]
+            elif name=="[REACTIONS]" and keyword in ("BULK","WALL","TANK") and len(current)==3:
+                table=nodes if keyword=="TANK" else links
+                current[1]=table.get(current[1],current[1])
+            elif name=="[ENERGY]" and keyword=="PUMP" and len(current)>1:
+                current[1]=links.get(current[1],current[1])
+        section=sections[name]
+        section["rows"]=[" ".join(current) for current in rows]
+        section.pop("added",None)
+
+    # Column header comments are not needed to run the file
+    for section in sections.values():
+        del section["head"][1:]
+
+    ids=pd.DataFrame({"ID":list(nodes.values())+list(links.values()),"Original":list(nodes)+list(links),
+                      "Type":["Node"]*len(nodes)+["Link"]*len(links)})
+    return ids.set_index("ID")
+
+
+def __source_path__(path):
+    # Path of the source file, also for in-memory models which keep the path the converter would have written them to
+    if isinstance(path,dict):
+        return pathlib.Path(path["path"])
+    return pathlib.Path(path)
+
+
+def __from_cache__(path,network,method:str,parameters:tuple,new_file_name:pathlib.Path,in_memory:bool):
+    # Looks up a conversion in the cache. Returns the cache entry describing the conversion (None if the cache is disabled)
+    # and the cached result: the copied file (or in-memory model) at new_file_name, None if the conversion is not cached
+    directory=__cache_settings__["directory"]
+    if directory is None or getattr(__capture__,"sections",False):
+        return None,None
+
+    # The key only depends on the content of the source, so renamed or moved copies of a network share their conversions
+    if network is not None:
+        text="".join(network["lines"])
+    elif isinstance(path,dict):
+        text=path["text"]
+    else:
+        with open(path,'r') as file:
+            text=file.read()
+    entry={"method":method,"source":__source_path__(path).name,"parameters":[None if parameter is None else float(parameter) for parameter in parameters],
+           "version":__cache_version__()}
+    source_hash=hashlib.sha256(text.encode()).hexdigest()
+    entry["key"]=hashlib.sha256(json.dumps([source_hash,method,entry["parameters"],entry["version"]]).encode()).hexdigest()[:32]
+
+    cached=pathlib.Path(directory)/entry["key"]
+    try:
+        # Touching the entry marks it as recently used for pruning
+        os.utime(cached/"entry.json")
+        if in_memory:
+            result={"path":new_file_name,"text":(cached/"model.inp").read_text()}
+        else:
+            shutil.copyfile(cached/"model.inp",new_file_name)
+            result=new_file_name
+        for key,(suffix,read_options) in __side_files__.items():
+            if (cached/(key+".csv")).exists():
+                if in_memory:
+                    result[key]=pd.read_csv(cached/(key+".csv"),**read_options)
+                else:
+                    shutil.copyfile(cached/(key+".csv"),new_file_name.parent/pathlib.Path(new_file_name.stem+suffix))
+    # Not cached, or removed by another process while being read
+    except FileNotFoundError:
+        return entry,None
+    print("Loaded from conversion cache: ",entry["key"])
+    return entry,result
+
+
+def __to_cache__(entry:dict,result):
+    # Adds a produced file (or in-memory model) to the cache and prunes the cache to its limits. Returns the result unchanged
+    if entry is None:
+        return result
+    directory=pathlib.Path(__cache_settings__["directory"])
+    directory.mkdir(parents=True,exist_ok=True)
+
+    # The entry is assembled in a staging directory and renamed into place, so that other threads and processes never see partial entries
+    staging=pathlib.Path(tempfile.mkdtemp(prefix=entry["key"]+".tmp-",dir=directory))
+    if isinstance(result,dict):
+        (staging/"model.inp").write_text(result["text"])
+    else:
+        shutil.copyfile(result,staging/"model.inp")
+    for key,(suffix,read_options) in __side_files__.items():
+        if isinstance(result,dict):
+            if result.get(key) is not None:
+                result[key].to_csv(staging/(key+".csv"))
+        elif (result.parent/pathlib.Path(result.stem+suffix)).exists():
+            shutil.copyfile(result.parent/pathlib.Path(result.stem+suffix),staging/(key+".csv"))
+    with open(staging/"entry.json",'w') as file:
+        json.dump({key:value for key,value in entry.items() if key!="key"},file)
+
+    with __cache_lock__:
+        try:
+            os.rename(staging,directory/entry["key"])
+        # Stored concurrently by another writer
+        except OSError:
+            shutil.rmtree(staging,ignore_errors=True)
+    __prune_cache__(directory,__cache_settings__["max_size_mb"],__cache_settings__["max_entries"])
+    return result
+
+
+def __prune_cache__(directory:pathlib.Path,max_size_mb:float,max_entries:int):
+    # Keeps the most recently used entries that fit in the limits and removes the rest. Returns the number of removed entries
+    removed=0
+    total_size=0
+    with __cache_lock__:
+        for i,entry in enumerate(__cache_entries__(directory)):
+            total_size+=entry["size"]
+            if (max_entries is not None and i>=max_entries) or (max_size_mb is not None and total_size>max_size_mb*1e6):
+                shutil.rmtree(directory/entry["key"],ignore_errors=True)
+                removed+=1
+    return removed
+
+
+def __cache_entries__(directory:pathlib.Path):
+    # Complete entries of the cache directory, most recently used first
+    entries=[]
+    if not directory.is_dir():
+        return entries
+    for cached in directory.iterdir():
+        try:
+            with open(cached/"entry.json",'r') as file:
+                entry=json.load(file)
+            entry["key"]=cached.name
+            entry["last_used"]=(cached/"entry.json").stat().st_mtime
+            entry["size"]=sum(item.stat().st_size for item in cached.iterdir())
+        # Staging directories and entries removed in the meantime
+        except (FileNotFoundError,NotADirectoryError):
+            continue
+        entries.append(entry)
+    entries.sort(key=lambda entry:entry["last_used"],reverse=True)
+    return entries
+
+
+def __cache_directory__(directory):
+    # Directory given to the public cache functions, falling back to the enabled cache
+    if directory is None:
+        directory=__cache_settings__["directory"]
+    assert directory is not None, "No cache directory. Pass one, call set_cache or set the IWS_MODELLING_CACHE environment variable"
+    return pathlib.Path(directory).expanduser()
+
+
+def __cache_version__():
+    # Package version and a fingerprint of this module, so that cached files are not reused after the converters change
+    if __cache_settings__.get("version") is None:
+        try:
+            version=importlib.metadata.version("iws_modelling")
+        except importlib.metadata.PackageNotFoundError:
+            version="unknown"
+        with open(__file__,'rb') as file:
+            fingerprint=hashlib.sha256(file.read()).hexdigest()[:12]
+        __cache_settings__["version"]=version+"+"+fingerprint
+    return __cache_settings__["version"]
+
+
+# Converters of each method by name in the order of to_all, and the methods producing EPA-SWMM files (which take del_x_max)
+__method_converters__={"CV-Res":to_CVRes,"CV-Tank":to_CVTank,"FCV-EM":to_FCVEM,"FCV-Res":to_FCVRes,"PSV-Tank":to_PSVTank,
+                       "Outlet-Outfall":to_Outlet_Outfall,"Outlet-Storage":to_Outlet_Storage,"FCV-Tank":to_FCVTank,
+                       "Float-Storage":to_Float_Storage,"Campisano":to_Campisano,"3O2S1P":to_3O2S1P}
+__swmm_methods__={"Outlet-Outfall","Outlet-Storage","Float-Storage","Campisano","3O2S1P"}
+# The 7 methods of the study, written by to_all and by default by convert_directory
+__study_methods__=("CV-Res","CV-Tank","FCV-EM","FCV-Res","PSV-Tank","Outlet-Outfall","Outlet-Storage")
+# Files written next to converted files by key of in-memory models: file name suffix and options to read them back from the cache
+__side_files__={"demands":("_Demands.csv",{"index_col":"ID","float_precision":"round_trip"}),"ids":("_IDs.csv",{"index_col":"ID","dtype":str})}
+# Settings of the conversion cache (see set_cache). Enabled from the start if the IWS_MODELLING_CACHE environment variable is set
+__cache_settings__={"directory":os.environ.get("IWS_MODELLING_CACHE") or None,"max_size_mb":1024,"max_entries":None,"version":None}
+__cache_lock__=threading.Lock()
+# Set by write_scenarios while a converter assembles the sections of a scenario (per thread)
+__capture__=threading.local()
+# Sections of converted files that do not depend on the desired demands or the pressure thresholds, copied from the template by write_scenarios
+__template_static__={"","[TITLE]","[JUNCTIONS]","[COORDINATES]","[VERTICES]","[LABELS]","[BACKDROP]","[MAP]","[CONDUITS]","[XSECTIONS]",
+                     "[TAGS]","[PATTERNS]","[TIMES]","[REPORT]","[END]"}
+# Factors converting each EPANET flow unit into m3/s (same factors as WNTR)
+__flow_factors__={"CFS":0.0283168466,"GPM":0.003785411784/60.0,"MGD":1e6*0.003785411784/86400.0,"IMGD":1e6*0.00454609/86400.0,
+                  "AFD":1233.48184/86400.0,"LPS":0.001,"LPM":0.001/60.0,"MLD":1e6*0.001/86400.0,"CMH":1.0/3600.0,"CMD":1.0/86400.0}
+# Sections left out of lean files, the sections defining node and link IDs with their first field, the fields holding node and link IDs
+# in each section (node fields, link fields), the sections without fixed ID fields and the keywords followed by an ID in rules
+__visual_sections__=("[COORDINATES]","[VERTICES]","[LABELS]","[BACKDROP]","[TAGS]","[MAP]","[POLYGONS]","[SYMBOLS]")
+__lean_nodes__={"[JUNCTIONS]","[RESERVOIRS]","[TANKS]","[OUTFALLS]","[STORAGE]","[DIVIDERS]"}
+__lean_links__={"[PIPES]","[PUMPS]","[VALVES]","[CONDUITS]","[ORIFICES]","[WEIRS]","[OUTLETS]"}
+__lean_fields__={**{name:((0,),()) for name in __lean_nodes__},**{name:((1,2),(0,)) for name in __lean_links__},
+                 "[EMITTERS]":((0,),()),"[DEMANDS]":((0,),()),"[SOURCES]":((0,),()),"[QUALITY]":((0,),()),"[MIXING]":((0,),()),
+                 "[INFLOWS]":((0,),()),"[DWF]":((0,),()),"[STATUS]":((),(0,)),"[XSECTIONS]":((),(0,)),"[LOSSES]":((),(0,))}
+__lean_rule_keywords__={"NODE":"node","JUNCTION":"node","RESERVOIR":"node","TANK":"node","STORAGE":"node","OUTFALL":"node",
+                        "LINK":"link","PIPE":"link","PUMP":"link","VALVE":"link","CONDUIT":"link","ORIFICE":"link","WEIR":"link","OUTLET":"link"}
+__lean_keyed__={"[CONTROLS]","[RULES]","[REPORT]","[REACTIONS]","[ENERGY]"}
+# [OPTIONS] and [TIMES] keys made up of two words
+__two_word_options__={"SPECIFIC GRAVITY","DEMAND MULTIPLIER","DEMAND MODEL","MINIMUM PRESSURE","REQUIRED PRESSURE","PRESSURE EXPONENT",
+                      "EMITTER EXPONENT","MAXIMUM TRIALS","FLOW CHANGE","HEAD ERROR"}
+__two_word_times__={"HYDRAULIC TIMESTEP","QUALITY TIMESTEP","RULE TIMESTEP","PATTERN TIMESTEP","PATTERN START","REPORT TIMESTEP",
+                    "REPORT START","START CLOCKTIME"}
+
+
 def __swmm_template__():
     template='''
 [TITLE]
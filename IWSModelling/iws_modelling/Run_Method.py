@@ -2,8 +2,8 @@
 The Run_Method Module contains methods to execute and process the output of IWS EPANET and EPA-SWMM Files
 using one of the  eight methods we studied
 """
-global wntr,np,pd,re,math,mpl,figure,plt,timeit,pyswmm,LinkAttribute,NodeAttribute,datetime,pathlib
-global simplefilter
+global wntr,np,pd,re,math,mpl,figure,plt,timeit,pyswmm,LinkAttribute,NodeAttribute,datetime,pathlib,tempfile
+global simplefilter,contextlib,io
 
 import wntr
 import numpy as np 
@@ -19,6 +19,9 @@ from swmm.toolkit.shared_enum import LinkAttribute,NodeAttribute
 from warnings import simplefilter
 import datetime
 import pathlib
+import tempfile
+import contextlib
+import io
 
 def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:int=90,save_outputs:bool=True,time_execution:bool=False,n_iterations:int=100,plots=True):
     """
@@ -26,7 +29,8 @@ def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile
 
     Parameters
     -----------
-    path (str): path to input file (relative, but will handle full absolute paths)
+    path (str): path to input file (relative, but will handle full absolute paths), an in-memory model returned by a Convert_Method function
+    with in_memory=True or a WNTR WaterNetworkModel
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
 
@@ -59,22 +63,29 @@ def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
     assert n_iterations>0, "Specify a positive integer"
 
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
     name_only=path.stem
     print("Selected File: ",name_only)
 
     # create network model from input file
-    network = wntr.network.WaterNetworkModel(path)
+    network=__network_model__(model,input_file)
     Hmin=network.options.hydraulic.minimum_pressure
     Hdes=network.options.hydraulic.required_pressure
 
+    # Original IDs of the short IDs of lean files (empty for other files)
+    ids=__original_ids__(input_file)
+
     demand_links=[]        #list of pipes connected to demand nodes only
     lengths=[]
     diameters=[]
     hwcoeff=[]
 
     for link in network.links():
-        if re.search('^PipeforNode',link[1].name):
-            demand_links.append(link[1].name)
+        name=ids.get(link[1].name,link[1].name)
+        if re.search('^PipeforNode',name):
+            demand_links.append(name)
             lengths.append(link[1].length)
             diameters.append(link[1].diameter)
             hwcoeff.append(link[1].roughness)
@@ -91,21 +102,16 @@ def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile
     # run simulation
     sim = wntr.sim.EpanetSimulator(network)
     # store results of simulation
-    results=sim.run_sim()
+    results=sim.run_sim(file_prefix=__file_prefix__(temporary))
+    # Lean files are reported by the original IDs
+    __restore_ids__(results,ids)
 
     if time_execution:
-        __time_simulation__(path,n_iterations)
-
-    timesrs_output=pd.DataFrame()
+        __time_simulation__(input_file,n_iterations)
 
     if output=='S':
-        timesrs_output[0]=results.link['flowrate'].loc[0,:]
-        for i in range(1,supply_duration+1):
-            # Extract Node Pressures from Results
-            timesrs_output=pd.concat([timesrs_output,results.link['flowrate'].loc[i*60,:]],axis=1)
-
-        # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-        timesrs_output=timesrs_output.T
+        # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+        timesrs_output=__report_periods__(results.link['flowrate'],supply_duration)
         # Filter DataFrame for Columns that contain Data for demand nodes only i.e., Tanks in STM
         timesrs_output=timesrs_output.filter(demand_links)
 
@@ -125,20 +131,15 @@ def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile
         timesrs_processed.iloc[0,:]=0
 
         # Loop over consumers and time steps to add up volumes as a percentage of total desired volume (Satisfaction Ratio)
-        for timestep in list(timesrs_processed.index)[1:]:
+        times=list(timesrs_processed.index)
+        for previous,timestep in zip(times[:-1],times[1:]):
             for node in timesrs_processed.columns:
                 # Cummulatively add the percent satisfaction ratio (SR) increased each time step
-                ## SR at time t = SR at time t-1 + demand at time t-1 (cms) *60 seconds per time step/ Desired Demand Volume (cum)
-                timesrs_processed.at[timestep,node]=timesrs_processed.at[timestep-60,node]+timesrs_output.at[timestep-60,node]*60/desired_volumes[node]*100
+                ## SR at time t = SR at previous time + demand at previous time (cms) * reporting step (sec) / Desired Demand Volume (cum)
+                timesrs_processed.at[timestep,node]=timesrs_processed.at[previous,node]+timesrs_output.at[previous,node]*(timestep-previous)/desired_volumes[node]*100
     elif output=='P':
-        timesrs_output[0]=results.node['pressure'].loc[0,:]
-        for i in range(1,supply_duration+1):
-
-            # Extract Node Pressures from Results
-            timesrs_output=pd.concat([timesrs_output,results.node['pressure'].loc[i*60,:]],axis=1)
-
-        # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-        timesrs_output=timesrs_output.T
+        # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+        timesrs_output=__report_periods__(results.node['pressure'],supply_duration)
         # Filter DataFrame for Columns that contain Data for demand nodes only i.e., Tanks in STM
         node_list=[]
         for column in timesrs_output.columns:
@@ -175,8 +176,7 @@ def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile
         mpl.rcParams['axes.linewidth'] = 0.5
 
         # Prepping an xaxis with hr format
-        supply_duration_hr=supply_duration/60
-        xaxis=np.arange(0,supply_duration_hr+0.00001,1/60)
+        xaxis=timesrs_processed.index.to_numpy()/3600
 
         fig,ax=__plot_mean__(xaxis,mean,output,'#fee090',high_percentile_series)
         plt.xlabel('Supply Time (hr)')
@@ -194,16 +194,19 @@ def CVRes(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile
         elif output=='P':
             plt.ylabel('Nodal Pressure (m)')
         plt.show
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
 
             
 def CVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:int=90,save_outputs:bool=True,time_execution:bool=False,n_iterations:int=100,plots=True):
     """
-    Executes an IWS EPANET file that uses the volume-restricted method CV-Res.
+    Executes an IWS EPANET file that uses the volume-restricted method CV-Tank (or FCV-Tank, whose private tanks are also 1 m high at the node elevation).
 
     Parameters
     -----------
-    path (str): path to input file (relative, but will handle full absolute paths) 
+    path (str): path to input file (relative, but will handle full absolute paths), an in-memory model returned by a Convert_Method function
+    with in_memory=True or a WNTR WaterNetworkModel
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
 
@@ -237,11 +240,14 @@ def CVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentil
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
     assert n_iterations>0, "Specify a positive integer"
 
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
     name_only=path.stem
     print("Selected File: ",name_only)
 
     # create network model from input file
-    network = wntr.network.WaterNetworkModel(path)
+    network=__network_model__(model,input_file)
 
     ## Extract Supply Duration from .inp file
     supply_duration=int(network.options.time.duration/60)    # in minutes
@@ -249,18 +255,15 @@ def CVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentil
     # run simulation
     sim = wntr.sim.EpanetSimulator(network)
     # store results of simulation
-    results=sim.run_sim()
+    results=sim.run_sim(file_prefix=__file_prefix__(temporary))
+    # Lean files are reported by the original IDs
+    __restore_ids__(results,__original_ids__(input_file))
 
     if time_execution:
-        __time_simulation__(path,n_iterations)
+        __time_simulation__(input_file,n_iterations)
     
-    timesrs_output=pd.DataFrame()
-    timesrs_output[0]=results.node['pressure'].loc[0,:]
-    for i in range(1,supply_duration+1):
-        # Extract Node Pressures from Results
-        timesrs_output=pd.concat([timesrs_output,results.node['pressure'].loc[i*60,:]],axis=1)
-    # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-    timesrs_output=timesrs_output.T
+    # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+    timesrs_output=__report_periods__(results.node['pressure'],supply_duration)
 
     if output=='S':
         timesrs_processed=timesrs_output.filter(regex='Tank\D+',axis=1)*100
@@ -298,8 +301,7 @@ def CVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentil
         mpl.rcParams['axes.linewidth'] = 0.5
 
         # Prepping an xaxis with hr format
-        supply_duration_hr=supply_duration/60
-        xaxis=np.arange(0,supply_duration_hr+0.00001,1/60)
+        xaxis=timesrs_processed.index.to_numpy()/3600
 
         fig,ax=__plot_mean__(xaxis,mean,output,'#d73027',high_percentile_series)
         plt.xlabel('Supply Time (hr)')
@@ -317,6 +319,8 @@ def CVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentil
         elif output=='P':
             plt.ylabel('Nodal Pressure (m)')
         plt.show    
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
 
 
@@ -326,7 +330,8 @@ def PSVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percenti
 
     Parameters
     -----------
-    path (str): path to input file (relative, but will handle full absolute paths)
+    path (str): path to input file (relative, but will handle full absolute paths), an in-memory model returned by a Convert_Method function
+    with in_memory=True or a WNTR WaterNetworkModel
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
 
@@ -360,11 +365,14 @@ def PSVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percenti
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
     assert n_iterations>0, "Specify a positive integer"
 
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
     name_only=path.stem
     print("Selected File: ",name_only)
 
     # create network model from input file
-    network = wntr.network.WaterNetworkModel(path)
+    network=__network_model__(model,input_file)
 
     ## Extract Supply Duration from .inp file
     supply_duration=int(network.options.time.duration/60)    # in minutes
@@ -372,19 +380,15 @@ def PSVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percenti
     # run simulation
     sim = wntr.sim.EpanetSimulator(network)
     # store results of simulation
-    results=sim.run_sim()
+    results=sim.run_sim(file_prefix=__file_prefix__(temporary))
+    # Lean files are reported by the original IDs
+    __restore_ids__(results,__original_ids__(input_file))
 
     if time_execution:
-        __time_simulation__(path,n_iterations)
+        __time_simulation__(input_file,n_iterations)
     
-    timesrs_output=pd.DataFrame()
-    timesrs_output[0]=results.node['pressure'].loc[0,:]
-    for i in range(1,supply_duration+1):
-        # Extract Node Pressures from Results
-        timesrs_output=pd.concat([timesrs_output,results.node['pressure'].loc[i*60,:]],axis=1)
-
-    # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-    timesrs_output=timesrs_output.T
+    # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+    timesrs_output=__report_periods__(results.node['pressure'],supply_duration)
     # Filter DataFrame for Columns that contain Data for demand nodes only i.e., Tanks in STM
     if output=='S':
         timesrs_processed=timesrs_output.filter(regex='AT\D+',axis=1)*100
@@ -423,8 +427,7 @@ def PSVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percenti
         mpl.rcParams['axes.linewidth'] = 0.5
 
         # Prepping an xaxis with hr format
-        supply_duration_hr=supply_duration/60
-        xaxis=np.arange(0,supply_duration_hr+0.00001,1/60)
+        xaxis=timesrs_processed.index.to_numpy()/3600
 
         fig,ax=__plot_mean__(xaxis,mean,output,'#fc8d59',high_percentile_series)
         plt.xlabel('Supply Time (hr)')
@@ -442,6 +445,8 @@ def PSVTank(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percenti
         elif output=='P':
             plt.ylabel('Nodal Pressure (m)')
         plt.show    
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
 
 
@@ -451,7 +456,8 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
 
     Parameters
     -----------
-    path (str): path to input file (relative, but will handle full absolute paths)
+    path (str): path to input file (relative, but will handle full absolute paths), an in-memory model returned by a Convert_Method function
+    with in_memory=True or a WNTR WaterNetworkModel
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
 
@@ -484,6 +490,9 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
     assert n_iterations>0, "Specify a positive integer"
 
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
     name_only=path.stem
     print("Selected File: ",name_only)
 
@@ -491,7 +500,10 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
     desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
 
     # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
+    network=__network_model__(model,input_file)
+
+    # Original IDs of the short IDs of lean files (empty for other files)
+    ids=__original_ids__(input_file)
 
     # Iterates over the junction list in the Network object
     for valve in network.valves():
@@ -499,7 +511,7 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         # For all nodes that have non-zero demands
         if valve[1].setting != 0:
             # Record node ID (name) and its desired demand (base_demand) in CMS
-            demand_valves.append(valve[1].name)
+            demand_valves.append(ids.get(valve[1].name,valve[1].name))
             desired_demands.append(valve[1].setting)
 
     # Get the supply duration in minutes (/60) as an integer
@@ -508,19 +520,16 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
     # run simulation
     sim = wntr.sim.EpanetSimulator(network)
     # store results of simulation
-    results=sim.run_sim()
+    results=sim.run_sim(file_prefix=__file_prefix__(temporary))
+    # Lean files are reported by the original IDs
+    __restore_ids__(results,ids)
 
     if time_execution:
-        __time_simulation__(path,n_iterations)
+        __time_simulation__(input_file,n_iterations)
 
-    timesrs_output=pd.DataFrame()
-    timesrs_output[0]=results.link['flowrate'].loc[0,:]
     if output=='S':
-        for i in range(1,supply_duration+1):
-            # Extract Node Pressures from Results
-            timesrs_output=pd.concat([timesrs_output,results.link['flowrate'].loc[i*60,:]],axis=1)
-        # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-        timesrs_output=timesrs_output.T
+        # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+        timesrs_output=__report_periods__(results.link['flowrate'],supply_duration)
         # Filter DataFrame for Columns that contain Data for demand nodes only
         timesrs_output=timesrs_output[demand_valves]
         # Calculates the total demand volume in the specified supply cycle
@@ -536,17 +545,15 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         # Set Initial volume for all consumers at 0
         timesrs_processed.iloc[0,:]=0
         # Loop over consumers and time steps to add up volumes as a percentage of total desired volume (Satisfaction Ratio)
-        for timestep in list(timesrs_processed.index)[1:]:
+        times=list(timesrs_processed.index)
+        for previous,timestep in zip(times[:-1],times[1:]):
             for node in timesrs_processed.columns:
                 # Cummulatively add the percent satisfaction ratio (SR) increased each time step
-                ## SR at time t = SR at time t-1 + demand at time t-1 (cms) *60 seconds per time step/ Desired Demand Volume (cum)
-                timesrs_processed.at[timestep,node]=timesrs_processed.at[timestep-60,node]+timesrs_output.at[timestep-60,node]*60/desired_volumes[node]*100
+                ## SR at time t = SR at previous time + demand at previous time (cms) * reporting step (sec) / Desired Demand Volume (cum)
+                timesrs_processed.at[timestep,node]=timesrs_processed.at[previous,node]+timesrs_output.at[previous,node]*(timestep-previous)/desired_volumes[node]*100
     elif output=='P':
-        for i in range(1,supply_duration+1):
-            # Extract Node Pressures from Results
-            timesrs_output=pd.concat([timesrs_output,results.node['pressure'].loc[i*60,:]],axis=1)
-        # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-        timesrs_output=timesrs_output.T
+        # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+        timesrs_output=__report_periods__(results.node['pressure'],supply_duration)
         # Filter DataFrame for Columns that contain Data for demand nodes only
         node_list=[]
         for valve in demand_valves:
@@ -580,8 +587,7 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         mpl.rcParams['axes.linewidth'] = 0.5
 
         # Prepping an xaxis with hr format
-        supply_duration_hr=supply_duration/60
-        xaxis=np.arange(0,supply_duration_hr+0.00001,1/60)
+        xaxis=timesrs_processed.index.to_numpy()/3600
 
         fig,ax=__plot_mean__(xaxis,mean,output,'#91bfdb',high_percentile_series)
         plt.xlabel('Supply Time (hr)')
@@ -599,6 +605,8 @@ def FCV(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         elif output=='P':
             plt.ylabel('Nodal Pressure (m)')
         plt.show 
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
 
 
@@ -608,7 +616,8 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
 
     Parameters
     -----------
-    path (str): path to input file (relative, but will handle full absolute paths) 
+    path (str): path to input file (relative, but will handle full absolute paths), an in-memory model returned by a Convert_Method function
+    with in_memory=True or a WNTR WaterNetworkModel
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
 
@@ -641,6 +650,9 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
     assert n_iterations>0, "Specify a positive integer"
 
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
     name_only=path.stem
     print("Selected File: ",name_only)
 
@@ -648,7 +660,7 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
     desired_demands=[]    # For storing demand rates desired by each node for desired volume calculations
 
     # Creates a network model object using EPANET .inp file
-    network=wntr.network.WaterNetworkModel(path)
+    network=__network_model__(model,input_file)
 
     # Iterates over the junction list in the Network object
     for node in network.junctions():
@@ -665,18 +677,14 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
     # run simulation
     sim = wntr.sim.EpanetSimulator(network)
     # store results of simulation
-    results=sim.run_sim()
+    results=sim.run_sim(file_prefix=__file_prefix__(temporary))
 
     if time_execution:
-        __time_simulation__(path,n_iterations)
+        __time_simulation__(input_file,n_iterations)
 
-    timesrs_output=pd.DataFrame()
     if output=='S':
-        for i in range(0,supply_duration+1):
-            # Extract Node Pressures from Results
-            timesrs_output=pd.concat([timesrs_output,results.node['demand'].loc[i*60,:]],axis=1)
-        # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-        timesrs_output=timesrs_output.T
+        # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+        timesrs_output=__report_periods__(results.node['demand'],supply_duration)
         # Filter DataFrame for Columns that contain Data for demand nodes only
         timesrs_output=timesrs_output[demand_nodes]
         # Calculates the total demand volume in the specified supply cycle
@@ -692,17 +700,15 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         # Set Initial volume for all consumers at 0
         timesrs_processed.iloc[0,:]=0
         # Loop over consumers and time steps to add up volumes as a percentage of total desired volume (Satisfaction Ratio)
-        for timestep in list(timesrs_processed.index)[1:]:
+        times=list(timesrs_processed.index)
+        for previous,timestep in zip(times[:-1],times[1:]):
             for node in timesrs_processed.columns:
                 # Cummulatively add the percent satisfaction ratio (SR) increased each time step
-                ## SR at time t = SR at time t-1 + demand at time t-1 (cms) *60 seconds per time step/ Desired Demand Volume (cum)
-                timesrs_processed.at[timestep,node]=timesrs_processed.at[timestep-60,node]+timesrs_output.at[timestep-60,node]*60/desired_volumes[node]*100
+                ## SR at time t = SR at previous time + demand at previous time (cms) * reporting step (sec) / Desired Demand Volume (cum)
+                timesrs_processed.at[timestep,node]=timesrs_processed.at[previous,node]+timesrs_output.at[previous,node]*(timestep-previous)/desired_volumes[node]*100
     elif output=='P':
-        for i in range(0,supply_duration+1):
-            # Extract Node Pressures from Results
-            timesrs_output=pd.concat([timesrs_output,results.node['pressure'].loc[i*60,:]],axis=1)
-        # Transpose DataFrame such that indices are time (sec) and Columns are each Node
-        timesrs_output=timesrs_output.T
+        # Outputs at each reporting time up to the end of the supply: indices are time (sec) and Columns are each Node
+        timesrs_output=__report_periods__(results.node['pressure'],supply_duration)
         timesrs_processed=timesrs_output[demand_nodes]
 
     mean,low_percentile_series,median,high_percentile_series=__get_stats__(timesrs_processed,low_percentile,high_percentile)
@@ -732,8 +738,7 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         mpl.rcParams['axes.linewidth'] = 0.5
 
         # Prepping an xaxis with hr format
-        supply_duration_hr=supply_duration/60
-        xaxis=np.arange(0,supply_duration_hr+0.00001,1/60)
+        xaxis=timesrs_processed.index.to_numpy()/3600
 
         fig,ax=__plot_mean__(xaxis,mean,output,'#4575b4',high_percentile_series)
         plt.xlabel('Supply Time (hr)')
@@ -751,6 +756,8 @@ def PDA(path:pathlib.Path,output:str='S',low_percentile:int=10,high_percentile:i
         elif output=='P':
             plt.ylabel('Nodal Pressure (m)')
         plt.show
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
 
 
@@ -760,7 +767,7 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str): path to input file. relative or full absolute path, or an in-memory model returned by a Convert_Method function with in_memory=True
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
 
@@ -790,19 +797,30 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
 
     simplefilter(action="ignore", category=pd.errors.PerformanceWarning)
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
+    assert not (ran_before and temporary is not None), "ran_before requires the path of a previously executed file"
     name_only=path.stem
     print("Selected File: ",name_only)
 
-    sim=pyswmm.Simulation(inputfile=str(path), outputfile=str(path.with_suffix(".out")))
+    sim=pyswmm.Simulation(inputfile=str(input_file), outputfile=str(input_file.with_suffix(".out")))
+
+    # Original IDs of the short IDs of lean files (empty for other files). Elements are read from the output file by the IDs in the file
+    ids=__original_ids__(input_file)
 
     links=pyswmm.links.Links(sim)   #object containing links in the network model
     demand_links=[]                 # Empty list for storing link ids
     demand_nodes=[]                 # Empty list for storing node ids
     for link in links:
+        linkid=ids.get(link.linkid,link.linkid)
         # if link starts with OUT then it's an outlet and store its id
-        if re.search('^Outlet',link.linkid):
-            demand_links.append(link.linkid)
-            demand_nodes.append(link.linkid[6:])
+        if re.search('^Outlet',linkid):
+            demand_links.append(linkid)
+            demand_nodes.append(linkid[6:])
+    # The simulation was only opened to list the links if the file ran before. Closes it so that later simulations can be opened
+    if ran_before:
+        sim.close()
 
     if ran_before==False:
         stp=0       #steps counter
@@ -824,7 +842,7 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
 
     if output=='S':
         # Reads the output file created above
-        with pyswmm.Output(str(path.with_suffix(".out"))) as out:
+        with pyswmm.Output(str(input_file.with_suffix(".out"))) as out:
             # loops through each link in output file
             for link in out.links:
 
@@ -835,12 +853,12 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
                     timesrs_output.loc[:,"time"]=index
                     swtch=False
                 # If link id is in the prepared list of demand links (outlets)
-                if link in demand_links:
+                if ids.get(link,link) in demand_links:
                     # gets the values of the flow rate series dictionary and stores as a Pandas Series
-                    timesrs_output.loc[:,link]=out.link_series(link,LinkAttribute.FLOW_RATE).values()
+                    timesrs_output.loc[:,ids.get(link,link)]=out.link_series(link,LinkAttribute.FLOW_RATE).values()
     elif output=='P':
         # Reads the output file created above
-        with pyswmm.Output(path.with_suffix(".out")) as out:
+        with pyswmm.Output(str(input_file.with_suffix(".out"))) as out:
             # loops through each link in output file
             for node in out.nodes:
 
@@ -851,12 +869,13 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
                     timesrs_output.loc[:,"time"]=index
                     swtch=False
                 # If link id is in the prepared list of demand links (outlets)
-                if node in demand_nodes:
+                if ids.get(node,node) in demand_nodes:
                     # gets the values of the flow rate series dictionary and stores as a Pandas Series
-                    timesrs_output.loc[:,node]=out.node_series(node,NodeAttribute.INVERT_DEPTH).values()
+                    timesrs_output.loc[:,ids.get(node,node)]=out.node_series(node,NodeAttribute.INVERT_DEPTH).values()
 
-    # Stores the start time stamp of the simulation
+    # Stores the start time stamp of the simulation and the reporting step of the file (the output holds the end of each reporting period)
     start_time=index[0]
+    report_step=__swmm_report_step__(input_file)
     # List to store index of time in seconds (0 added as the missing initial time step)
     new_index=[]
 
@@ -865,7 +884,7 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
         # Gets time difference in seconds
         timesec=(time-start_time).seconds
         # Appends time in seconds to new index
-        new_index.append(timesec+10)
+        new_index.append(timesec+report_step)
 
     timesrs_output["time"]=new_index
     timesrs_output.set_index("time",inplace=True)
@@ -879,11 +898,13 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
     if output=='S':
         # Calculates the total demand volume in the specified supply cycle
         desired_volumes=[]
-        demand_rates=pd.read_csv(path.parent/(path.stem+"_Demands.csv"))
+        demand_rates=pd.read_csv(input_file.parent/(input_file.stem+"_Demands.csv"))
         demand_rates.set_index("ID",inplace=True)
+        # Files with quantized demands (demand_classes or demand_tolerance) deliver the demand of each consumer's class
+        demand_column="Class Demand" if "Class Demand" in demand_rates.columns else "Demand"
 
         # Loop over each desired demand
-        for demand in demand_rates["Demand"]:
+        for demand in demand_rates[demand_column]:
             # Append the corresponding desired volume (cum) = demand (LPS) *60 sec/min * supply duration (hr) / 1000 (L/cum)
             desired_volumes.append(float(demand)*60*float(supply_duration))
 
@@ -951,6 +972,8 @@ def OutletOutfall(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
             plt.ylabel('Nodal Pressure (m)')
         plt.show
 
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
 
 
@@ -962,7 +985,7 @@ def OutletStorage(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
 
     Parameters
     -----------
-    path (str): path to input file. relative or full absolute path
+    path (str): path to input file. relative or full absolute path, or an in-memory model returned by a Convert_Method function with in_memory=True
 
     output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
     
@@ -992,18 +1015,27 @@ def OutletStorage(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
     assert 0 < high_percentile <100, "Percentile must be between 0 and 100"
     assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
 
-    simplefilter(action="ignore", category=pd.errors.PerformanceWarning)
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
+    assert not (ran_before and temporary is not None), "ran_before requires the path of a previously executed file"
     name_only=path.stem
     print("Selected File: ",name_only)
 
-    sim=pyswmm.Simulation(inputfile=str(path), outputfile=str(path.with_suffix(".out")))
+    sim=pyswmm.Simulation(inputfile=str(input_file), outputfile=str(input_file.with_suffix(".out")))
+
+    # Original IDs of the short IDs of lean files (empty for other files). Elements are read from the output file by the IDs in the file
+    ids=__original_ids__(input_file)
 
     nodes=pyswmm.nodes.Nodes(sim)
     tankids=[]
     for node in nodes:
-        if re.search('StorageforNode',node.nodeid):
-            tankids.append(node.nodeid)
+        if re.search('StorageforNode',ids.get(node.nodeid,node.nodeid)):
+            tankids.append(ids.get(node.nodeid,node.nodeid))
     demand_node_ids=[x[14:] for x in tankids]
+    # The simulation was only opened to list the nodes if the file ran before. Closes it so that later simulations can be opened
+    if ran_before:
+        sim.close()
 
     if ran_before==False:
         stp=0       #steps counter
@@ -1020,30 +1052,33 @@ def OutletStorage(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
             sim._model.swmm_end()
             print("Continuity Error: ",sim.flow_routing_error,"%\n")
 
-    Tank_Depths=pd.DataFrame()   #Empty Dataframe to store water depth in tanks
-    Node_Depths=pd.DataFrame()   #Empty Dataframe to store water depth in nodes
-    swtch=True                   # switch variable for upcoming condition
+    tank_set=set(tankids)               # Sets for constant-time membership checks while looping over the output nodes
+    demand_node_set=set(demand_node_ids)
 
     # Reads the output file created above
-    with pyswmm.Output(str(path.with_suffix(".out"))) as out:
-        # loops through each node in output file
-        for node in out.nodes:
-
-            # One time only. Gets the timesteps (the keys in the output series dictionary) and stores them to be used as index
-            if swtch:
-            # node_series produces a dictionary with the keys corresponding to timestamps and values contain the value of the selected variable (FLOW_RATE) at each timestamp
-                index=pd.Series(out.node_series(node,NodeAttribute.INVERT_DEPTH).keys())
-                Tank_Depths.loc[:,"time"]=index
-                swtch=False
-            
-            # If node id is in the prepared list of demand nodes (tanks)
-            if node in tankids:
-                Tank_Depths.loc[:,node]=pd.Series(out.node_series(node,NodeAttribute.INVERT_DEPTH).values())  
-            elif node in demand_node_ids:
-                Node_Depths.loc[:,node]=pd.Series(out.node_series(node,NodeAttribute.INVERT_DEPTH).values())
-
-    # Stores the start time stamp of the simulation
+    with pyswmm.Output(str(input_file.with_suffix(".out"))) as out:
+        # Tanks and demand nodes in the order in which they are stored in the output file
+        tank_columns=[node for node in out.nodes if ids.get(node,node) in tank_set]
+        node_columns=[node for node in out.nodes if ids.get(node,node) in demand_node_set]
+
+        # Gets the timesteps (the keys in the output series dictionary) once from the first node to size the result arrays
+        # node_series produces a dictionary with the keys corresponding to timestamps and values contain the value of the selected variable (INVERT_DEPTH) at each timestamp
+        index=list(out.node_series(next(iter(out.nodes)),NodeAttribute.INVERT_DEPTH).keys())
+        n_periods=len(index)
+
+        # Preallocated arrays with one extra leading row of zeros for the initial time step (rows are time steps, columns are elements)
+        tank_depths=np.zeros((n_periods+1,len(tank_columns)))
+        node_depths=np.zeros((n_periods+1,len(node_columns)))
+
+        # Fills each column directly from the depth series of the corresponding tank or demand node
+        for column,node in enumerate(tank_columns):
+            tank_depths[1:,column]=np.fromiter(out.node_series(node,NodeAttribute.INVERT_DEPTH).values(),dtype=float,count=n_periods)
+        for column,node in enumerate(node_columns):
+            node_depths[1:,column]=np.fromiter(out.node_series(node,NodeAttribute.INVERT_DEPTH).values(),dtype=float,count=n_periods)
+
+    # Stores the start time stamp of the simulation and the reporting step of the file (the output holds the end of each reporting period)
     start_time=index[0]
+    report_step=__swmm_report_step__(input_file)
     # List to store index of time in seconds (0 added as the missing initial time step)
     new_index=[]
 
@@ -1052,22 +1087,16 @@ def OutletStorage(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
         # Gets time difference in seconds
         timesec=(time-start_time).seconds
         # Appends time in seconds to new index
-        new_index.append(timesec+10)
-
-    Tank_Depths["time"]=new_index
-    Tank_Depths.set_index("time",inplace=True)
-    Tank_Depths[Tank_Depths>1]=1
+        new_index.append(timesec+report_step)
 
-    Node_Depths["time"]=new_index
-    Node_Depths.set_index("time",inplace=True)
-
-    ### Formatting the DataFrame to add a zero row at the beginning (for the initial time step) and fix index and column names
-    Tank_Depths.loc[0,:]=0
-    Tank_Depths.sort_index(inplace=True)
+    # Tanks are 1 m high, so any depth above 1 m means the tank is full (satisfaction capped at 100%)
+    np.minimum(tank_depths,1,out=tank_depths)
 
-    Node_Depths.loc[0,:]=0
-    Node_Depths.sort_index(inplace=True)
-    Node_Depths.columns=Tank_Depths.columns
+    ### Wraps the arrays in DataFrames indexed by time in seconds, with the zero row as the initial time step
+    time_index=pd.Index([0]+new_index,name="time")
+    tank_columns=[ids.get(node,node) for node in tank_columns]
+    Tank_Depths=pd.DataFrame(tank_depths,index=time_index,columns=tank_columns,copy=False)
+    Node_Depths=pd.DataFrame(node_depths,index=time_index,columns=tank_columns,copy=False)
 
     # Calculates supply duration in minutes from the last entry in the new index (seconds)
     supply_duration=new_index[-1]/60
@@ -1126,9 +1155,528 @@ def OutletStorage(path:pathlib.Path,ran_before:bool,output:str='S',low_percentil
             plt.ylabel('Nodal Pressure (m)')
         plt.show
 
+    if temporary is not None:
+        temporary.cleanup()
     return timesrs_processed,mean,low_percentile_series,high_percentile_series
     
 
+def FloatStorage(path:pathlib.Path,ran_before:bool,output:str='S',low_percentile:int=10,high_percentile:int=90,save_outputs:bool=True,plots=True):
+    """
+
+    Executes an IWS EPA-SWMM file that uses one of the private tank methods with consumption: Float-Storage, Campisano or 3O2S1P.
+    The satisfaction ratio of each consumer is the volume its tank has received through its inlet (less the overflow of 3O2S1P)
+    over the desired volume (the volume of the tank), from the start of the simulation to the end of the day
+
+
+    Parameters
+    -----------
+    path (str): path to input file. relative or full absolute path, or an in-memory model returned by a Convert_Method function with in_memory=True
+
+    output (str): specify output to process. Default: Satisfaction Ratio. Other supported outputs include 'P' for Pressure  
+    
+    ran_before (bool): Set to True to skip executing the SWMM .inp file IF you executed the .inp file before (uses the saved .out file instead)  
+    
+    low_percentile (int): value for the low percentile statistic (default 10th percentile) representing disadvantaged consumers  
+    
+    high_percentile (int): value for the high percentile statistic (default 90th percentile) representing disadvantaged consumers  
+    
+    save_outputs: Save processed output and statistices (mean, median an percentiles) as CSV files. Default: True.  
+    
+    plots (bool): Display mean and range plots. default: True
+
+
+    Returns: timesrs_processed, mean, low_percentile_series, high_percentile_series
+
+    timesrs_processed: Pandas DataFrame of size TxN where T is the number of timesteps and N is the number of demand (non-zero) nodes 
+    in the network. Contains the values for the selected output: Satisfaction Ratio (S) or Pressures (P) for each demand node at each time step
+
+    mean: Pandas Series of size Tx1 where T is the number of timesteps. Mean output values for each timestep
+
+    low_percentile_series: Pandas Series of size Tx1. The XXth percentile output values for each timestep. XX is determined by function input: low_percentile
+
+    high_percentile_series: Pandas Series of size Tx1. The YYth percentile output values for each timestep. YY is determined by function input: high_percentile
+    """
+    assert 0 < low_percentile <high_percentile, "Percentile must be between 0 and 100"
+    assert 0 < high_percentile <100, "Percentile must be between 0 and 100"
+    assert output in ['S','P'], "Specify Supported Output Type: S for Satisfaction or P for Pressures"
+
+    # In-memory models are simulated from a temporary input file that is deleted once the outputs are processed
+    model=path
+    path,input_file,temporary=__input_file__(model)
+    assert not (ran_before and temporary is not None), "ran_before requires the path of a previously executed file"
+    name_only=path.stem
+    print("Selected File: ",name_only)
+
+    # Original IDs of the short IDs of lean files (empty for other files). Elements are read from the output file by the IDs in the file
+    ids=__original_ids__(input_file)
+    # Desired volume of each consumer: the area of its 1 m high tank, by the original tank ID
+    desired_volumes={ids.get(id,id):area for id,area in __storage_areas__(input_file).items() if re.search('^StorageforNode',ids.get(id,id))}
+    tankids=list(desired_volumes)
+    demand_node_ids=[x[14:] for x in tankids]
+
+    if ran_before==False:
+        sim=pyswmm.Simulation(inputfile=str(input_file), outputfile=str(input_file.with_suffix(".out")))
+        stp=0       #steps counter
+        every=1000  #Interval of printing current time
+
+        # runs the simulation step by step
+        with sim as sim:
+            for step in sim:
+                if stp%every==0:
+                    print('Current Simulation Time is >> ',sim.current_time,", ",round(sim.percent_complete*100,1),"% Complete")
+                stp+=1
+            sim._model.swmm_end()
+            print("Continuity Error: ",sim.flow_routing_error,"%\n")
+
+    # Original IDs of the elements read from the output file
+    demand_node_set=set(demand_node_ids)
+    inlet_ids={"Outlet"+id:column for column,id in enumerate(demand_node_ids)}
+    overflow_ids={"OverflowOutlet"+id:column for column,id in enumerate(demand_node_ids)}
+
+    # Reads the output file created above
+    with pyswmm.Output(str(input_file.with_suffix(".out"))) as out:
+        index=list(out.node_series(next(iter(out.nodes)),NodeAttribute.INVERT_DEPTH).keys())
+        n_periods=len(index)
+        # Preallocated arrays with one extra leading row of zeros for the initial time step (rows are time steps, columns are consumers)
+        inflows=np.zeros((n_periods+1,len(demand_node_ids)))
+        node_depths=np.zeros((n_periods+1,len(demand_node_ids)))
+        node_columns={id:column for column,id in enumerate(demand_node_ids)}
+
+        # Net inflow of each tank: its inlet less its overflow (3O2S1P only), in LPS
+        for link in out.links:
+            original=ids.get(link,link)
+            if original in inlet_ids:
+                inflows[1:,inlet_ids[original]]+=np.fromiter(out.link_series(link,LinkAttribute.FLOW_RATE).values(),dtype=float,count=n_periods)
+            elif original in overflow_ids:
+                inflows[1:,overflow_ids[original]]-=np.fromiter(out.link_series(link,LinkAttribute.FLOW_RATE).values(),dtype=float,count=n_periods)
+        for node in out.nodes:
+            original=ids.get(node,node)
+            if original in demand_node_set:
+                node_depths[1:,node_columns[original]]=np.fromiter(out.node_series(node,NodeAttribute.INVERT_DEPTH).values(),dtype=float,count=n_periods)
+
+    # Times of the reporting periods in seconds from the start of the simulation (the output holds the end of each period)
+    start_time=index[0]
+    reporting_step=(index[1]-index[0]).total_seconds() if n_periods>1 else 0
+    new_index=[(time-start_time).total_seconds()+reporting_step for time in index]
+    time_index=pd.Index([0]+new_index,name="time")
+
+    # Volume received by each tank up to each reporting time (trapezoidal rule, LPS to m3) over its desired volume, capped at 100%
+    steps=np.diff(time_index.to_numpy(dtype=float))[:,None]
+    received=np.zeros_like(inflows)
+    np.cumsum((inflows[1:]+inflows[:-1])/2*steps/1000,axis=0,out=received[1:])
+    satisfaction=np.clip(received/np.array([desired_volumes[tank] for tank in tankids]),0,1)*100
+
+    if output=='S':
+        timesrs_processed=pd.DataFrame(satisfaction,index=time_index,columns=tankids,copy=False)
+    elif output=='P':
+        timesrs_processed=pd.DataFrame(node_depths,index=time_index,columns=tankids,copy=False)
+
+    mean,low_percentile_series,median,high_percentile_series=__get_stats__(timesrs_processed,low_percentile,high_percentile)
+    
+    if save_outputs==True:
+    # Saves Entire Results DataFrame as Filename_TimeSeries.csv in the same path
+        timesrs_processed.to_csv(path.parent / (path.stem +"_TimeSeries.csv"))
+
+        # Saves Mean Satisfaction with time as Filename_Means.csv in the same path
+        mean.to_csv(path.parent / (path.stem +"_Means.csv"))
+
+        # Saves Median Satisfaction with time as Filename_Medians.csv in the same path
+        median.to_csv(path.parent / (path.stem +"_Medians.csv"))
+
+        # Saves the specified low percentile (XX) values with time as Filename_XXthPercentile.csv in the same path
+        low_percentile_series.to_csv(path.parent / (path.stem +"_"+str(low_percentile)+"thPercentile.csv"))
+
+        # Saves the specified high percentile (YY) values with time as Filename_YYthPercentile.csv in the same path
+        high_percentile_series.to_csv(path.parent / (path.stem +"_"+str(high_percentile)+"thPercentile.csv"))
+    
+    if plots:
+        mpl.rcParams['figure.dpi'] = 450
+        font = {'family' : 'Times',
+                'weight' : 'bold',
+                'size'   : 3}
+        mpl.rc('font', **font)
+        mpl.rc('xtick', labelsize=3)
+        mpl.rcParams['axes.linewidth'] = 0.5
+
+        # Prepping an xaxis with hr format
+        xaxis=timesrs_processed.index.to_numpy()/3600
+
+        fig,ax=__plot_mean__(xaxis,mean,output,'#1b7837',high_percentile_series)
+        plt.xlabel('Supply Time (hr)')
+        if output=='S':
+            plt.ylabel('Satisfaction Ratio (%)')
+        elif output=='P':
+            plt.ylabel('Nodal Pressure (m)')
+        plt.show
+    
+        fig,ax=__plot_mean__(xaxis,mean,output,'#1b7837',high_percentile_series)
+        plt.fill_between(xaxis, y1=low_percentile_series, y2=high_percentile_series, alpha=0.4, color='#1b7837', edgecolor=None)
+        plt.xlabel('Supply Time (hr)')
+        if output=='S':
+            plt.ylabel('Satisfaction Ratio (%)')
+        elif output=='P':
+            plt.ylabel('Nodal Pressure (m)')
+        plt.show
+
+    if temporary is not None:
+        temporary.cleanup()
+    return timesrs_processed,mean,low_percentile_series,high_percentile_series
+
+
+def tune_routing_step(path:pathlib.Path,routing_steps:list=(10,5,2,1,0.5),variable_steps:list=(0.75,0.5,0),tolerance:float=1.0,
+                      probe_duration:float=30):
+    """
+    Tunes the routing options of a converted EPA-SWMM file (Outlet-Outfall or Outlet-Storage) for the cheapest stable setting.
+    Each candidate routing step and variable step factor is probed on a short run from the start of the supply (where filling is fastest),
+    and the largest setting whose flow routing continuity error stays within the tolerance is written into the model
+
+    Parameters
+    -----------
+    path (str): path to input file. relative or full absolute path, or an in-memory model returned by a Convert_Method function with in_memory=True
+
+    routing_steps (list): candidate routing steps in seconds (the maximum step when the variable step is used). Steps longer than the
+    reporting step of the model are skipped. Default: (10, 5, 2, 1, 0.5)
+
+    variable_steps (list): candidate VARIABLE_STEP factors (safety factor of the Courant-limited variable step, 0 for a fixed step). Default: (0.75, 0.5, 0)
+
+    tolerance (float): maximum absolute flow routing continuity error in percent. Default: 1.0
+
+    probe_duration (float): length of each probe run in minutes, capped at the supply duration. Default: 30
+
+
+    Returns: path, probes
+
+    path: path of the tuned file (updated in place), or the updated in-memory model for in-memory inputs. Unchanged if no candidate is within the tolerance
+
+    probes: Pandas DataFrame with one row per probed candidate (largest settings first) and the columns Routing Step (s), Variable Step,
+    Continuity Error (%) and Time (s) (wall time of the probe run)
+    """
+    assert tolerance>0, "Tolerance must be a positive number"
+    assert probe_duration>0, "Probe duration must be a positive number"
+    assert all(step>0 for step in routing_steps), "Routing steps must be positive numbers"
+    assert all(0<=factor<=2 for factor in variable_steps), "Variable step factors must be between 0 and 2"
+
+    model=path
+    path,input_file,temporary=__input_file__(model)
+    print("Selected File: ",path.stem)
+    with open(input_file,'r') as file:
+        lines=file.readlines()
+    options=__swmm_options__(lines)
+    report_step=__clock_to_seconds__(options.get("REPORT_STEP","0:00:10"))
+    end_time=min(__clock_to_seconds__(options.get("END_TIME","0:00:00")),probe_duration*60)
+    if temporary is not None:
+        temporary.cleanup()
+
+    # Largest (cheapest) settings first: longer routing steps, then larger variable step factors
+    candidates=[(step,factor) for step in sorted(routing_steps,reverse=True) if step<=report_step for factor in sorted(variable_steps,reverse=True)]
+    assert len(candidates)>0, "All candidate routing steps are longer than the reporting step of the model"
+
+    rows=[]
+    chosen=None
+    with tempfile.TemporaryDirectory() as directory:
+        probe_file=pathlib.Path(directory)/"probe.inp"
+        for step,factor in candidates:
+            with open(probe_file,'w') as file:
+                file.writelines(__set_swmm_options__(lines,{"ROUTING_STEP":step,"VARIABLE_STEP":factor,"END_TIME":__seconds_to_clock__(end_time)}))
+            start=timeit.default_timer()
+            try:
+                with pyswmm.Simulation(inputfile=str(probe_file),reportfile=str(probe_file.with_suffix(".rpt")),outputfile=str(probe_file.with_suffix(".out"))) as sim:
+                    for step_time in sim:
+                        pass
+                    sim._model.swmm_end()
+                    error=sim.flow_routing_error
+            # Settings the engine rejects or fails with count as unstable
+            except Exception:
+                error=np.nan
+            rows.append([step,factor,error,timeit.default_timer()-start])
+            print("Routing Step ",step," s, Variable Step ",factor,": Continuity Error ",np.round(error,3),"%")
+            if abs(error)<=tolerance:
+                chosen=(step,factor)
+                break
+
+    probes=pd.DataFrame(rows,columns=["Routing Step (s)","Variable Step","Continuity Error (%)","Time (s)"])
+    if chosen is None:
+        print("No candidate within the tolerance of ",tolerance,"%. The model is unchanged")
+        return (model if isinstance(model,dict) else path),probes
+
+    print("Selected Routing Step ",chosen[0]," s, Variable Step ",chosen[1])
+    tuned_lines=__set_swmm_options__(lines,{"ROUTING_STEP":chosen[0],"VARIABLE_STEP":chosen[1]})
+    if isinstance(model,dict):
+        return dict(model,text="".join(tuned_lines)),probes
+    with open(path,'w') as file:
+        file.writelines(tuned_lines)
+    return path,probes
+
+
+def tune_timestep(path:pathlib.Path,timesteps:list=(120,300,600,900,1800),tolerance:float=1.0,probe_duration:float=120,method:str=None):
+    """
+    Tunes the hydraulic and reporting time steps of a converted EPANET file (CV-Res, CV-Tank, FCV-EM, FCV-Res, PSV-Tank or PDA) for the fewest solves.
+    The model is run at its own (fine) time step as a reference and then at increasingly coarse candidate steps on short runs from the start
+    of the supply. The satisfaction ratios of each run are compared to the reference at the common reporting times, and the coarsest step
+    whose largest difference stays within the tolerance is written into the model as both the hydraulic and the reporting time step
+
+    Parameters
+    -----------
+    path (str): path to input file. relative or full absolute path, or an in-memory model returned by a Convert_Method function with in_memory=True
+
+    timesteps (list): candidate time steps in seconds. Steps that are not longer than the reference step or are not a multiple of it
+    are skipped. Default: (120, 300, 600, 900, 1800)
+
+    tolerance (float): maximum absolute difference of the satisfaction ratio of any consumer at any common reporting time from the
+    reference, in percent. Default: 1.0
+
+    probe_duration (float): length of each probe run in minutes, capped at the supply duration. Default: 120
+
+    method (str): IWS method of the file (e.g., 'CV-Tank'), which selects the runner processing the satisfaction ratios. Default: None
+    (taken from the end of the file name as written by the converters, e.g., Network1_12hr_CV-Tank.inp)
+
+
+    Returns: path, probes
+
+    path: path of the tuned file (updated in place), or the updated in-memory model for in-memory inputs. Unchanged if no candidate is within the tolerance
+
+    probes: Pandas DataFrame with one row per run (the reference first, then the candidates from fine to coarse) and the columns
+    Time Step (s), Max Abs Error (%), Mean Abs Error (%) and Time (s) (wall time of the run)
+    """
+    assert tolerance>0, "Tolerance must be a positive number"
+    assert probe_duration>0, "Probe duration must be a positive number"
+    assert all(step>0 for step in timesteps), "Time steps must be positive numbers"
+
+    model=path
+    path,input_file,temporary=__input_file__(model)
+    print("Selected File: ",path.stem)
+    if method is None:
+        name=path.stem[:-5] if path.stem.endswith("_Lean") else path.stem
+        method=next((method for method in sorted(__epanet_runners__,key=len,reverse=True) if name.endswith(method)),None)
+    assert method in __epanet_runners__, "Specify the method of the file, one of "+str(list(__epanet_runners__))
+    runner=__epanet_runners__[method]
+    with open(input_file,'r') as file:
+        lines=file.readlines()
+    # EPANET runs at the shorter of the hydraulic and reporting steps
+    options=wntr.network.WaterNetworkModel(str(input_file)).options.time
+    reference_step=min(options.hydraulic_timestep,options.report_timestep)
+    end_time=min(options.duration,probe_duration*60)
+    if temporary is not None:
+        temporary.cleanup()
+
+    # Candidates are multiples of the reference step so that all of their reporting times are also reference reporting times
+    candidates=[step for step in sorted(timesteps) if step>reference_step and step%reference_step==0]
+    assert len(candidates)>0, "No candidate time step is a longer multiple of the time step of the model ("+str(reference_step)+" s)"
+
+    rows=[]
+    chosen=None
+    reference=None
+    for step in [reference_step]+candidates:
+        probe_lines=__set_epanet_times__(lines,{"DURATION":__seconds_to_clock__(end_time),"HYDRAULIC TIMESTEP":__seconds_to_clock__(step),
+                                                "REPORT TIMESTEP":__seconds_to_clock__(step)})
+        start=timeit.default_timer()
+        # The probes are run in memory by the runner of the method, only the satisfaction ratios are kept
+        with contextlib.redirect_stdout(io.StringIO()):
+            satisfaction=runner({"path":path,"text":"".join(probe_lines)},output='S',save_outputs=False,plots=False)[0].astype(float)
+        run_time=timeit.default_timer()-start
+        if reference is None:
+            reference=satisfaction
+            rows.append([step,0.0,0.0,run_time])
+            continue
+        errors=np.abs(satisfaction.to_numpy()-reference.loc[satisfaction.index,satisfaction.columns].to_numpy())
+        rows.append([step,errors.max(),errors.mean(),run_time])
+        print("Time Step ",step," s: Max Abs Error ",np.round(errors.max(),3),"%")
+        if errors.max()>tolerance:
+            break
+        chosen=step
+
+    probes=pd.DataFrame(rows,columns=["Time Step (s)","Max Abs Error (%)","Mean Abs Error (%)","Time (s)"])
+    if chosen is None:
+        print("No candidate within the tolerance of ",tolerance,"%. The model is unchanged")
+        return (model if isinstance(model,dict) else path),probes
+
+    print("Selected Time Step ",chosen," s")
+    tuned_lines=__set_epanet_times__(lines,{"HYDRAULIC TIMESTEP":__seconds_to_clock__(chosen),"REPORT TIMESTEP":__seconds_to_clock__(chosen)})
+    if isinstance(model,dict):
+        return dict(model,text="".join(tuned_lines)),probes
+    with open(path,'w') as file:
+        file.writelines(tuned_lines)
+    return path,probes
+
+
+def __input_file__(model):
+    """
+    Resolves the input of a runner into a file that the EPANET or EPA-SWMM engine can read
+
+    model (str, pathlib.Path, dict or WaterNetworkModel): path to an input file, an in-memory model returned by a Convert_Method function
+    with in_memory=True or a WNTR WaterNetworkModel
+
+    Returns: path, input_file, temporary
+
+    path: path of the model, used for its name and to save processed outputs (for in-memory models, the path the converter would have written)
+
+    input_file: path of the file to simulate (the file itself, or a copy in a temporary directory for in-memory models)
+
+    temporary: TemporaryDirectory holding the copy of an in-memory model (to clean up after simulating), None for files
+    """
+    if isinstance(model,wntr.network.WaterNetworkModel):
+        path=pathlib.Path(model.name) if model.name else pathlib.Path("network.inp")
+        temporary=tempfile.TemporaryDirectory()
+        input_file=pathlib.Path(temporary.name)/path.name
+        wntr.network.write_inpfile(model,str(input_file))
+        return path,input_file,temporary
+    if isinstance(model,dict):
+        path=pathlib.Path(model["path"])
+        temporary=tempfile.TemporaryDirectory()
+        input_file=pathlib.Path(temporary.name)/path.name
+        input_file.write_text(model["text"])
+        # Desired demands of the Outlet-Outfall method are read next to the input file as when it is written by the converter
+        if model.get("demands") is not None:
+            model["demands"].to_csv(input_file.parent/(input_file.stem+"_Demands.csv"))
+        # So are the original IDs of lean files
+        if model.get("ids") is not None:
+            model["ids"].to_csv(input_file.parent/(input_file.stem+"_IDs.csv"))
+        return path,input_file,temporary
+    path=pathlib.Path(model)
+    return path,path,None
+
+
+def __original_ids__(input_file:pathlib.Path):
+    # Original ID of each short ID of a lean file (Convert_Method functions with lean=True) from the _IDs.csv file next to it. Empty for other files
+    ids_file=input_file.parent/(input_file.stem+"_IDs.csv")
+    if not ids_file.exists():
+        return {}
+    ids=pd.read_csv(ids_file,dtype=str)
+    return dict(zip(ids.ID,ids.Original))
+
+
+def __restore_ids__(results,ids:dict):
+    # Relabels the node and link results of a WNTR simulation of a lean file with the original IDs
+    if not ids:
+        return
+    for table in (results.node,results.link):
+        for attribute in table:
+            table[attribute]=table[attribute].rename(columns=ids)
+
+
+def __report_periods__(results_table,supply_duration:int):
+    # Rows of a WNTR results table (time in seconds as index) at the reporting times from the start to the end of the supply (minutes),
+    # for any reporting step of the file
+    return results_table.loc[results_table.index<=supply_duration*60]
+
+
+def __network_model__(model,input_file:pathlib.Path):
+    # WNTR models are used as given, other inputs are read from their input file
+    if isinstance(model,wntr.network.WaterNetworkModel):
+        return model
+    return wntr.network.WaterNetworkModel(str(input_file))
+
+
+def __file_prefix__(temporary):
+    # Keeps the EPANET simulator files (.inp, .rpt, .bin) of in-memory models in their temporary directory instead of the working directory
+    if temporary is None:
+        return "temp"
+    return str(pathlib.Path(temporary.name)/"temp")
+
+
+def __storage_areas__(input_file:pathlib.Path):
+    # Area at the bottom of each tabular storage unit of an EPA-SWMM file (the first point of its storage curve), by storage ID
+    storage_curves={}
+    curve_areas={}
+    section=None
+    with open(input_file,'r') as file:
+        for line in file:
+            fields=line.split(';')[0].split()
+            if not fields:
+                continue
+            if fields[0].startswith("["):
+                section=fields[0].upper()
+            elif section=="[STORAGE]" and len(fields)>5 and fields[4].upper()=="TABULAR":
+                storage_curves[fields[0]]=fields[5]
+            # The first row of a curve holds its type between the name and the x-value
+            elif section=="[CURVES]" and len(fields)==4 and fields[0] not in curve_areas:
+                curve_areas[fields[0]]=float(fields[3])
+    return {storage:curve_areas[curve] for storage,curve in storage_curves.items() if curve in curve_areas}
+
+
+def __swmm_options__(lines:list):
+    # Options of the [OPTIONS] section of an EPA-SWMM file as a dictionary with upper case keys
+    options={}
+    section=None
+    for line in lines:
+        stripped=line.strip()
+        if stripped.startswith("["):
+            section=stripped.upper()
+        elif section=="[OPTIONS]" and stripped and not stripped.startswith(";"):
+            entry=stripped.split()
+            options[entry[0].upper()]=entry[1] if len(entry)>1 else ""
+    return options
+
+
+def __swmm_report_step__(input_file:pathlib.Path):
+    # Reporting step (s) of an EPA-SWMM file from its [OPTIONS] (10 s in the template, longer for adaptive routing steps)
+    with open(input_file,'r') as file:
+        options=__swmm_options__(file.readlines())
+    return int(round(__clock_to_seconds__(options.get("REPORT_STEP","0:00:10"))))
+
+
+def __set_swmm_options__(lines:list,options:dict):
+    # Returns the lines of an EPA-SWMM file with the given [OPTIONS] entries replaced (or added at the end of the section)
+    new_lines=[]
+    remaining=dict(options)
+    section=None
+    for line in lines:
+        stripped=line.strip()
+        if stripped.startswith("["):
+            # Entries missing from the options section are added before the next section
+            if section=="[OPTIONS]":
+                new_lines.extend(key.ljust(21)+str(value)+"\n" for key,value in remaining.items())
+                remaining={}
+            section=stripped.upper()
+        elif section=="[OPTIONS]" and stripped and stripped.split()[0].upper() in remaining:
+            key=stripped.split()[0].upper()
+            line=key.ljust(21)+str(remaining.pop(key))+"\n"
+        new_lines.append(line)
+    if section=="[OPTIONS]":
+        new_lines.extend(key.ljust(21)+str(value)+"\n" for key,value in remaining.items())
+    return new_lines
+
+
+def __set_epanet_times__(lines:list,times:dict):
+    # Returns the lines of an EPANET file with the given [TIMES] entries (upper case keys of one or two words, e.g., HYDRAULIC TIMESTEP)
+    # replaced (or added at the end of the section)
+    new_lines=[]
+    remaining=dict(times)
+    section=None
+    for line in lines:
+        stripped=line.strip()
+        if stripped.startswith("["):
+            # Entries missing from the times section are added before the next section
+            if section=="[TIMES]":
+                new_lines.extend(key.ljust(21)+str(value)+"\n" for key,value in remaining.items())
+                remaining={}
+            section=stripped.upper()
+        elif section=="[TIMES]" and stripped and not stripped.startswith(";"):
+            words=[word.upper() for word in stripped.split()]
+            key=next((key for key in remaining if words[:len(key.split())]==key.split()),None)
+            if key is not None:
+                line=key.ljust(21)+str(remaining.pop(key))+"\n"
+        new_lines.append(line)
+    if section=="[TIMES]":
+        new_lines.extend(key.ljust(21)+str(value)+"\n" for key,value in remaining.items())
+    return new_lines
+
+
+def __clock_to_seconds__(value:str):
+    # Converts an EPA-SWMM time (HH:MM:SS, HH:MM or decimal seconds) into seconds
+    parts=[float(part) for part in str(value).split(":")]
+    if len(parts)==1:
+        return parts[0]
+    parts+= [0]*(3-len(parts))
+    return parts[0]*3600+parts[1]*60+parts[2]
+
+
+def __seconds_to_clock__(seconds:float):
+    # Converts seconds into an EPA-SWMM time HH:MM:SS
+    seconds=int(round(seconds))
+    return "%02d:%02d:%02d" % (seconds//3600,seconds%3600//60,seconds%60)
+
+
 def __time_simulation__(abs_path:pathlib.Path,n_iterations:int):
     """
     Times the execution of an EPANET file for a given number of iterations
@@ -1137,15 +1685,15 @@ def __time_simulation__(abs_path:pathlib.Path,n_iterations:int):
     n_iterations (int): number of iterations to time execution
     """
     # Statement to be timed: read filename, create network model, run network simulation
-    timed_lines='inp_file='+"'"+abs_path+"'"
+    timed_lines='inp_file='+repr(str(abs_path))
     timed_lines=timed_lines+'''
-    wn = wntr.network.WaterNetworkModel(inp_file) 
-    wntr.sim.EpanetSimulator(wn)
-    '''
+wn = wntr.network.WaterNetworkModel(inp_file)
+wntr.sim.EpanetSimulator(wn)
+'''
 
     # Time and average over number of iterations
     time=np.round(timeit.timeit(stmt=timed_lines,setup='import wntr',number=n_iterations)/n_iterations*1000,decimals=2)
-    print("Time taken for ",file,' is ', time, 'milliseconds per run')
+    print("Time taken for ",pathlib.Path(abs_path).name,' is ', time, 'milliseconds per run')
 
 
 def __plot_mean__(xaxis,mean,output,color,high_p):
@@ -1185,4 +1733,11 @@ def __get_stats__(timesrs,low_percentile,high_percentile):
         median.loc[row]=np.percentile(timesrs.loc[row,:],50)
         high_percentile_series.loc[row]=np.percentile(timesrs.loc[row,:],high_percentile)
     
-    return mean,low_percentile_series,median,high_percentile_series
\ No newline at end of file
+    return mean,low_percentile_series,median,high_percentile_series
+
+
+# Runners of the EPANET methods by name, used by tune_timestep
+__epanet_runners__={"CV-Res":CVRes,"CV-Tank":CVTank,"FCV-EM":FCV,"FCV-Res":FCV,"PSV-Tank":PSVTank,"FCV-Tank":CVTank,"PDA":PDA}
+
+# Runners of the EPA-SWMM methods by name, used by the benchmarks
+__swmm_runners__={"Outlet-Outfall":OutletOutfall,"Outlet-Storage":OutletStorage,"Float-Storage":FloatStorage,"Campisano":FloatStorage,"3O2S1P":FloatStorage}
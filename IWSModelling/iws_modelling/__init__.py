@@ -1,13 +1,26 @@
 """
-The IWSModelling Package contains two modules:
+The IWSModelling Package contains five modules:
 
 Convert_Method
 --------------- 
-Contains methods for converting "normal" EPANET input files into EPANET and EPA-SWMM input files that model IWS in 7 other methods
+Contains methods for converting "normal" EPANET input files into EPANET and EPA-SWMM input files that model IWS in 11 other methods
 
 Run_Method
 ---------------
-Contains methods to run IWS EPANET and EPA-SWMM files of 8 different methods and process and format the results
+Contains methods to run IWS EPANET and EPA-SWMM files of 12 different methods and process and format the results
+
+Compare_Method
+---------------
+Contains methods to align the processed results of different methods on a common time grid and compute error metrics between them
+
+Check_Method
+---------------
+Contains methods to check the structure of converted EPANET and EPA-SWMM input files before running them
+
+Benchmark_Method
+---------------
+Contains methods to generate synthetic networks of any size, to time the conversion and run phases across network sizes and to benchmark
+all methods on the shipped networks against a baseline
 """
 
 from .Convert_Method import to_CVRes
@@ -17,8 +30,22 @@ from .Convert_Method import to_FCVRes
 from .Convert_Method import to_Outlet_Outfall
 from .Convert_Method import to_Outlet_Storage
 from .Convert_Method import to_PSVTank
+from .Convert_Method import to_FCVTank
+from .Convert_Method import to_Float_Storage
+from .Convert_Method import to_Campisano
+from .Convert_Method import to_3O2S1P
 from .Convert_Method import change_duration
+from .Convert_Method import change_durations
+from .Convert_Method import skeletonize
+from .Convert_Method import aggregate_consumers
 from .Convert_Method import to_all
+from .Convert_Method import convert_directory
+from .Convert_Method import make_template
+from .Convert_Method import write_scenarios
+from .Convert_Method import set_cache
+from .Convert_Method import cache_info
+from .Convert_Method import prune_cache
+from .Convert_Method import clear_cache
 
 from .Run_Method import CVRes
 from .Run_Method import CVTank
@@ -27,6 +54,20 @@ from .Run_Method import PDA
 from .Run_Method import PSVTank
 from .Run_Method import OutletOutfall
 from .Run_Method import OutletStorage
+from .Run_Method import FloatStorage
+from .Run_Method import tune_routing_step
+from .Run_Method import tune_timestep
+
+from .Compare_Method import align_runs
+from .Compare_Method import compare_methods
+from .Compare_Method import pairwise_errors
+from .Compare_Method import disaggregate
+
+from .Check_Method import check_model
+
+from .Benchmark_Method import generate_network
+from .Benchmark_Method import scaling_benchmark
+from .Benchmark_Method import benchmark_suite
 
 
-__version__ = '1.0.0'
\ No newline at end of file
+__version__ = '1.2.0'
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+Command line interface of the iws_modelling package
+
+python -m iws_modelling convert PATTERN --hmin HMIN --hdes HDES [--del-x-max DX] [--durations H ...] [--methods METHOD ...]
+                               [--workers N] [--index INDEX.csv] [--lean]
+    converts all PDA .inp files matching the glob PATTERN to the given supply durations and methods in parallel
+
+python -m iws_modelling check PATTERN [PATTERN ...] [--method METHOD]
+    checks the structure of all converted .inp files matching the glob patterns and fails if any file has issues
+
+python -m iws_modelling generate PATH --nodes N [--layout grid|tree|looped] [--duration H] [--seed SEED]
+    writes a synthetic EPANET-PDA network of N junctions
+
+python -m iws_modelling scaling DIRECTORY [--sizes N ...] [--layouts LAYOUT ...] [--methods METHOD ...] [--run-max-nodes N]
+                               [--repetitions N] [--del-x-max DX]
+    times every conversion and run phase on synthetic networks of increasing size and fits the complexity of each phase
+
+python -m iws_modelling benchmark [PATTERN] [--directory DIR] [--methods METHOD ...] [--repetitions N] [--cpu CPU] [--del-x-max DX]
+                                 [--baseline BASELINE.json] [--threshold FRACTION] [--update-baseline]
+    times every method end to end and by phase on the PDA files matching PATTERN (the shipped networks by default) and fails if any
+    phase regressed beyond the threshold over the baseline
+
+python -m iws_modelling cache info [--dir DIR]
+    lists the conversions stored in the conversion cache
+
+python -m iws_modelling cache prune [--dir DIR] [--max-size-mb MB] [--max-entries N]
+    removes the least recently used conversions until the cache is within the limits
+
+python -m iws_modelling cache clear [--dir DIR]
+    removes all conversions from the cache
+
+The cache directory defaults to the IWS_MODELLING_CACHE environment variable
+"""
+global argparse,pd,glob
+
+import argparse
+import pandas as pd
+import glob
+
+from .Convert_Method import convert_directory
+from .Convert_Method import cache_info
+from .Convert_Method import prune_cache
+from .Convert_Method import clear_cache
+from .Check_Method import check_model
+from .Benchmark_Method import generate_network
+from .Benchmark_Method import scaling_benchmark
+from .Benchmark_Method import benchmark_suite
+
+
+def main(argv:list=None):
+    """
+    Runs the command line interface
+
+    Parameters
+    -----------
+    argv (list): command line arguments. Default: None (the arguments of the running process)
+
+
+    Returns: None
+    """
+    parser=argparse.ArgumentParser(prog="python -m iws_modelling",description="Tools of the iws_modelling package")
+    commands=parser.add_subparsers(dest="command",required=True)
+
+    convert=commands.add_parser("convert",help="convert a directory of PDA .inp files to several durations and methods")
+    convert.add_argument("pattern",help="glob pattern of the source PDA .inp files (quote it to keep the shell from expanding it)")
+    convert.add_argument("--hmin",type=float,required=True,help="minimum pressure Hmin")
+    convert.add_argument("--hdes",type=float,required=True,help="desired pressure Hdes")
+    convert.add_argument("--del-x-max",type=float,default=100,help="maximum pipe length of the EPA-SWMM methods. Default: 100")
+    convert.add_argument("--durations",type=float,nargs="+",default=None,help="supply durations in hours. Default: durations of the sources")
+    convert.add_argument("--methods",nargs="+",default=None,help="methods to convert to, e.g., CV-Tank Outlet-Outfall. Default: all 7")
+    convert.add_argument("--workers",type=int,default=None,help="number of worker processes. Default: one per CPU")
+    convert.add_argument("--index",default=None,help="csv file to save the summary index to")
+    convert.add_argument("--lean",action="store_true",help="write lean files for running only (no visual sections, short IDs)")
+
+    check=commands.add_parser("check",help="check the structure of converted .inp files before running them")
+    check.add_argument("patterns",nargs="+",help="glob patterns of the .inp files to check")
+    check.add_argument("--method",default=None,help="method of all files, e.g., CV-Tank. Default: taken from each file name or content")
+
+    generate=commands.add_parser("generate",help="write a synthetic EPANET-PDA network of any size")
+    generate.add_argument("path",help="path of the file to write, e.g., Grid10000_12hr_PDA.inp")
+    generate.add_argument("--nodes",type=int,required=True,help="number of junctions")
+    generate.add_argument("--layout",choices=["grid","tree","looped"],default="grid",help="layout of the pipes. Default: grid")
+    generate.add_argument("--duration",type=float,default=12,help="supply duration in hours. Default: 12")
+    generate.add_argument("--seed",type=int,default=0,help="seed of the random number generator. Default: 0")
+
+    scaling=commands.add_parser("scaling",help="time the conversion and run phases on synthetic networks of increasing size")
+    scaling.add_argument("directory",help="directory for the generated networks, converted files and results")
+    scaling.add_argument("--sizes",type=int,nargs="+",default=[100,1000,10000,100000,200000],help="numbers of junctions. Default: 100 to 200000")
+    scaling.add_argument("--layouts",nargs="+",choices=["grid","tree","looped"],default=["grid","tree","looped"],help="layouts. Default: all")
+    scaling.add_argument("--methods",nargs="+",default=None,help="methods to convert to and run. Default: the 7 methods of to_all")
+    scaling.add_argument("--run-max-nodes",type=int,default=1000,help="largest network that is simulated. Default: 1000")
+    scaling.add_argument("--repetitions",type=int,default=1,help="repetitions of each phase (the shortest time is kept). Default: 1")
+    scaling.add_argument("--del-x-max",type=float,default=100,help="maximum pipe length of the EPA-SWMM methods. Default: 100")
+
+    benchmark=commands.add_parser("benchmark",help="time all methods on the shipped networks and compare with a baseline")
+    benchmark.add_argument("pattern",nargs="?",default="Network-Files/*/*_PDA.inp",help="glob pattern of the source PDA .inp files. Default: the shipped networks")
+    benchmark.add_argument("--directory",default="Benchmark",help="directory for the converted files and results. Default: Benchmark")
+    benchmark.add_argument("--methods",nargs="+",default=None,help="methods to time. Default: PDA and the 7 methods of to_all")
+    benchmark.add_argument("--repetitions",type=int,default=3,help="repetitions of each phase. Default: 3")
+    benchmark.add_argument("--cpu",type=int,default=None,help="CPU to pin the process to while timing (Linux). Default: no pinning")
+    benchmark.add_argument("--del-x-max",type=float,default=100,help="maximum pipe length of the EPA-SWMM methods. Default: 100")
+    benchmark.add_argument("--baseline",default=None,help="baseline json file, written if missing. Default: no comparison")
+    benchmark.add_argument("--threshold",type=float,default=0.25,help="relative slowdown counted as a regression. Default: 0.25")
+    benchmark.add_argument("--update-baseline",action="store_true",help="overwrite the baseline with this run")
+
+    cache=commands.add_parser("cache",help="inspect or prune the conversion cache")
+    cache.add_argument("action",choices=["info","prune","clear"])
+    cache.add_argument("--dir",default=None,help="cache directory. Default: IWS_MODELLING_CACHE")
+    cache.add_argument("--max-size-mb",type=float,default=None,help="maximum total size kept by prune in MB")
+    cache.add_argument("--max-entries",type=int,default=None,help="maximum number of conversions kept by prune")
+
+    args=parser.parse_args(argv)
+    if args.command=="convert":
+        index=convert_directory(args.pattern,args.hmin,args.hdes,args.del_x_max,args.durations,args.methods,args.workers,args.index,args.lean)
+        # Failed conversions make the command fail (e.g., in CI) once all other files are converted
+        if (index.Error!="").any():
+            print(index[index.Error!=""][["Source","Duration (hr)","Method","Error"]].to_string(index=False))
+            raise SystemExit(1)
+    elif args.command=="check":
+        __check_command__(args)
+    elif args.command=="generate":
+        generate_network(args.path,args.nodes,args.layout,args.duration,seed=args.seed)
+    elif args.command=="scaling":
+        scaling_benchmark(args.directory,args.sizes,args.layouts,args.methods,del_x_max=args.del_x_max,run_max_nodes=args.run_max_nodes,
+                          repetitions=args.repetitions,plots=False)
+    elif args.command=="benchmark":
+        results,table=benchmark_suite(args.pattern,args.directory,args.methods,del_x_max=args.del_x_max,repetitions=args.repetitions,cpu=args.cpu,
+                                      baseline=args.baseline,threshold=args.threshold,update_baseline=args.update_baseline)
+        # Regressions make the command fail (e.g., in CI) once all methods are timed
+        if results.Regression.any():
+            raise SystemExit(1)
+    elif args.command=="cache":
+        __cache_command__(args)
+
+
+def __check_command__(args):
+    # Prints the issues of every file with issues and fails once all files are checked, so that a batch is only submitted if all files pass
+    paths=sorted({path for pattern in args.patterns for path in glob.glob(pattern)})
+    assert len(paths)>0, "No files match "+" ".join(args.patterns)
+    failed=0
+    for path in paths:
+        issues=check_model(path,args.method)
+        if len(issues)>0:
+            failed+=1
+            print(path,": ",len(issues)," issues")
+            print(issues.to_string(index=False))
+    print("Checked ",len(paths)," files, ",failed," with issues")
+    if failed>0:
+        raise SystemExit(1)
+
+
+def __cache_command__(args):
+    if args.action=="info":
+        entries=cache_info(args.dir)
+        with pd.option_context("display.max_rows",None,"display.width",200,"display.max_colwidth",40):
+            print(entries if len(entries)>0 else "Cache is empty")
+        print("Total: ",len(entries)," conversions, ",round(entries["Size (MB)"].sum(),2)," MB")
+    elif args.action=="prune":
+        print("Removed ",prune_cache(args.max_size_mb,args.max_entries,args.dir)," conversions")
+    else:
+        print("Removed ",clear_cache(args.dir)," conversions")
+
+
+if __name__=="__main__":
+    main()